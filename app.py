@@ -1,5 +1,5 @@
 import streamlit as st
-import pandas as pd
+from utils.profiler import begin_rerun, render_profiler_panel
 
 st.set_page_config("Homedepot 广告分析工具", layout="wide")
 pg = st.navigation([
@@ -7,5 +7,9 @@ pg = st.navigation([
     st.Page("modules/scraper.py", title = "产品信息爬取页", icon = "ℹ️"),
     st.Page("modules/trends.py", title = "广告趋势分析", icon = "📈")
 ])
-pg.run()
+begin_rerun(pg.title)
+try:
+    pg.run()
+finally:
+    render_profiler_panel()
 
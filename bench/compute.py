@@ -0,0 +1,268 @@
+"""
+计算层基准与校验：在合成数据上直接调用 compute/ 中的纯函数（不启动 Streamlit、不构建图形），
+报告每个函数的中位耗时与输出规模；--check 时校验输出的基本性质，并与 Arrow 查询后端的结果逐项比对。
+
+    python -m bench.compute                                  # 默认规模
+    python -m bench.compute --skus 2000 --days 365 --repeat 10
+    python -m bench.compute --check                          # 只做校验，失败时以非零状态退出
+    python -m bench.compute --json bench_compute.json        # 保存结果作为基线
+    python -m bench.compute --compare bench_compute.json --max-regression 0.2
+
+修改 compute/ 或 visuals/ 中的聚合逻辑时，请附上 --check 结果与改动前后的耗时。
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench.synthetic import (
+    CAMPAIGN_METRICS, MEAN_METRICS, PROMOTED_METRICS, append_by_month, append_overlapping, make_datasets, merged_sales
+)
+from compute.campaign import (
+    campaign_metric_table, campaign_rank_profile, campaign_rank_table, campaign_totals_frame,
+    campaign_trend_frame, metric_distributions, rank_campaign_totals
+)
+from compute.halo import halo_breakdown, halo_leaderboard, halo_tables
+from compute.sku import daily_sku_series, sku_daily_matrix, sku_metric_table, top_sku_table, with_sku_map
+
+AGGREGATION_FIELD = "SPA Sales (sum)"
+
+
+def cases(data: dict) -> dict:
+    """{名称: 无参函数}；依赖上一步结果的函数直接使用预先算好的输入，只计本步耗时。"""
+    campaign, promoted, sku_map = data["Campaign Summary"], data["Promoted Sales"], data["HD SKU Map"]
+    merged = merged_sales(data)
+    ranked_ids, total = rank_campaign_totals(campaign, AGGREGATION_FIELD, "Campaign ID", MEAN_METRICS, 10)
+    agg_table, total_main = campaign_metric_table(campaign, CAMPAIGN_METRICS, AGGREGATION_FIELD, "Campaign ID", MEAN_METRICS)
+    rank_table = campaign_rank_table(campaign, CAMPAIGN_METRICS, "Campaign ID", MEAN_METRICS, "Ad Type")
+    daily, totals = sku_daily_matrix(merged)
+    detail, summary = halo_tables(merged, sku_map)
+    top_skus = top_sku_table(totals, 10)
+    one_campaign = promoted[promoted["Campaign ID"] == ranked_ids[0]]
+
+    return {
+        "rank_campaign_totals": lambda: rank_campaign_totals(campaign, AGGREGATION_FIELD, "Campaign ID", MEAN_METRICS, 10),
+        "campaign_totals_frame": lambda: campaign_totals_frame(total, None, {}, 20),
+        "campaign_trend_frame": lambda: campaign_trend_frame(campaign, "Campaign ID", ranked_ids, {}, 20),
+        "campaign_metric_table": lambda: campaign_metric_table(
+            campaign, CAMPAIGN_METRICS, AGGREGATION_FIELD, "Campaign ID", MEAN_METRICS),
+        "metric_distributions": lambda: metric_distributions(
+            agg_table, total_main, CAMPAIGN_METRICS, AGGREGATION_FIELD, MEAN_METRICS, 5),
+        "campaign_rank_table": lambda: campaign_rank_table(campaign, CAMPAIGN_METRICS, "Campaign ID", MEAN_METRICS, "Ad Type"),
+        "campaign_rank_profile": lambda: campaign_rank_profile(rank_table, ranked_ids[0], CAMPAIGN_METRICS),
+        "sku_metric_table": lambda: sku_metric_table(one_campaign, PROMOTED_METRICS),
+        "sku_daily_matrix": lambda: sku_daily_matrix(merged),
+        "top_sku_table": lambda: with_sku_map(top_sku_table(totals, 10), sku_map),
+        "daily_sku_series": lambda: daily_sku_series(daily, top_skus["Promoted OMSID"].tolist()),
+        "halo_tables": lambda: halo_tables(merged, sku_map),
+        "halo_leaderboard": lambda: halo_leaderboard(summary, 10),
+        "halo_breakdown": lambda: halo_breakdown(detail, summary.index[0]),
+    }
+
+
+def output_rows(result) -> int:
+    """输出规模：DataFrame / Series / 数组的行数之和（tuple 逐项累加）。"""
+    if isinstance(result, tuple):
+        return sum(output_rows(r) for r in result)
+    if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray, list, dict)):
+        return len(result)
+    return 0
+
+
+def run(data: dict, repeat: int) -> dict:
+    results = {}
+    for name, fn in cases(data).items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = {"median_ms": statistics.median(timings), "rows_out": output_rows(result)}
+    return results
+
+
+def check(data: dict) -> list[str]:
+    """校验计算层输出的基本性质，并与 ArrowQueryEngine 的同名查询比对；返回失败项说明。"""
+    failures = []
+
+    def expect(condition, message):
+        if not condition:
+            failures.append(message)
+
+    def same_frame(name, left, right, **kwargs):
+        try:
+            pd.testing.assert_frame_equal(left, right, check_dtype=False, **kwargs)
+        except AssertionError as e:
+            failures.append(f"{name}: {str(e).splitlines()[0]}")
+
+    campaign, promoted, sku_map = data["Campaign Summary"], data["Promoted Sales"], data["HD SKU Map"]
+    merged = merged_sales(data)
+    snapshot = {name: df.copy() for name, df in data.items()}
+
+    # Campaign 排名：降序、求和类指标的总量守恒
+    ranked_ids, total = rank_campaign_totals(campaign, AGGREGATION_FIELD, "Campaign ID", MEAN_METRICS)
+    expect(total.is_monotonic_decreasing, "rank_campaign_totals: 总量未按降序排列")
+    expect(np.isclose(total.sum(), campaign[AGGREGATION_FIELD].sum()), "rank_campaign_totals: 总量之和与明细不一致")
+
+    agg_table, total_main = campaign_metric_table(campaign, CAMPAIGN_METRICS, AGGREGATION_FIELD, "Campaign ID", MEAN_METRICS)
+    labels, values = metric_distributions(agg_table, total_main, CAMPAIGN_METRICS, AGGREGATION_FIELD, MEAN_METRICS, 5)
+    expect(labels[-1] == "Others" and len(labels) == 6, "metric_distributions: 标签应为 Top 5 + Others")
+    expect(list(values)[0] == AGGREGATION_FIELD, "metric_distributions: 第一个指标应为 aggregation_field")
+    for metric in CAMPAIGN_METRICS:
+        if metric not in MEAN_METRICS:
+            expect(np.isclose(values[metric].sum(), campaign[metric].sum()), f"metric_distributions: {metric} 的 Top N + Others 与总量不一致")
+
+    rank_table = campaign_rank_table(campaign, CAMPAIGN_METRICS, "Campaign ID", MEAN_METRICS, "Ad Type")
+    profile, group = campaign_rank_profile(rank_table, ranked_ids[0], CAMPAIGN_METRICS)
+    expect(profile.at[AGGREGATION_FIELD, "rank"] == 1, "campaign_rank_profile: 总量第一的 Campaign 排名应为 1")
+    expect(group in set(campaign["Ad Type"]), "campaign_rank_profile: 同类分组不在 Ad Type 中")
+
+    # SKU：每日矩阵与总量一致，Top N 降序
+    daily, totals = sku_daily_matrix(merged)
+    expect(np.allclose(daily.sum().to_numpy(), totals.to_numpy()), "sku_daily_matrix: 每日矩阵按列求和与 totals 不一致")
+    expect(np.isclose(totals.sum(), merged["SPA Sales_y"].sum()), "sku_daily_matrix: totals 之和与明细不一致")
+    top = top_sku_table(totals, 10)
+    expect(top["SPA Sales_y"].is_monotonic_decreasing, "top_sku_table: 未按销售额降序排列")
+    expect(len(with_sku_map(top, sku_map)) == len(top), "with_sku_map: 左连接改变了行数")
+
+    # Halo：直接 + 光环 = 总销售额，排行降序
+    detail, summary = halo_tables(merged, sku_map)
+    expect(np.allclose(summary["Direct Sales"] + summary["Halo Sales"], summary["Total Sales"]), "halo_tables: 直接 + 光环销售额与总量不一致")
+    expect(np.isclose(summary["Total Sales"].sum(), merged["SPA Sales_y"].sum()), "halo_tables: 总销售额与明细不一致")
+    board = halo_leaderboard(summary, 10)
+    expect(board["Halo Ratio"].is_monotonic_decreasing, "halo_leaderboard: 未按 Halo Ratio 降序排列")
+
+    # 计算层不修改输入
+    for name, df in data.items():
+        same_frame(f"{name} 被修改", df, snapshot[name])
+
+    failures += check_arrow(data)
+    return failures
+
+
+def check_arrow(data: dict) -> list[str]:
+    """
+    与 Arrow 查询后端（query.engine）比对聚合结果：数据包分别为单个文件、按月与 Campaign 逐月追加的分区（out_of_core），
+    以及分两次追加、在月中截断且互相重叠的分区（同一天的数据应被替换而不是丢失或重复）。
+    """
+    try:
+        from query.bundle import ParquetBundle
+        from query.engine import PARTITIONED_DATASETS, ArrowQueryEngine
+    except ImportError as e:
+        print(f"跳过与 Arrow 后端的比对：{e}")
+        return []
+
+    failures = []
+    for layout in ("file", "partitioned", "overlapping"):
+        with tempfile.TemporaryDirectory() as root:
+            bundle = ParquetBundle(root)
+            if layout == "file":
+                bundle.sync(data, {name: 1 for name in data})
+            else:
+                bundle.sync(data, {name: 1 for name in data if name not in PARTITIONED_DATASETS})
+                (append_by_month if layout == "partitioned" else append_overlapping)(bundle, data, PARTITIONED_DATASETS)
+                for name in PARTITIONED_DATASETS:
+                    if bundle.describe()[name]["rows"] != len(data[name]):
+                        failures.append(f"[{layout}] {name}: 数据包记录 {bundle.describe()[name]['rows']} 行，应为 {len(data[name])} 行")
+            # 分区布局下每块约为 1/4 的明细，覆盖多个时间段合并为一块的情况
+            engine = ArrowQueryEngine(bundle, chunk_rows=len(data["Promoted Sales"]) // 4 if layout != "file" else None)
+            failures += [f"[{layout}] {failure}" for failure in compare_engine(data, engine)]
+    return failures
+
+
+def compare_engine(data: dict, engine) -> list[str]:
+    """engine 的各项聚合与 compute/ 中 pandas 实现的结果逐项比对。"""
+    failures = []
+    merged = merged_sales(data)
+    ranked_ids, total = rank_campaign_totals(data["Campaign Summary"], AGGREGATION_FIELD, "Campaign ID", MEAN_METRICS, 10)
+    arrow_ids, arrow_total = engine.ranked_campaigns(AGGREGATION_FIELD, "Campaign ID", MEAN_METRICS, top_n=10)
+    if ranked_ids != arrow_ids or not np.allclose(total.to_numpy(), arrow_total.to_numpy()):
+        failures.append("ranked_campaigns: 与 rank_campaign_totals 不一致")
+
+    pairs = {
+        "sku_daily_sales": (sku_daily_matrix(merged), sku_daily_matrix(engine.sku_daily_sales())),
+        "halo_sales": (halo_tables(merged)[1], halo_tables(engine.halo_sales())[1]),
+    }
+    # 趋势页单个 Campaign 的 SKU 指标表：pandas 聚合 vs engine.sku_metrics 聚合后再补映射信息
+    one_campaign = data["Promoted Sales"][data["Promoted Sales"]["Campaign ID"] == ranked_ids[0]]
+    pairs["sku_metric_table"] = (
+        sku_metric_table(one_campaign, PROMOTED_METRICS)[1],
+        sku_metric_table(one_campaign, PROMOTED_METRICS,
+                         df_agg=engine.sku_metrics(PROMOTED_METRICS, campaign_ids=[ranked_ids[0]]))[1]
+    )
+    for name, (expected, actual) in pairs.items():
+        if name == "sku_daily_sales":
+            expected = expected[1].sort_index().to_frame()
+            actual = actual[1].sort_index().to_frame()
+        else:
+            expected = expected.sort_index()
+            actual = actual.sort_index()
+        try:
+            pd.testing.assert_frame_equal(expected, actual, check_dtype=False)
+        except AssertionError as e:
+            failures.append(f"{name}: {str(e).splitlines()[0]}")
+    return failures
+
+
+def print_table(results: dict, baseline: dict | None = None):
+    print(f"{'function':<24}{'median_ms':>20}{'rows_out':>12}")
+    for name, result in results.items():
+        cell = f"{result['median_ms']:.2f}"
+        if baseline and name in baseline and baseline[name]["median_ms"]:
+            cell += f" ({result['median_ms'] / baseline[name]['median_ms'] - 1:+.0%})"
+        print(f"{name:<24}{cell:>20}{result['rows_out']:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="计算层（compute/）耗时基准与校验")
+    parser.add_argument("--campaigns", type=int, default=30)
+    parser.add_argument("--skus", type=int, default=500)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--check", action="store_true", help="只做校验，不计时")
+    parser.add_argument("--json", help="把结果写入该文件，作为后续对比的基线")
+    parser.add_argument("--compare", help="与该基线文件对比")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="任一函数的 median_ms 相对基线上升超过该比例时以非零状态退出")
+    options = parser.parse_args()
+
+    data = make_datasets(options.campaigns, options.skus, options.days, options.seed)
+    print(f"合成数据：{', '.join(f'{name} {len(df)} 行' for name, df in data.items())}")
+
+    if options.check:
+        failures = check(data)
+        for failure in failures:
+            print(f"FAIL {failure}")
+        print("校验通过" if not failures else f"{len(failures)} 项校验失败")
+        sys.exit(1 if failures else 0)
+
+    results = run(data, options.repeat)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+
+    if options.json:
+        with open(options.json, "w", encoding="utf-8") as f:
+            json.dump({"options": vars(options), "results": results}, f, indent=2)
+
+    if baseline and options.max_regression is not None:
+        regressed = [
+            name for name, result in results.items()
+            if name in baseline and result["median_ms"] > baseline[name]["median_ms"] * (1 + options.max_regression)
+        ]
+        if regressed:
+            print(f"耗时上升超过 {options.max_regression:.0%}：{', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+长历史基准：在多年的合成数据上比较两种数据包布局下 SKU 视图三个查询（sku_daily_sales / halo_sales / sku_metrics）
+的耗时与峰值内存：
+- file：每个数据集一个 Parquet 文件（query_configs["backend"] = "arrow"）
+- partitioned：Promoted / Purchased Sales 按月与 Campaign 分区（query_configs["out_of_core"]），逐月追加写入
+
+每个 (布局, 窗口) 在单独的子进程中运行，峰值内存 = Arrow 内存池峰值 + Python（tracemalloc）峰值，
+不受前一次查询与缓存的影响。out_of_core 模式的目标是峰值内存随所选窗口而不是整个历史增长。
+
+    python -m bench.history
+    python -m bench.history --days 1095 --skus 1000 --windows 30 90 365 0
+    python -m bench.history --json bench_history.json
+    python -m bench.history --compare bench_history.json --max-regression 0.2
+
+修改 query/ 中的扫描、分块或分区逻辑时，请附上改动前后的结果。
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from bench.synthetic import PROMOTED_METRICS, append_by_month, make_datasets
+
+LAYOUTS = ["file", "partitioned"]
+
+
+def build(root: str, options) -> datetime.date:
+    """在 root 下写入两种布局的数据包，返回数据的最后一天。"""
+    from query.bundle import ParquetBundle
+    from query.engine import PARTITIONED_DATASETS
+
+    data = make_datasets(options.campaigns, options.skus, options.days, options.seed)
+    ParquetBundle(os.path.join(root, "file")).sync(data, {name: 1 for name in data})
+    partitioned = ParquetBundle(os.path.join(root, "partitioned"))
+    partitioned.sync(data, {name: 1 for name in data if name not in PARTITIONED_DATASETS})
+    append_by_month(partitioned, data, PARTITIONED_DATASETS)
+    return max(data["Promoted Sales"]["Day"])
+
+
+def measure(root: str, start, end, chunk_rows: int | None) -> dict:
+    """子进程中运行：打开数据包、执行三个查询，返回耗时与峰值内存。"""
+    import tracemalloc
+
+    import pyarrow as pa
+
+    from query.bundle import ParquetBundle
+    from query.engine import ArrowQueryEngine
+
+    engine = ArrowQueryEngine(ParquetBundle(root), chunk_rows=chunk_rows)
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = len(engine.sku_daily_sales(start, end))
+    rows += len(engine.halo_sales(start, end))
+    rows += len(engine.sku_metrics(PROMOTED_METRICS, start, end))
+    elapsed = (time.perf_counter() - started) * 1000
+    python_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "ms": elapsed,
+        "peak_mb": (pa.default_memory_pool().max_memory() + python_peak) / 2 ** 20,
+        "rows_out": rows
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="长历史下分区数据包的查询耗时与峰值内存基准")
+    parser.add_argument("--campaigns", type=int, default=30)
+    parser.add_argument("--skus", type=int, default=500)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--windows", type=int, nargs="+", default=[30, 90, 365, 0],
+                        help="窗口长度（天，截止到最后一天）；0 表示整个历史")
+    parser.add_argument("--chunk-rows", type=int, default=None,
+                        help="分块聚合每块最多的明细行数，默认取 query_configs['chunk_rows']；0 表示每个时间段一块")
+    parser.add_argument("--json", help="把结果写入该文件，作为后续对比的基线")
+    parser.add_argument("--compare", help="与该基线文件对比")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="partitioned 布局的峰值内存相对基线上升超过该比例时以非零状态退出")
+    options = parser.parse_args()
+    if options.chunk_rows is None:
+        from config import query_configs
+        options.chunk_rows = query_configs["chunk_rows"]
+
+    baseline = None
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as root:
+        last_day = build(root, options)
+        print(f"合成数据：{options.days} 天 × {options.skus} 个 SKU × {options.campaigns} 个 Campaign，"
+              f"分块 {options.chunk_rows or '每个时间段'} 行")
+        print(f"{'window':<10}{'layout':<14}{'ms':>10}{'peak_mb':>18}{'rows_out':>10}")
+        with context.Pool(1, maxtasksperchild=1) as pool:
+            for days in options.windows:
+                start = last_day - datetime.timedelta(days=days - 1) if days else None
+                label = f"{days}d" if days else "all"
+                for layout in LAYOUTS:
+                    result = pool.apply(measure, (os.path.join(root, layout), start, last_day if days else None,
+                                                  options.chunk_rows or None))
+                    key = f"{label}/{layout}"
+                    results[key] = result
+                    cell = f"{result['peak_mb']:.1f}"
+                    if baseline and key in baseline:
+                        cell += f" ({result['peak_mb'] / baseline[key]['peak_mb'] - 1:+.0%})"
+                    print(f"{label:<10}{layout:<14}{result['ms']:>10.1f}{cell:>18}{result['rows_out']:>10}")
+
+    if options.json:
+        with open(options.json, "w", encoding="utf-8") as f:
+            json.dump({"options": vars(options), "results": results}, f, indent=2)
+
+    if baseline and options.max_regression is not None:
+        regressed = [
+            key for key, result in results.items()
+            if key.endswith("/partitioned") and key in baseline
+            and result["peak_mb"] > baseline[key]["peak_mb"] * (1 + options.max_regression)
+        ]
+        if regressed:
+            print(f"峰值内存上升超过 {options.max_regression:.0%}：{', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
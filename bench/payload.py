@@ -0,0 +1,129 @@
+"""
+图表载荷基准：在合成数据上渲染趋势页（AppTest），统计每张图实际发送给前端的 Plotly JSON 字节数，
+对比开启与关闭 chart_configs["compact"]（utils.figures.compact_figure）时的结果。
+
+    python -m bench.payload
+    python -m bench.payload --skus 2000 --days 365 --top 5
+    python -m bench.payload --json bench_payload.json
+    python -m bench.payload --compare bench_payload.json --max-regression 0.1
+    python -m bench.payload --check                     # 校验压缩前后各图的 text 标签一致，失败时以非零状态退出
+
+修改 visuals/ 中的图或 compact_figure 时，请附上改动前后的结果。
+"""
+import argparse
+import json
+import os
+import sys
+
+from bench.synthetic import make_datasets
+from config import chart_configs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGE = os.path.join(ROOT, "modules", "trends.py")
+
+# 趋势页的两个视图（页面顶部的 pills）
+VIEWS = ["广告整体表现", "SKU具体表现"]
+
+
+def render(data: dict, view: str, compact: bool) -> list[tuple[str, int, list]]:
+    """渲染一个视图，返回每张图的 (标题, 字节数, 各 trace 的 text)。"""
+    from streamlit.testing.v1 import AppTest
+
+    chart_configs["compact"] = compact
+    at = AppTest.from_file(PAGE, default_timeout=300)
+    at.session_state["uploaded_data"] = data
+    at.run()
+    if view != VIEWS[0]:
+        at.button_group[0].set_value([view]).run()
+    if at.exception:
+        raise RuntimeError(f"{view} 渲染出错：{[e.message for e in at.exception]}")
+
+    charts = []
+    for element in at.get("plotly_chart"):
+        spec = element.proto.spec
+        figure = json.loads(spec)
+        title = figure.get("layout", {}).get("title", {}).get("text") or "-"
+        charts.append((title, len(spec.encode("utf-8")), [trace.get("text") for trace in figure.get("data", [])]))
+    return charts
+
+
+def check_labels(view: str, raw: list, compact: list) -> list[str]:
+    """压缩只能改变载荷，不能改变显示的 text 标签（全部相同时合并为一个值视为不变）；返回失败项说明。"""
+    failures = []
+    if len(raw) != len(compact):
+        return [f"{view}: 压缩前后图的数量不一致（{len(raw)} vs {len(compact)}）"]
+    for (title, _, texts_before), (_, _, texts_after) in zip(raw, compact):
+        for before, after in zip(texts_before, texts_after):
+            if isinstance(before, list) and not isinstance(after, list):
+                after = [after] * len(before)
+            if before != after:
+                failures.append(f"{view} / {title[:60]}: text 标签被改写")
+                break
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="趋势页图表 JSON 载荷基准")
+    parser.add_argument("--campaigns", type=int, default=30)
+    parser.add_argument("--skus", type=int, default=500)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--top", type=int, default=3, help="每个视图列出载荷最大的几张图")
+    parser.add_argument("--json", help="把结果写入该文件，作为后续对比的基线")
+    parser.add_argument("--compare", help="与该基线文件对比")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="压缩后的总字节数相对基线上升超过该比例时以非零状态退出")
+    parser.add_argument("--check", action="store_true", help="校验压缩前后各图的 text 标签一致")
+    options = parser.parse_args()
+
+    data = make_datasets(options.campaigns, options.skus, options.days, options.seed)
+    baseline = None
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    failures = []
+    configured = chart_configs["compact"]
+    try:
+        for view in VIEWS:
+            raw, compact = render(data, view, False), render(data, view, True)
+            before = sum(size for _, size, _ in raw)
+            after = sum(size for _, size, _ in compact)
+            results[view] = {"charts": len(compact), "bytes_before": before, "bytes_after": after}
+
+            line = f"{view}: {len(compact)} 张图，{before / 1024:.1f} KB -> {after / 1024:.1f} KB（{after / max(before, 1):.0%}）"
+            if baseline and view in baseline:
+                line += f"，相对基线 {after / baseline[view]['bytes_after'] - 1:+.0%}"
+            print(line)
+            largest = sorted(zip(raw, compact), key=lambda pair: -pair[0][1])[:options.top]
+            for (title, size_before, _), (_, size_after, _) in largest:
+                print(f"    {size_before / 1024:8.1f} KB -> {size_after / 1024:8.1f} KB  {title[:60]}")
+            if options.check:
+                failures += check_labels(view, raw, compact)
+    finally:
+        chart_configs["compact"] = configured
+
+    if options.json:
+        with open(options.json, "w", encoding="utf-8") as f:
+            json.dump({"options": vars(options), "results": results}, f, indent=2, ensure_ascii=False)
+
+    if options.check:
+        for failure in failures:
+            print(f"FAIL {failure}")
+        print("校验通过" if not failures else f"{len(failures)} 项校验失败")
+        if failures:
+            sys.exit(1)
+
+    if baseline and options.max_regression is not None:
+        regressed = [
+            view for view, result in results.items()
+            if view in baseline and result["bytes_after"] > baseline[view]["bytes_after"] * (1 + options.max_regression)
+        ]
+        if regressed:
+            print(f"压缩后载荷上升超过 {options.max_regression:.0%}：{', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
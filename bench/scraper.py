@@ -0,0 +1,203 @@
+"""
+爬虫引擎压测：启动本地 targeting 接口替身（crawler.mock_server），用真实的抓取 + 列式解析流程跑若干场景，
+报告 Campaign / 秒、请求延迟 p50 / p99 和内存峰值。
+
+    python -m bench.scraper                              # 跑全部场景
+    python -m bench.scraper -s longtail -n 500 --repeat 5
+    python -m bench.scraper --json bench_scraper.json    # 保存结果作为基线
+    python -m bench.scraper --compare bench_scraper.json --max-regression 0.15
+
+修改 crawler/engine.py 等抓取代码时，请附上改动前后的结果。
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import psutil
+
+from config import scraper_configs
+from crawler.adaptive import ScrapeMetrics
+from crawler.engine import scrape_campaigns
+from crawler.extract import ProductColumns
+
+# 场景 -> mock_server 命令行参数
+SCENARIOS = {
+    # 低延迟、无错误：衡量引擎自身开销
+    "fast": ["--latency", "0.01", "--products", "20-200"],
+    # 长尾延迟：少数慢请求决定整体耗时
+    "longtail": ["--latency", "lognormal:0.05,0.8", "--products", "20-200"],
+    # 服务端限流：考察 429 后的降速与恢复
+    "throttled": ["--latency", "exp:0.03", "--rate", "60", "--products", "20-200"],
+    # 随机 5xx：考察重试与熔断
+    "flaky": ["--latency", "uniform:0.01,0.08", "--error-rate", "0.05", "--products", "20-200"],
+}
+
+
+class MockServerProcess:
+    """以子进程方式运行 mock 服务器，避免与被测爬虫争用同一个 GIL。"""
+
+    def __init__(self, args: list[str], seed: int):
+        self.args = ["--port", "0", "--capacity", "64", "--seed", str(seed), *args]
+
+    def __enter__(self) -> str:
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "crawler.mock_server", *self.args],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+        line = self.proc.stdout.readline()
+        return line.rsplit(" ", 1)[-1].strip()
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        self.proc.wait(timeout=10)
+
+
+class PeakRSS:
+    """后台线程按固定间隔采样当前进程 RSS，记录运行期间的峰值增量。"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.baseline = self.peak = self.process.memory_info().rss
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+    @property
+    def delta_mb(self) -> float:
+        return (self.peak - self.baseline) / 2 ** 20
+
+
+def run_once(base_url: str, campaign_ids: list, options) -> dict:
+    """跑一轮完整抓取（含列式解析与转 DataFrame），返回该轮指标。"""
+    metrics = ScrapeMetrics()
+    buffer = ProductColumns()
+    failed = []
+
+    def on_result(outcome):
+        # 返回值不带 payload，失败数在回调中统计
+        if outcome["status"] != 200 or outcome.get("incomplete"):
+            failed.append(outcome["campaign_id"])
+        if outcome["payload"] is not None:
+            buffer.extend(outcome["campaign_id"], outcome["payload"].get("results") or [])
+
+    with PeakRSS() as rss:
+        started = time.perf_counter()
+        scrape_campaigns(
+            campaign_ids, {}, on_result=on_result,
+            store_id=scraper_configs["store_ids"][0],
+            base_url=base_url,
+            concurrency=options.concurrency,
+            max_concurrency=options.max_concurrency,
+            rate=options.rate,
+            burst=options.burst,
+            page_size=options.page_size,
+            retry_backoff=options.retry_backoff,
+            metrics=metrics
+        )
+        frame = buffer.to_frame()
+        elapsed = time.perf_counter() - started
+
+    summary = metrics.summary()
+    return {
+        "campaigns_per_sec": len(campaign_ids) / elapsed,
+        "requests_per_sec": summary["requests"] / elapsed,
+        "latency_p50_ms": summary["latency_p50"] * 1000,
+        "latency_p99_ms": summary["latency_p99"] * 1000,
+        "peak_rss_mb": rss.delta_mb,
+        "error_rate": summary["error_rate"],
+        "failed_campaigns": len(failed),
+        "retries": summary["retries"],
+        "rows": len(frame),
+        "elapsed_s": elapsed,
+    }
+
+
+def run_scenario(name: str, options) -> dict:
+    campaign_ids = [str(100000 + i) for i in range(options.campaigns)]
+    runs = []
+    with MockServerProcess(SCENARIOS[name], options.seed) as base_url:
+        if options.warmup:
+            run_once(base_url, campaign_ids[:min(20, len(campaign_ids))], options)
+        for _ in range(options.repeat):
+            runs.append(run_once(base_url, campaign_ids, options))
+    # 多轮取中位数，降低偶然抖动的影响
+    summary = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    return {key: round(value) if isinstance(runs[0][key], int) else value for key, value in summary.items()}
+
+
+def print_table(results: dict, baseline: dict | None = None):
+    columns = ["campaigns_per_sec", "latency_p50_ms", "latency_p99_ms", "peak_rss_mb", "error_rate", "failed_campaigns", "rows"]
+    print(f"{'scenario':<10}" + "".join(f"{c:>20}" for c in columns))
+    for name, result in results.items():
+        cells = []
+        for column in columns:
+            cell = f"{result[column]:.2f}" if isinstance(result[column], float) else str(result[column])
+            if baseline and name in baseline and baseline[name].get(column):
+                cell += f" ({result[column] / baseline[name][column] - 1:+.0%})"
+            cells.append(f"{cell:>20}")
+        print(f"{name:<10}" + "".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="爬虫引擎压测")
+    parser.add_argument("-s", "--scenario", action="append", choices=list(SCENARIOS), help="可重复指定，默认全部")
+    parser.add_argument("-n", "--campaigns", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--concurrency", type=int, default=scraper_configs["concurrency"])
+    parser.add_argument("--max-concurrency", type=int, default=scraper_configs["max_concurrency"])
+    # 默认放开客户端限速，测的是引擎本身而不是配置的速率上限
+    parser.add_argument("--rate", type=float, default=500.0)
+    parser.add_argument("--burst", type=float, default=50.0)
+    parser.add_argument("--page-size", type=int, default=scraper_configs["page_size"])
+    parser.add_argument("--retry-backoff", type=float, default=0.2)
+    parser.add_argument("--json", help="把结果写入该文件，作为后续对比的基线")
+    parser.add_argument("--compare", help="与该基线文件对比")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="campaigns_per_sec 相对基线下降超过该比例时以非零状态退出")
+    options = parser.parse_args()
+
+    results = {}
+    for name in options.scenario or list(SCENARIOS):
+        results[name] = run_scenario(name, options)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+
+    if options.json:
+        with open(options.json, "w", encoding="utf-8") as f:
+            json.dump({"options": vars(options), "results": results}, f, indent=2)
+
+    if baseline and options.max_regression is not None:
+        regressed = [
+            name for name, result in results.items()
+            if name in baseline and result["campaigns_per_sec"] < baseline[name]["campaigns_per_sec"] * (1 - options.max_regression)
+        ]
+        if regressed:
+            print(f"吞吐回退超过 {options.max_regression:.0%}：{', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
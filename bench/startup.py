@@ -0,0 +1,157 @@
+"""
+启动耗时基准：每轮在全新的子进程里冷启动 Streamlit 运行时并首次渲染页面（AppTest），
+报告进程冷启动、首次渲染、二次 rerun 的耗时，以及首次渲染期间加载了哪些重量级模块。
+
+    python -m bench.startup                                  # 测全部页面
+    python -m bench.startup -p modules/trends.py --repeat 10
+    python -m bench.startup --json bench_startup.json        # 保存结果作为基线
+    python -m bench.startup --compare bench_startup.json --max-regression 0.2
+    python -m bench.startup --check                          # 入口首次渲染加载了重量级模块时以非零状态退出
+
+调整页面或 visuals/ 的导入时，请附上改动前后的结果。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# app.py 为入口（页面导航），其余为各页面脚本；首页是文件上传页
+PAGES = ["app.py", "modules/upload.py", "modules/scraper.py", "modules/trends.py"]
+
+# 值得关注的重量级依赖：首次渲染时是否被加载
+HEAVY_MODULES = [
+    "pandas", "numpy", "pyarrow", "pyarrow.dataset", "plotly.express", "plotly.subplots", "requests",
+    "preprocess", "visuals.campaign_ranking", "visuals.campaign_fields", "visuals.promoted_groupby",
+    "visuals.promoted_sku_ranking", "visuals.promoted_distributions",
+]
+
+# 首次渲染时不允许加载的模块：入口 app.py 只做页面导航，pandas 等由各页面与数据路径（utils.pandas_setup）按需导入
+FORBIDDEN = {
+    "app.py": ["pandas", "numpy", "pyarrow", "plotly.express", "requests"],
+}
+
+
+def child(page: str):
+    """子进程：计时导入 Streamlit 运行时、首次渲染与二次 rerun，结果以一行 JSON 输出。"""
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    runtime_ready = time.perf_counter()
+
+    before = set(sys.modules)
+    at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=120)
+    at.run()
+    first_done = time.perf_counter()
+    at.run()
+    rerun_done = time.perf_counter()
+
+    loaded = set(sys.modules) - before
+    print(json.dumps({
+        "runtime_import_ms": (runtime_ready - started) * 1000,
+        "first_render_ms": (first_done - runtime_ready) * 1000,
+        "rerun_ms": (rerun_done - first_done) * 1000,
+        "modules_loaded": len(loaded),
+        "heavy": [m for m in HEAVY_MODULES if m in loaded],
+        "exception": [e.message for e in at.exception],
+    }))
+
+
+def run_once(page: str) -> dict:
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-m", "bench.startup", "--child", page],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    elapsed = time.perf_counter() - started
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    if result["exception"]:
+        raise RuntimeError(f"{page} 渲染出错：{result['exception']}")
+    # 进程冷启动：解释器启动 + Streamlit 运行时 + 首次渲染（不含二次 rerun）
+    result["cold_start_ms"] = elapsed * 1000 - result["rerun_ms"]
+    return result
+
+
+def run_page(page: str, repeat: int) -> dict:
+    runs = [run_once(page) for _ in range(repeat)]
+    # 多轮取中位数，降低磁盘缓存等偶然因素的影响
+    summary = {
+        key: statistics.median(run[key] for run in runs)
+        for key in ("cold_start_ms", "runtime_import_ms", "first_render_ms", "rerun_ms", "modules_loaded")
+    }
+    summary["heavy"] = runs[-1]["heavy"]
+    return summary
+
+
+def print_table(results: dict, baseline: dict | None = None):
+    columns = ["cold_start_ms", "first_render_ms", "rerun_ms", "modules_loaded"]
+    print(f"{'page':<22}" + "".join(f"{c:>22}" for c in columns))
+    for page, result in results.items():
+        cells = []
+        for column in columns:
+            cell = f"{result[column]:.0f}"
+            if baseline and page in baseline and baseline[page].get(column):
+                cell += f" ({result[column] / baseline[page][column] - 1:+.0%})"
+            cells.append(f"{cell:>22}")
+        print(f"{page:<22}" + "".join(cells))
+    for page, result in results.items():
+        print(f"{page:<22}首次渲染加载：{', '.join(result['heavy']) or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="页面冷启动耗时基准")
+    parser.add_argument("-p", "--page", action="append", choices=PAGES, help="可重复指定，默认全部")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--json", help="把结果写入该文件，作为后续对比的基线")
+    parser.add_argument("--compare", help="与该基线文件对比")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="first_render_ms 相对基线上升超过该比例时以非零状态退出")
+    parser.add_argument("--check", action="store_true", help="首次渲染加载了 FORBIDDEN 中的模块时以非零状态退出")
+    options = parser.parse_args()
+
+    if options.child:
+        child(options.child)
+        return
+
+    pages = options.page or PAGES
+    if options.check and not options.page:
+        pages = list(FORBIDDEN)
+    results = {page: run_page(page, options.repeat) for page in pages}
+
+    baseline = None
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+
+    if options.json:
+        with open(options.json, "w", encoding="utf-8") as f:
+            json.dump({"options": vars(options), "results": results}, f, indent=2)
+
+    if options.check:
+        violations = [
+            f"{page}（{', '.join(m for m in result['heavy'] if m in FORBIDDEN[page])}）"
+            for page, result in results.items()
+            if page in FORBIDDEN and any(m in FORBIDDEN[page] for m in result["heavy"])
+        ]
+        if violations:
+            print(f"首次渲染加载了不应加载的模块：{'；'.join(violations)}")
+            sys.exit(1)
+        print("检查通过")
+
+    if baseline and options.max_regression is not None:
+        regressed = [
+            page for page, result in results.items()
+            if page in baseline and result["first_render_ms"] > baseline[page]["first_render_ms"] * (1 + options.max_regression)
+        ]
+        if regressed:
+            print(f"首次渲染耗时上升超过 {options.max_regression:.0%}：{', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+合成数据：形状与上传页预处理之后的数据集一致（Day / Interval 为 date，各类 ID 为字符串），
+供 bench.compute 等基准在不读取 Excel、不启动 Streamlit 的情况下使用。
+"""
+import datetime
+
+import numpy as np
+
+# 与应用一致，基准在 copy-on-write 下运行
+from utils.pandas_setup import pd
+
+CAMPAIGN_METRICS = ["Click Through Rate (CTR) (sum)", "Clicks (sum)",
+                    "Cost Per Click (CPC) (sum)", "Cost Per Thousand Views (CPM) (sum)", "Impressions (sum)",
+                    "Return on Ad Spend (ROAS) SPA (sum)", "SPA In-Store Sales (sum)", "SPA Online Sales (sum)",
+                    "SPA Sales (sum)", "Spend (sum)"]
+MEAN_METRICS = ["Return on Ad Spend (ROAS) SPA (sum)", "Click Through Rate (CTR) (sum)",
+                "Cost Per Click (CPC) (sum)", "Cost Per Thousand Views (CPM) (sum)"]
+PROMOTED_METRICS = ["Clicks", "Impressions", "SPA ROAS", "SPA Sales", "Spend"]
+
+
+def make_datasets(n_campaigns: int = 30, n_skus: int = 200, n_days: int = 60, seed: int = 0) -> dict:
+    """
+    返回 {数据集名: DataFrame}：Campaign Summary（每周一行）、Promoted Sales（SKU × 天）、
+    Purchased Sales（约为 Promoted Sales 行数的 1/3，一半为 Promoted SKU 本身）与 HD SKU Map。
+    """
+    rng = np.random.default_rng(seed)
+    days = [datetime.date(2025, 1, 1) + datetime.timedelta(d) for d in range(n_days)]
+    campaign_ids = [str(100000 + i) for i in range(n_campaigns)]
+
+    weeks = days[::7]
+    campaign = pd.DataFrame({
+        "Interval": np.tile(np.array(weeks, dtype=object), n_campaigns),
+        "Ad Type": np.repeat(rng.choice(["PLA", "AUCTION_BANNER"], n_campaigns), len(weeks)),
+        "Campaign ID": np.repeat(campaign_ids, len(weeks)),
+        "Campaign Name": np.repeat([f"Campaign {cid} name" for cid in campaign_ids], len(weeks)),
+        "Status": "running",
+    })
+    for metric in CAMPAIGN_METRICS:
+        campaign[metric] = rng.random(len(campaign)) * 100
+
+    skus = [str(300000000 + i) for i in range(n_skus)]
+    sku_map = pd.DataFrame({
+        "OMSID": skus,
+        "MFG Model #": ["M" + s for s in skus],
+        "Weekly Sales QTY": rng.integers(0, 10, n_skus),
+        "Promoted Retail": rng.random(n_skus) * 100,
+        "Inventory": rng.integers(0, 100, n_skus),
+        "OMS THD SKU": ["T" + s for s in skus],
+        "Product Name (120)": ["Name " + s for s in skus],
+    })
+
+    n = n_skus * n_days
+    promoted = pd.DataFrame({
+        "Day": np.repeat(np.array(days, dtype=object), n_skus),
+        "Promoted OMSID": np.tile(skus, n_days),
+    })
+    promoted["Campaign ID"] = np.tile([campaign_ids[i % n_campaigns] for i in range(n_skus)], n_days)
+    promoted["Campaign Name"] = "Campaign " + promoted["Campaign ID"] + " name"
+    promoted["Promoted OMSID Description"] = "desc " + promoted["Promoted OMSID"]
+    for metric in ["Clicks", "Impressions", "SPA Sales", "Spend"]:
+        promoted[metric] = rng.random(n) * 50
+    promoted["SPA ROAS"] = promoted["SPA Sales"] / promoted["Spend"]
+    promoted = promoted.merge(sku_map, how="left", left_on="Promoted OMSID", right_on="OMSID")
+
+    m = n // 3
+    purchased = promoted.iloc[rng.integers(0, n, m)][
+        ["Day", "Campaign ID", "Promoted OMSID", "Promoted OMSID Description"]
+    ].reset_index(drop=True)
+    other_skus = skus + [str(900000000 + i) for i in range(50)]
+    purchased["Purchased OMSID"] = np.where(rng.random(m) < 0.5, purchased["Promoted OMSID"], rng.choice(other_skus, m))
+    purchased["SPA Sales"] = rng.random(m) * 30
+
+    return {
+        "Campaign Summary": campaign,
+        "Promoted Sales": promoted,
+        "Purchased Sales": purchased,
+        "HD SKU Map": sku_map,
+    }
+
+
+def append_by_month(bundle, datasets: dict, names=("Promoted Sales", "Purchased Sales")):
+    """把 datasets 中的 names 逐月追加到 bundle 的分区数据集（模拟 out_of_core 模式下逐月上传的导出文件）。"""
+    for name in names:
+        df = datasets[name]
+        for month, chunk in df.groupby(pd.to_datetime(df["Day"]).dt.strftime("%Y-%m")):
+            bundle.append(name, chunk, f"{name}/{month}")
+
+
+def append_overlapping(bundle, datasets: dict, names=("Promoted Sales", "Purchased Sales")):
+    """
+    把 datasets 中的 names 分两次追加到 bundle：两个文件都在月中截断，且有几天重叠
+    （模拟半个月的导出与时间段重叠的导出），结果应与一次性写入完全一致。
+    """
+    for name in names:
+        df = datasets[name]
+        days = sorted(df["Day"].unique())
+        first_end, second_start = days[len(days) // 2], days[len(days) // 2 - 5]
+        bundle.append(name, df[df["Day"] <= first_end], f"{name}/first")
+        bundle.append(name, df[df["Day"] >= second_start], f"{name}/second")
+
+
+def merged_sales(datasets: dict) -> pd.DataFrame:
+    """与趋势页 SKU 视图相同的 Promoted × Purchased 左连接（SPA Sales_x / SPA Sales_y）。"""
+    return datasets["Promoted Sales"].merge(
+        datasets["Purchased Sales"],
+        on=["Day", "Campaign ID", "Promoted OMSID"],
+        how="left"
+    )
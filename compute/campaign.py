@@ -0,0 +1,177 @@
+"""
+Campaign Summary 相关的纯计算：不依赖 Streamlit / Plotly，输入 DataFrame，输出聚合后的 DataFrame / Series / 数组。
+绘图与控件在 visuals/campaign_ranking.py、visuals/campaign_fields.py 中。
+"""
+import numpy as np
+
+from utils.pandas_setup import pd
+from utils.ranking import top_n_positions, take_with_others
+
+
+def campaign_label(cid, name_map: dict | None = None, name_max_len: int = 20) -> str:
+    """图例 / 坐标轴上的 Campaign 标签："ID - 名称"，名称过长时截断。"""
+    if name_map and cid in name_map:
+        name = name_map[cid]
+        short = name if len(name) <= name_max_len else name[:name_max_len] + '...'
+        return f"{cid} - {short}"
+    return cid
+
+
+def rank_campaign_totals(
+    df: pd.DataFrame,
+    metric: str,
+    campaign_col: str,
+    mean_metrics: list[str],
+    top_n: int | None = None
+) -> tuple[list, pd.Series]:
+    """
+    根据指标对所有 Campaign 进行汇总排名，返回按降序排列的前 top_n 个 Campaign ID 列表和对应总量序列。
+    top_n 为 None 时返回完整排名。
+    """
+    if metric in mean_metrics:
+        total = df.groupby(campaign_col)[metric].mean()
+    else:
+        total = df.groupby(campaign_col)[metric].sum()
+    pos = top_n_positions(total.to_numpy(), len(total) if top_n is None else top_n)
+    total = total.iloc[pos]
+    return total.index.tolist(), total
+
+
+def campaign_totals_frame(
+    total: pd.Series,
+    selected_ids: list | None = None,
+    name_map: dict | None = None,
+    name_max_len: int = 20
+) -> pd.DataFrame:
+    """
+    柱状图数据：按 total 的顺序（或 selected_ids 的顺序）排列的 Campaign，
+    列为 _id / label / 总量。
+    """
+    order = list(selected_ids) if selected_ids else total.index.tolist()
+    series = total.loc[order] if selected_ids else total
+    return pd.DataFrame({
+        "_id": order,
+        "label": [campaign_label(cid, name_map, name_max_len) for cid in order],
+        "总量": series.to_numpy()
+    })
+
+
+def campaign_trend_frame(
+    df: pd.DataFrame,
+    campaign_col: str,
+    selected_ids: list,
+    name_map: dict | None = None,
+    name_max_len: int = 20
+) -> tuple[pd.DataFrame, list[str]]:
+    """
+    选定 Campaign 的明细行（增加 label 列）和与 selected_ids 顺序一致的图例顺序。
+    返回新的 DataFrame，不修改 df。
+    """
+    filtered = df[df[campaign_col].isin(selected_ids)]
+    labels = {cid: campaign_label(cid, name_map, name_max_len) for cid in selected_ids}
+    filtered = filtered.assign(label=filtered[campaign_col].map(labels))
+    return filtered, [labels[cid] for cid in selected_ids]
+
+
+def campaign_metric_table(
+    df: pd.DataFrame,
+    metrics: list[str],
+    aggregation_field: str,
+    campaign_col: str,
+    mean_metrics: list[str]
+) -> tuple[pd.DataFrame, pd.Series]:
+    """
+    一次 groupby 得到所有 Campaign 在所有指标上的聚合值（mean_metrics 取均值，其余求和），
+    以及用于 Top N 排序的 aggregation_field 总和。
+    """
+    grouped = df.groupby(campaign_col)
+    agg_table = grouped.agg({m: 'mean' if m in mean_metrics else 'sum' for m in metrics})
+    total_main = grouped[aggregation_field].sum()
+    return agg_table, total_main
+
+
+def metric_distributions(
+    agg_table: pd.DataFrame,
+    total_main: pd.Series,
+    metrics: list[str],
+    aggregation_field: str,
+    mean_metrics: list[str],
+    top_n: int,
+    include_others: bool = True,
+    name_map: dict | None = None,
+    name_max_len: int = 20
+) -> tuple[list[str], dict[str, np.ndarray]]:
+    """
+    按 aggregation_field 的总和取 Top N Campaign，返回 (labels, values)：
+    - labels: Top N 的标签（include_others 时末尾追加 "Others"）
+    - values: {指标: 与 labels 对齐的数组}，aggregation_field 排在第一个；Others 按该指标的聚合方式合并其余 Campaign
+    """
+    top_pos = top_n_positions(total_main.to_numpy(), top_n)
+    labels = [campaign_label(cid, name_map, name_max_len) for cid in total_main.index[top_pos]]
+    if include_others:
+        labels.append("Others")
+
+    ordered = [aggregation_field] + [m for m in metrics if m != aggregation_field]
+    values = {
+        m: take_with_others(
+            agg_table[m].to_numpy(),
+            top_pos,
+            ('mean' if m in mean_metrics else 'sum') if include_others else None
+        )
+        for m in ordered
+    }
+    return labels, values
+
+
+def campaign_rank_table(
+    df: pd.DataFrame,
+    metrics: list[str],
+    campaign_col: str,
+    mean_metrics: list[str],
+    group_col: str | None = None
+) -> pd.DataFrame:
+    """
+    用一次 groupby().agg() 和 DataFrame.rank() 计算所有 Campaign 在所有指标上的排名。
+    返回 index=Campaign ID、两级列 (类别, 指标) 的表，任意 Campaign 的排名向量是一次行查找：
+    - value: 聚合值（mean_metrics 取均值，其余取总和）
+    - rank: 全体排名（1 为最高）
+    - pct: 百分位排名（1.0 为最高）
+    - peer_rank: 在同一 group_col（如 Ad Type）内的排名，仅当提供 group_col 时存在
+    """
+    grouped = df.groupby(campaign_col)
+    values = grouped.agg({m: 'mean' if m in mean_metrics else 'sum' for m in metrics})
+
+    parts = {
+        'value': values,
+        'rank': values.rank(ascending=False, method='first', na_option='bottom').astype(int),
+        'pct': values.rank(pct=True),
+    }
+    if group_col:
+        peer = grouped[group_col].first()
+        parts['peer_rank'] = (
+            values.groupby(peer)
+                  .rank(ascending=False, method='first', na_option='bottom')
+                  .astype(int)
+        )
+        parts['group'] = peer.to_frame()
+
+    return pd.concat(parts, axis=1)
+
+
+def campaign_rank_profile(rank_table: pd.DataFrame, campaign, metrics: list[str]) -> tuple[pd.DataFrame, str | None]:
+    """
+    从 campaign_rank_table 中取出一个 Campaign 的排名画像，返回 (profile, group)：
+    - profile: index=指标（按 metrics 顺序），列 value / rank / pct，以及存在时的 peer_rank
+    - group: 该 Campaign 所在的同类分组（如 Ad Type），没有分组时为 None
+    """
+    row = rank_table.loc[campaign]
+    kinds = ['value', 'rank', 'pct'] + (['peer_rank'] if 'peer_rank' in rank_table.columns.get_level_values(0) else [])
+    profile = pd.DataFrame({kind: row[kind].reindex(metrics) for kind in kinds})
+    profile.index.name = '指标'
+    group = row['group'].iloc[0] if 'group' in rank_table.columns.get_level_values(0) else None
+    return profile, group
+
+
+def campaign_series(df: pd.DataFrame, campaign_col: str, date_col: str, campaign) -> pd.DataFrame:
+    """单个 Campaign 的时间序列（按日期排序）。"""
+    return df[df[campaign_col] == campaign].sort_values(date_col)
@@ -0,0 +1,92 @@
+"""
+Halo 归因的纯计算：各 Promoted SKU 的购买明细、直接 / 光环销售额汇总与 Halo Ratio 排行。
+不依赖 Streamlit / Plotly，绘图与控件在 visuals/promoted_distributions.py 中。
+"""
+import numpy as np
+
+from utils.pandas_setup import pd
+from utils.ranking import top_n_positions
+
+
+def halo_tables(df_merged: pd.DataFrame, sku_map: pd.DataFrame | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    一次性为所有 Promoted SKU 计算 halo 归因（直接销售 vs 光环销售）。
+    返回 (detail, summary)：
+    - detail: index=Promoted OMSID，每行一个 (Category, Purchased OMSID) 的销售额与占比，按销售额降序；
+    - summary: index=Promoted OMSID，包含描述、直接/光环销售额和 Halo Ratio。
+    """
+    desc_col = next(
+        (c for c in ['Promoted OMSID Description_x', 'Promoted OMSID Description'] if c in df_merged.columns),
+        None
+    )
+
+    # 所有 Promoted SKU（包括没有购买记录的），作为 selectbox 选项
+    if desc_col:
+        desc = df_merged.groupby('Promoted OMSID')[desc_col].first().fillna('No description')
+    else:
+        desc = pd.Series('No description', index=pd.Index(df_merged['Promoted OMSID'].dropna().unique(), name='Promoted OMSID'))
+
+    df = df_merged[['Promoted OMSID', 'Purchased OMSID', 'SPA Sales_y']].dropna(subset=['Purchased OMSID'])
+    category = np.where(df['Purchased OMSID'].to_numpy() == df['Promoted OMSID'].to_numpy(), 'Promoted', 'Non-Promoted')
+
+    # 汇总：一次 groupby 得到所有 Promoted SKU 的购买明细
+    detail = (
+        df.assign(Category=category)
+          .groupby(['Promoted OMSID', 'Category', 'Purchased OMSID'], as_index=False)['SPA Sales_y']
+          .sum()
+    )
+    detail['Sales_pct'] = detail['SPA Sales_y'] / detail.groupby('Promoted OMSID')['SPA Sales_y'].transform('sum') * 100
+
+    if sku_map is not None:
+        detail = detail.merge(
+            sku_map,
+            left_on='Purchased OMSID',
+            right_on='OMSID',
+            how='left',
+            suffixes=('', '_HDMap')
+        )
+
+    detail = (
+        detail.sort_values(['Promoted OMSID', 'SPA Sales_y'], ascending=[True, False])
+              .set_index('Promoted OMSID')
+    )
+
+    # 直接 / 光环销售额
+    split = (
+        detail.groupby(['Promoted OMSID', 'Category'])['SPA Sales_y']
+              .sum()
+              .unstack(fill_value=0)
+              .reindex(columns=['Promoted', 'Non-Promoted'], fill_value=0)
+              .rename(columns={'Promoted': 'Direct Sales', 'Non-Promoted': 'Halo Sales'})
+              .rename_axis(columns=None)
+    )
+    summary = split.reindex(desc.index, fill_value=0)
+    summary.insert(0, 'Description', desc)
+    summary['Total Sales'] = summary['Direct Sales'] + summary['Halo Sales']
+    summary['Halo Ratio'] = summary['Halo Sales'] / summary['Total Sales'].replace(0, np.nan)
+    summary['Halo SKU Count'] = (
+        detail[detail['Category'] == 'Non-Promoted']
+        .groupby(level='Promoted OMSID')
+        .size()
+        .reindex(summary.index, fill_value=0)
+    )
+
+    return detail, summary
+
+
+def halo_breakdown(detail: pd.DataFrame, sku) -> pd.DataFrame | None:
+    """单个 Promoted SKU 的购买明细（Category / Purchased OMSID / 销售额与占比），没有销售数据时返回 None。"""
+    if sku not in detail.index:
+        return None
+    return detail.loc[[sku]].reset_index(drop=True)
+
+
+def halo_candidates(summary: pd.DataFrame) -> pd.DataFrame:
+    """有销售额、可参与 Halo Ratio 排行的 Promoted SKU。"""
+    return summary[summary['Total Sales'] > 0]
+
+
+def halo_leaderboard(summary: pd.DataFrame, top_n: int) -> pd.DataFrame:
+    """Halo Ratio 最高的 top_n 个 Promoted SKU（降序，同值按 Halo Sales 降序），只在有销售额的 SKU 中排名。"""
+    board = halo_candidates(summary)
+    return board.iloc[top_n_positions(board['Halo Ratio'].to_numpy(), top_n, tiebreak=board['Halo Sales'].to_numpy())]
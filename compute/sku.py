@@ -0,0 +1,155 @@
+"""
+Promoted SKU 相关的纯计算：每日销售矩阵、Top N 表、各 SKU 指标汇总与趋势明细。
+不依赖 Streamlit / Plotly，绘图与控件在 visuals/promoted_sku_ranking.py、visuals/promoted_groupby.py 中。
+"""
+import numpy as np
+
+from utils.pandas_setup import pd
+from utils.ranking import rank_top_n
+
+# 明细表中 SKU 映射信息的列（来自 HD SKU Map）
+MAPPING_COLS = [
+    "MFG Model #",
+    "Weekly Sales QTY",
+    "Promoted Retail",
+    "Inventory",
+    "OMS THD SKU",
+    "Product Name (120)"
+]
+RANK_COLS = ["page_no_sponsored", "page_no_organic"]
+DETAIL_COLS = [
+    'Promoted OMSID',
+    'Promoted OMSID Description',
+    'Campaign ID',
+    'Campaign Name',
+    'Day',
+    'Clicks',
+    'Impressions',
+    'SPA ROAS',
+    'SPA Sales',
+    'Spend'
+]
+
+
+def move_rank_cols_to_front(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    如果存在 page_no_sponsored / page_no_organic，则把它们移动到最前面。
+    保持其他列顺序不变。
+    """
+    front_cols = [col for col in RANK_COLS if col in df.columns]
+    other_cols = [col for col in df.columns if col not in front_cols]
+    return df[front_cols + other_cols]
+
+
+def prepare_sku_sales(df: pd.DataFrame) -> pd.DataFrame:
+    """基础清洗：保证 Day / Promoted OMSID / SPA Sales_y 列存在并转换类型，返回新的 DataFrame。"""
+    missing = [c for c in ['Day', 'Promoted OMSID', 'SPA Sales_y'] if c not in df.columns]
+    if missing:
+        raise ValueError(f"缺少必需列: {missing}")
+
+    return df.assign(**{
+        # Day -> datetime
+        'Day': pd.to_datetime(df['Day'], errors='coerce'),
+        # Promoted OMSID -> str (填空避免 NaN)
+        'Promoted OMSID': df['Promoted OMSID'].fillna('').astype(str),
+        # SPA Sales_y -> numeric (NaN -> 0)
+        'SPA Sales_y': pd.to_numeric(df['SPA Sales_y'], errors='coerce').fillna(0),
+    })
+
+
+def sku_daily_matrix(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.Series]:
+    """
+    一次解析，生成 日期 × Promoted OMSID 的稠密 SPA Sales_y 矩阵（缺失日期/SKU 直接为 0）。
+    返回 (daily, totals)：
+    - daily: index=完整日期范围，columns=Promoted OMSID；
+    - totals: 每个 Promoted OMSID 的总销售额，顺序与 daily 的列一致（未排序，Top N 由 rank_top_n 选出）。
+    """
+    df = prepare_sku_sales(df)
+
+    sku_codes, skus = pd.factorize(df['Promoted OMSID'])
+    sales = df['SPA Sales_y'].to_numpy(dtype=float)
+    n_sku = len(skus)
+
+    # 所有时间的总量（包含 Day 无法解析的行，与按 SKU groupby 的结果一致）
+    totals = np.bincount(sku_codes, weights=sales, minlength=n_sku)
+
+    valid = df['Day'].notna().to_numpy()
+    if valid.any():
+        days = df['Day'].to_numpy()[valid].astype('datetime64[D]')
+        first_day = days.min()
+        full_idx = pd.date_range(start=first_day, end=days.max(), freq='D', name='Day')
+        day_pos = (days - first_day).astype(np.int64)
+        flat = day_pos * n_sku + sku_codes[valid]
+        matrix = np.bincount(flat, weights=sales[valid], minlength=len(full_idx) * n_sku).reshape(len(full_idx), n_sku)
+    else:
+        full_idx = pd.DatetimeIndex([], name='Day')
+        matrix = np.zeros((0, n_sku))
+
+    daily = pd.DataFrame(matrix, index=full_idx, columns=pd.Index(skus.astype(str), name='Promoted OMSID'))
+    return daily, pd.Series(totals, index=daily.columns, name='SPA Sales_y')
+
+
+def top_sku_table(totals: pd.Series, top_n: int) -> pd.DataFrame:
+    """totals 中销售额最高的 top_n 个 Promoted OMSID（降序），列为 Promoted OMSID / SPA Sales_y。"""
+    top_labels, top_values = rank_top_n(totals, top_n)
+    return pd.DataFrame({'Promoted OMSID': top_labels, 'SPA Sales_y': top_values})
+
+
+def with_sku_map(df: pd.DataFrame, sku_map: pd.DataFrame, sku_col: str = 'Promoted OMSID') -> pd.DataFrame:
+    """左连接 HD SKU Map 的 OMSID 信息，df 的行全部保留（OMSID 统一为字符串，避免匹配失败）。"""
+    return df.merge(
+        sku_map.astype({'OMSID': str}),
+        left_on=sku_col,
+        right_on='OMSID',
+        how='left',
+        suffixes=('', '_HDMap')
+    )
+
+
+def daily_sku_series(daily: pd.DataFrame, skus: list) -> pd.DataFrame:
+    """从 sku_daily_matrix 的稠密矩阵中取出 skus 对应的列，列顺序与 skus 一致（不在矩阵中的 SKU 补 0）。"""
+    return daily.reindex(columns=skus, fill_value=0)
+
+
+def sku_metric_table(
+    df_promoted: pd.DataFrame,
+    metrics: list[str],
+    sku_col: str = 'Promoted OMSID',
+    df_agg: pd.DataFrame | None = None
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    对各 SKU 的 metrics 求和并基于 SPA Sales / Spend 计算 SPA ROAS，返回 (df_agg, display_df)：
+    - df_agg: index=SKU 的指标汇总（供饼图按 SKU 取值）；
+    - display_df: 带映射信息（HD SKU Map 列，缺失时退回为描述列）、Status 与 rank 列的展示表，SKU 列名为 'SKU'。
+    传入 df_agg（如 Arrow 后端 query.engine.sku_metrics 的结果）时不再在 pandas 中聚合，只从 df_promoted 取映射信息。
+    """
+    if df_agg is None:
+        df_agg = df_promoted.groupby(sku_col)[metrics].sum()
+        df_agg['SPA ROAS'] = df_agg['SPA Sales'] / df_agg['Spend']
+
+    extra_cols = [col for col in ['Status'] + RANK_COLS if col in df_promoted.columns]
+    if all(col in df_promoted.columns for col in MAPPING_COLS):
+        info_cols = MAPPING_COLS + extra_cols
+    else:
+        # fallback：只带描述列
+        info_cols = ['Promoted OMSID Description'] + extra_cols
+
+    info = df_promoted[[sku_col] + info_cols].drop_duplicates(subset=sku_col).set_index(sku_col)
+    df_agg = df_agg.join(info)
+    display_df = df_agg.reset_index().rename(columns={sku_col: 'SKU'})
+
+    # Status 放前，rank 列再放到最前
+    if 'Status' in display_df.columns:
+        display_df = display_df[['Status'] + [col for col in display_df.columns if col != 'Status']]
+    return df_agg, move_rank_cols_to_front(display_df)
+
+
+def sku_rows(df_promoted: pd.DataFrame, skus: list, sku_col: str = 'Promoted OMSID') -> pd.DataFrame:
+    """skus 对应的明细行。"""
+    return df_promoted[df_promoted[sku_col].isin(skus)]
+
+
+def sku_trend_detail(data: pd.DataFrame) -> pd.DataFrame:
+    """单 SKU 趋势下方的明细表：rank 列（如存在）在前，其后为 DETAIL_COLS 中存在的列。"""
+    front_cols = [col for col in RANK_COLS if col in data.columns]
+    return data[front_cols + [col for col in DETAIL_COLS if col in data.columns]]
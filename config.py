@@ -50,4 +50,104 @@ file_configs = {
     ], 
         "preprocess_fn": "rank"
     }
-}
\ No newline at end of file
+}
+
+scraper_configs = {
+    # targeting 接口所在域名，可改为本地 mock 服务器地址做测试
+    "base_url": "https://us.orangeapronmedia.com",
+    # 默认爬取的店铺 ID，页面上可多选；一次运行中各店铺并行抓取
+    "store_ids": ["33602"],
+    # Campaign Summary 中标识店铺的列；没有该列时每个所选店铺都抓取全部 Campaign，不属于该店铺的（404）计为跳过
+    "store_col": "Store ID",
+    # 各店铺的并发 / 限速预算，覆盖下面的默认值，例如 {"33602": {"max_concurrency": 16, "rate": 8.0, "burst": 8}}
+    "store_budgets": {},
+    # 按店铺分区的产品结果表（Parquet），跨会话共享，按店铺读取
+    "results_dir": "persist_data/product_results",
+    # 初始并发数；运行中按 AIMD 在 [min_concurrency, max_concurrency] 内自适应调整
+    "concurrency": 8,
+    "min_concurrency": 1,
+    "max_concurrency": 32,
+    # 请求延迟超过基线的多少倍视为过载，主动降并发
+    "latency_factor": 3.0,
+    # 429 / 5xx / 网络错误时的重试次数与退避基数（秒，指数退避 + 抖动，优先遵循 Retry-After）
+    "max_retries": 3,
+    "retry_backoff": 1.0,
+    # 熔断：连续失败多少次后暂停请求，以及暂停时长（秒）
+    "breaker_threshold": 10,
+    "breaker_cooldown": 30,
+    # 令牌桶限速：每秒请求数与突发容量
+    "rate_per_sec": 4.0,
+    "burst": 4,
+    # 每页条数：第 1 页返回总数后，其余页并发请求
+    "page_size": 100,
+    "timeout": 30,
+    # 磁盘响应缓存：目录与有效期（秒），过期后按 ETag / Last-Modified 重新验证
+    "cache_dir": "persist_data/scrape_cache",
+    "cache_ttl": 6 * 3600,
+    # 离线模式：只读缓存，不请求接口
+    "offline": False,
+    # 增量模式：按 Campaign 记录上次抓取时间与结果指纹，超过 state_max_age 秒视为过期
+    "incremental": True,
+    "state_file": "persist_data/scrape_state.json",
+    "state_max_age": 24 * 3600,
+    # 后台任务每个店铺攒够多少个 Campaign 的结果写一个增量文件（写入成功后才记录指纹），任务结束时合并进结果表
+    "flush_campaigns": 20
+}
+
+profiler_configs = {
+    # 新会话是否默认开启性能剖析（侧边栏可随时切换）
+    "enabled": False,
+    # 是否用 tracemalloc 记录各区间的净分配内存；tracemalloc 作用于整个进程，任一会话开启剖析期间所有会话都会变慢，
+    # 统计值也包含其他会话与线程的分配；最后一个开启剖析的会话关闭后停止跟踪
+    "trace_memory": True,
+    # 每个会话保留最近多少次运行的记录，供 JSON 导出
+    "history": 20
+}
+
+memory_configs = {
+    # 每个会话中上传数据集的内存预算（MB），超出时把最久未访问的数据集转存到磁盘
+    "session_budget_mb": 512,
+    # 全进程（所有会话合计）的内存预算（MB），超出时跨会话转存最久未访问的数据集
+    "global_budget_mb": 2048,
+    # 转存文件目录（不压缩的 Feather，下次访问时整体读回内存并删除），会话结束后自动删除
+    "spill_dir": "persist_data/spill",
+    # 上传页“共享相同文件”选项的默认值：上传了字节完全相同文件的会话共用一份只读数据
+    "share_identical_uploads": False
+}
+
+chart_configs = {
+    # 指标分布等图网格是否合并为一张 subplot 图发送（减少每张图的序列化与前端渲染开销，但图例合并、不能单独缩放）
+    "combine_grid": False,
+    # 发送前是否压缩图的 JSON：数值按显示精度舍入、逐日日期改写为起点 + 步长、删掉默认值属性
+    "compact": True,
+    # 舍入时至少保留的小数位数与有效数字位数（取两者中保留更多的一种）
+    "round_decimals": 2,
+    "round_significant": 4
+}
+
+query_configs = {
+    # 趋势页聚合使用的后端："pandas"（内存中的 DataFrame 直接计算）或 "arrow"（Parquet 数据包 + Arrow 多线程计算）
+    "backend": "pandas",
+    # arrow 后端的 Parquet 数据包目录，每个会话一个子目录，会话结束后自动删除
+    "bundle_dir": "persist_data/query",
+    # 扫描、连接与分组聚合是否使用多线程
+    "use_threads": True,
+    # 超出内存的历史数据：Promoted / Purchased Sales 不放入会话内存，上传时（可多选文件，逐个追加）按时间段与 Campaign
+    # 分区写入会话的 Parquet 数据包；趋势页按时间窗口裁剪分区、逐个时间段分块聚合（需要 pyarrow，与 backend 无关）
+    "out_of_core": False,
+    # out_of_core 分区的时间粒度："month"（按月）或 "day"（按天，分区文件更多、裁剪更细）
+    "partition": "month",
+    # 分块聚合时每块最多读取的明细行数（相邻时间段合并为一块），决定长窗口下的峰值内存
+    "chunk_rows": 500_000
+}
+
+api_configs = {
+    # query.api 读取的 Parquet 数据包目录（由 python -m query.build 生成）
+    "bundle_dir": "persist_data/bundle",
+    "host": "127.0.0.1",
+    "port": 8600,
+    # 响应的 Cache-Control max-age（秒）；数据包重建后 ETag 随之变化
+    "max_age": 60,
+    # 进程内缓存的 JSON 响应个数
+    "cache_size": 256
+}
@@ -0,0 +1,150 @@
+import asyncio
+import random
+import time
+from collections import Counter
+
+import numpy as np
+
+
+class AdaptiveLimiter:
+    """
+    AIMD 并发控制：
+    - 请求成功且延迟正常时加性增长（约每个窗口 +1）；
+    - 遇到 429 / 5xx / 网络错误，或延迟超过基线的 latency_factor 倍时乘性减小（每个冷却期最多一次）。
+    """
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 64,
+                 latency_factor: float = 2.0, decrease: float = 0.5):
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_factor = latency_factor
+        self.decrease = decrease
+        self.in_flight = 0
+        self.baseline = None
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, latency: float):
+        # 基线取观测到的较低延迟（慢速回升的 EWMA），避免被单次抖动拉高
+        if self.baseline is None or latency < self.baseline:
+            self.baseline = latency
+        else:
+            self.baseline = 0.95 * self.baseline + 0.05 * latency
+        if latency > self.baseline * self.latency_factor:
+            self.on_overload(latency)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def on_overload(self, latency: float | None = None):
+        now = time.monotonic()
+        cooldown = latency or self.baseline or 0.1
+        if now - self._last_decrease >= cooldown:
+            self.limit = max(self.min_limit, self.limit * self.decrease)
+            self._last_decrease = now
+
+
+class CircuitBreaker:
+    """
+    连续失败 threshold 次后断开 cooldown 秒：断开期间请求直接失败，
+    冷却结束后放行探测请求（半开），成功即恢复。
+    """
+
+    def __init__(self, threshold: int = 10, cooldown: float = 30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or (self.opened_at is None and self.failures >= self.threshold):
+            self.opened_at = time.monotonic()
+            self.trips += 1
+
+
+def backoff_delay(attempt: int, base: float, cap: float = 30, retry_after: str | None = None) -> float:
+    """指数退避 + 全抖动；服务器给出 Retry-After（秒）时优先使用。"""
+    if retry_after:
+        try:
+            return min(cap, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class ScrapeMetrics:
+    """一次爬取的吞吐与错误统计，页面展示用。"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.finished = None
+        self.requests = 0
+        self.retries = 0
+        self.status_counts = Counter()
+        self.latencies = []
+        self.campaigns = 0
+        self.concurrency_limits = {}
+        self._active = 0
+
+    def begin(self):
+        """一个抓取器开始运行；多店铺时多个抓取器共享同一份统计。"""
+        self._active += 1
+        self.finished = None
+
+    def end(self):
+        self._active -= 1
+        if self._active == 0:
+            self.finished = time.monotonic()
+
+    def record(self, status, latency: float | None, limit: float, source=None):
+        self.requests += 1
+        self.status_counts[str(status)] += 1
+        if latency is not None:
+            self.latencies.append(latency)
+        self.concurrency_limits[source] = limit
+
+    def summary(self) -> dict:
+        elapsed = (self.finished or time.monotonic()) - self.started
+        lat = np.array(self.latencies, dtype=float)
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99]) if lat.size else (np.nan,) * 3
+        errors = sum(n for s, n in self.status_counts.items() if s not in ("200", "304"))
+        return {
+            "elapsed": elapsed,
+            "requests": self.requests,
+            "retries": self.retries,
+            "campaigns": self.campaigns,
+            "requests_per_sec": self.requests / elapsed if elapsed > 0 else 0.0,
+            "campaigns_per_sec": self.campaigns / elapsed if elapsed > 0 else 0.0,
+            "error_rate": errors / self.requests if self.requests else 0.0,
+            "latency_p50": float(p50),
+            "latency_p95": float(p95),
+            "latency_p99": float(p99),
+            # 多店铺时为各店铺并发上限之和
+            "concurrency_limit": sum(self.concurrency_limits.values()) if self.concurrency_limits else None,
+            "status_counts": dict(self.status_counts)
+        }
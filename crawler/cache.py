@@ -0,0 +1,61 @@
+import json
+import os
+import time
+
+
+class ResponseCache:
+    """
+    targeting 接口的磁盘响应缓存，跨会话共享。
+    每个 (store_id, campaign_id, page_size, page) 一个 JSON 文件，保存响应体、抓取时间与 ETag / Last-Modified。
+    - ttl: 缓存有效期（秒），过期后用 ETag / Last-Modified 做条件请求重新验证
+    """
+
+    def __init__(self, root: str, ttl: float):
+        self.root = root
+        self.ttl = ttl
+
+    def _path(self, store_id, campaign_id, page: int, page_size: int) -> str:
+        return os.path.join(self.root, str(store_id), str(campaign_id), f"p{page_size}_{page}.json")
+
+    def get(self, store_id, campaign_id, page: int, page_size: int) -> dict | None:
+        """读取缓存条目，不存在或损坏时返回 None。"""
+        try:
+            with open(self._path(store_id, campaign_id, page, page_size), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    @staticmethod
+    def validators(entry: dict) -> dict:
+        """根据缓存条目生成条件请求头。"""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, store_id, campaign_id, page: int, page_size: int, payload: dict,
+            etag: str | None = None, last_modified: str | None = None) -> dict:
+        entry = {
+            "fetched_at": time.time(),
+            "etag": etag,
+            "last_modified": last_modified,
+            "payload": payload
+        }
+        path = self._path(store_id, campaign_id, page, page_size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再替换，避免并发读到半个文件
+        tmp = f"{path}.{os.getpid()}.{id(entry)}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        return entry
+
+    def revalidated(self, store_id, campaign_id, page: int, page_size: int, entry: dict) -> dict:
+        """服务器返回 304 时刷新抓取时间，沿用缓存的响应体。"""
+        return self.put(store_id, campaign_id, page, page_size, entry["payload"],
+                        entry.get("etag"), entry.get("last_modified"))
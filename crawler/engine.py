@@ -0,0 +1,308 @@
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from crawler.adaptive import AdaptiveLimiter, CircuitBreaker, ScrapeMetrics, backoff_delay
+from crawler.cache import ResponseCache
+
+BASE_URL = "https://us.orangeapronmedia.com"
+TARGETING_PATH = "/api/v2/store/{store_id}/campaigns/{campaign_id}/targeting/"
+REFERER_PATH = "/r/{store_id}/campaign/details/{campaign_id}"
+# 有 on_result 回调时 run 返回的字段：payload 已在回调中消费，不再随返回值保留
+OUTCOME_KEYS = ("campaign_id", "status", "error", "from_cache", "incomplete")
+
+
+class TokenBucket:
+    """
+    令牌桶限速：平均每秒最多 rate 个请求，允许最多 capacity 个请求的突发。
+    遇到 429 时 throttle() 暂停发放并把速率减半，之后每次成功 recover() 逐步回升到初始速率。
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None, min_rate: float = 0.5):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, cancelled=None) -> bool:
+        """等待一个令牌；cancelled() 为真时立即放弃并返回 False。"""
+        async with self._lock:
+            while True:
+                if cancelled is not None and cancelled():
+                    return False
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(min(0.5, self._paused_until - now))
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                await asyncio.sleep(min(0.5, (1 - self._tokens) / self.rate))
+
+    def throttle(self, pause: float):
+        """被限流：暂停 pause 秒并清空令牌，速率减半。"""
+        now = time.monotonic()
+        if now >= self._paused_until:
+            self.rate = max(self.min_rate, self.rate * 0.5)
+        self._paused_until = max(self._paused_until, now + pause)
+        self._tokens = 0.0
+        self._updated = max(self._updated, self._paused_until)
+
+    def recover(self):
+        """请求成功：速率加性回升，每次成功回升初始速率的 1%。"""
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.01)
+
+
+def make_session(pool_size: int) -> requests.Session:
+    """创建带连接池的 Session，连接池大小与并发数一致，避免反复握手。"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class TargetingScraper:
+    """
+    并发抓取各 Campaign 的 targeting 接口。
+    - concurrency: 初始并发数；运行中由 AIMD 控制器在 [min_concurrency, max_concurrency] 内自适应调整
+    - rate / burst: 令牌桶限速（每秒请求数 / 突发容量），替代固定 sleep
+    - max_retries / retry_backoff: 429 / 5xx / 网络错误时的重试次数与退避基数（秒，带抖动）
+    - breaker_threshold / breaker_cooldown: 连续失败多少次后熔断，以及熔断时长（秒）
+    - base_url: 可指向本地 mock 服务器做测试
+    - cache: 可选的 ResponseCache；未过期的页直接读缓存，过期的页做条件请求
+    - offline: 只读缓存，不发任何请求
+    - cancel_event: 可选的 threading.Event，置位后尚未发出的请求直接放弃
+    - metrics: 可选的 ScrapeMetrics，记录吞吐、延迟与错误
+    """
+
+    def __init__(
+        self,
+        headers: dict,
+        store_id: str = "33602",
+        base_url: str = BASE_URL,
+        concurrency: int = 8,
+        rate: float = 4.0,
+        burst: float | None = None,
+        page_size: int = 10,
+        timeout: float = 30,
+        cache: ResponseCache | None = None,
+        offline: bool = False,
+        cancel_event=None,
+        min_concurrency: int = 1,
+        max_concurrency: int = 32,
+        latency_factor: float = 3.0,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        breaker_threshold: int = 10,
+        breaker_cooldown: float = 30,
+        metrics: ScrapeMetrics | None = None
+    ):
+        self.headers = headers
+        self.store_id = str(store_id)
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.page_size = page_size
+        self.timeout = timeout
+        self.cache = cache
+        self.offline = offline
+        self.cancel_event = cancel_event
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max(max_concurrency, concurrency)
+        self.latency_factor = latency_factor
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.metrics = metrics if metrics is not None else ScrapeMetrics()
+
+    def targeting_url(self, campaign_id) -> str:
+        return self.base_url + TARGETING_PATH.format(store_id=self.store_id, campaign_id=campaign_id)
+
+    def referer(self, campaign_id) -> str:
+        return BASE_URL + REFERER_PATH.format(store_id=self.store_id, campaign_id=campaign_id)
+
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    async def _request(self, campaign_id, page: int, entry: dict | None):
+        """
+        发出一次请求（含重试），返回 (response, error)。
+        429 / 5xx / 网络错误会让并发减半并按抖动退避重试；熔断期间直接失败。
+        """
+        headers = {**self.headers, "referer": self.referer(campaign_id)}
+        if entry is not None:
+            headers.update(self.cache.validators(entry))
+        params = {"page": page, "page_size": self.page_size}
+
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                return None, "熔断中：接口连续失败，暂停请求"
+            if not await self._bucket.acquire(self.cancelled):
+                return None, "已取消"
+            await self._limiter.acquire()
+            try:
+                if self.cancelled():
+                    return None, "已取消"
+                started = time.monotonic()
+                try:
+                    response = await self._loop.run_in_executor(
+                        self._executor,
+                        lambda: self._session.get(self.targeting_url(campaign_id), headers=headers, params=params, timeout=self.timeout)
+                    )
+                    error = None
+                except requests.RequestException as e:
+                    response, error = None, str(e)
+                latency = time.monotonic() - started
+            finally:
+                await self._limiter.release()
+
+            status = response.status_code if response is not None else None
+            self.metrics.record(status, latency, self._limiter.limit, self.store_id)
+            if response is not None and status != 429 and status < 500:
+                self._limiter.on_success(latency)
+                self._bucket.recover()
+                self.breaker.record_success()
+                return response, None
+
+            # 限流 / 服务端错误 / 网络错误：降并发、退避后重试；429 只是限流信号，不计入熔断
+            self._limiter.on_overload()
+            if status != 429:
+                self.breaker.record_failure()
+            if attempt == self.max_retries:
+                return response, error
+            self.metrics.retries += 1
+            retry_after = response.headers.get("Retry-After") if response is not None else None
+            delay = backoff_delay(attempt, self.retry_backoff, retry_after=retry_after)
+            if status == 429:
+                # 限流对所有请求生效：令牌桶整体暂停并降速，而不只是当前请求等待
+                self._bucket.throttle(delay)
+            await asyncio.sleep(delay)
+
+    async def _fetch(self, campaign_id, page=1) -> dict:
+        """请求单个 Campaign 的一页 targeting 结果，返回 {campaign_id, status, payload, error, from_cache}。"""
+        entry = self.cache.get(self.store_id, campaign_id, page, self.page_size) if self.cache else None
+        if entry is not None and (self.offline or self.cache.is_fresh(entry)):
+            return {"campaign_id": campaign_id, "status": 200, "payload": entry["payload"], "error": None, "from_cache": True}
+        if self.offline:
+            return {"campaign_id": campaign_id, "status": None, "payload": None, "error": "离线模式：缓存中没有该页", "from_cache": False}
+
+        response, error = await self._request(campaign_id, page, entry)
+        if response is None:
+            return {"campaign_id": campaign_id, "status": None, "payload": None, "error": error, "from_cache": False}
+
+        if response.status_code == 304 and entry is not None:
+            # 服务器确认内容未变，刷新缓存时间后沿用缓存
+            self.cache.revalidated(self.store_id, campaign_id, page, self.page_size, entry)
+            return {"campaign_id": campaign_id, "status": 200, "payload": entry["payload"], "error": None, "from_cache": True}
+        if response.status_code != 200:
+            return {"campaign_id": campaign_id, "status": response.status_code, "payload": None, "error": None, "from_cache": False}
+
+        payload = response.json()
+        if self.cache:
+            self.cache.put(self.store_id, campaign_id, page, self.page_size, payload,
+                           response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return {"campaign_id": campaign_id, "status": 200, "payload": payload, "error": None, "from_cache": False}
+
+    async def _fetch_campaign(self, campaign_id) -> dict:
+        """
+        抓取单个 Campaign 的全部 targeting 结果：
+        先取第 1 页读出总数 count，再并发请求剩余页并按页码顺序拼接 results。
+        """
+        first = await self._fetch(campaign_id, 1)
+        if first["status"] != 200:
+            return first
+
+        payload = first["payload"]
+        results = list(payload.get("results") or [])
+        count = payload.get("count")
+        if count is not None:
+            n_pages = math.ceil(count / self.page_size)
+            rest = await asyncio.gather(*(self._fetch(campaign_id, page) for page in range(2, n_pages + 1)))
+        else:
+            # 接口未返回 count 时，沿 next 链接顺序翻页
+            rest = []
+            page, has_next = 1, payload.get("next")
+            while has_next:
+                page += 1
+                outcome = await self._fetch(campaign_id, page)
+                rest.append(outcome)
+                has_next = outcome["status"] == 200 and outcome["payload"].get("next")
+
+        for outcome in rest:
+            if outcome["status"] != 200:
+                # 保留已拿到的页，并标记为不完整
+                return {**outcome, "payload": {**payload, "results": results}, "incomplete": True}
+            results.extend(outcome["payload"].get("results") or [])
+
+        return {
+            **first,
+            "payload": {**payload, "results": results},
+            "incomplete": False,
+            "from_cache": first["from_cache"] and all(o["from_cache"] for o in rest)
+        }
+
+    async def run(self, campaign_ids: list, on_result=None) -> list[dict]:
+        """
+        并发抓取所有 Campaign（含全部分页），结果顺序与 campaign_ids 一致。
+        on_result(outcome) 在每个 Campaign 完成时立即回调，用于进度汇报和增量写入；
+        传入 on_result 时，返回的结果不再带 payload（原始 results 在回调中消费后即可释放，
+        内存不随整次运行的原始 JSON 增长），只保留 OUTCOME_KEYS 中的状态字段。
+        """
+        self._loop = asyncio.get_running_loop()
+        self._bucket = TokenBucket(self.rate, self.burst)
+        self._limiter = AdaptiveLimiter(self.concurrency, self.min_concurrency, self.max_concurrency, self.latency_factor)
+
+        async def one(cid):
+            outcome = await self._fetch_campaign(cid)
+            self.metrics.campaigns += 1
+            if on_result is not None:
+                on_result(outcome)
+                return {key: outcome.get(key) for key in OUTCOME_KEYS}
+            return outcome
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as self._executor, \
+                make_session(self.max_concurrency) as self._session:
+            self.metrics.begin()
+            try:
+                return await asyncio.gather(*(one(cid) for cid in campaign_ids))
+            finally:
+                self.metrics.end()
+
+
+def scrape_campaigns(campaign_ids: list, headers: dict, on_result=None, **kwargs) -> list[dict]:
+    """同步入口：在当前线程中运行事件循环，供 Streamlit 页面或后台任务线程调用。"""
+    return asyncio.run(TargetingScraper(headers, **kwargs).run(campaign_ids, on_result))
+
+
+def scrape_stores(plan: dict, headers: dict, on_result=None, store_options: dict | None = None, **kwargs) -> dict:
+    """
+    一次运行中抓取多个店铺：plan 为 {store_id: [campaign_id, ...]}。
+    每个店铺使用独立的 TargetingScraper，即各自的令牌桶、并发上限与熔断器（store_options[store_id] 覆盖默认参数），
+    所有店铺在同一个事件循环中并行。回调的 outcome 额外带有 store_id。返回 {store_id: [outcome, ...]}。
+    """
+    store_options = store_options or {}
+
+    async def run_all():
+        async def run_store(store_id, campaign_ids):
+            callback = None
+            if on_result is not None:
+                callback = lambda outcome: on_result({**outcome, "store_id": store_id})
+            scraper = TargetingScraper(headers, store_id=store_id, **{**kwargs, **store_options.get(str(store_id), {})})
+            return await scraper.run(campaign_ids, callback)
+
+        outcomes = await asyncio.gather(*(run_store(store_id, ids) for store_id, ids in plan.items()))
+        return dict(zip(plan, outcomes))
+
+    return asyncio.run(run_all())
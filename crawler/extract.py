@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+# 输出列顺序，与原先逐条 extract_product 的字段一致
+PRODUCT_COLUMNS = [
+    'ad_id', 'spend', 'ctr', 'impressions', 'roas', 'brandHaloRoas', 'sku',
+    'status', 'bid(CPC)', 'product_name', 'price', 'image', 'campaign_id', 'store_id'
+]
+NUMERIC_COLUMNS = ['spend', 'ctr', 'impressions', 'roas', 'brandHaloRoas', 'bid(CPC)']
+
+
+def _or_none(values):
+    """空值（None、0、''）统一为 None，与原 extract_product 的处理一致。"""
+    return [v if v else None for v in values]
+
+
+def extract_columns(results: list) -> dict[str, list]:
+    """
+    把一个响应的 results 数组批量映射为列：每个嵌套对象（metrics / creative / images）只取一次，
+    再按列用列表推导取值，不再逐条构造 dict。
+    """
+    metrics = [item.get('metrics') or {} for item in results]
+    creative = [item.get('creative') or {} for item in results]
+    images = [c.get('images') or {} for c in creative]
+    prices = [c.get('price') for c in creative]
+    return {
+        'ad_id': _or_none(item.get('adId') for item in results),
+        'spend': _or_none(m.get('adSpend') for m in metrics),
+        'ctr': _or_none(m.get('ctr') for m in metrics),
+        'impressions': _or_none(m.get('impressions') for m in metrics),
+        'roas': _or_none(m.get('roas') for m in metrics),
+        'brandHaloRoas': _or_none(m.get('brandHaloRoas') for m in metrics),
+        'sku': _or_none(item.get('sku') for item in results),
+        'status': _or_none(item.get('active') for item in results),
+        'bid(CPC)': _or_none(item.get('bid') for item in results),
+        'product_name': _or_none(c.get('name') for c in creative),
+        'price': [f"{float(p):.2f}" if p else None for p in prices],
+        'image': [i.get('standard') for i in images],
+    }
+
+
+class ProductColumns:
+    """
+    按列增长的产品结果缓冲区。每个 Campaign 的 results 批量追加到各列，
+    内存只与输出列的数据量成正比，结束时一次性转为 DataFrame。
+    """
+
+    def __init__(self):
+        self.columns = {name: [] for name in PRODUCT_COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self.columns['campaign_id'])
+
+    def extend(self, campaign_id, results: list, store_id=None):
+        for name, values in extract_columns(results).items():
+            self.columns[name].extend(values)
+        self.columns['campaign_id'].extend([campaign_id] * len(results))
+        self.columns['store_id'].extend([store_id] * len(results))
+
+    def to_frame(self) -> pd.DataFrame:
+        data = {}
+        for name, values in self.columns.items():
+            if name in NUMERIC_COLUMNS:
+                # None -> NaN，数值列尽量存为 float64 而不是 object
+                try:
+                    data[name] = np.array(values, dtype=float)
+                    continue
+                except (TypeError, ValueError):
+                    pass
+            data[name] = pd.Series(values, dtype=object)
+        return pd.DataFrame(data, columns=PRODUCT_COLUMNS)
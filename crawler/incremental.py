@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+# 同一进程内的多个后台任务可能同时保存状态文件，读-合并-写需串行
+_save_lock = threading.Lock()
+
+
+def results_fingerprint(results: list) -> str:
+    """对一个 Campaign 的 targeting results 生成稳定指纹，用于判断结果是否变化。"""
+    raw = json.dumps(results, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ScrapeState:
+    """
+    每个 (store_id, campaign_id) 的上次抓取时间与结果指纹，持久化在一个 JSON 文件中。
+    多个任务可以同时持有各自的 ScrapeState：save 时只把本对象记录过的条目合并进磁盘上的最新状态。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._state = self._read()
+        # 自上次保存以来 record 过的 (store_id, campaign_id)
+        self._dirty = set()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, store_id, campaign_id) -> dict | None:
+        return self._state.get(str(store_id), {}).get(str(campaign_id))
+
+    def changed(self, store_id, campaign_id, fingerprint: str) -> bool:
+        """结果相对上次记录的指纹是否有变化（不记录）。"""
+        prev = self.get(store_id, campaign_id)
+        return prev is None or prev["fingerprint"] != fingerprint
+
+    def record(self, store_id, campaign_id, fingerprint: str) -> bool:
+        """记录一次成功抓取，返回结果相对上次是否有变化。结果需写入结果表时，应在写入成功后再记录。"""
+        changed = self.changed(store_id, campaign_id, fingerprint)
+        self._state.setdefault(str(store_id), {})[str(campaign_id)] = {
+            "scraped_at": time.time(),
+            "fingerprint": fingerprint
+        }
+        self._dirty.add((str(store_id), str(campaign_id)))
+        return changed
+
+    def save(self):
+        """
+        重新读取磁盘上的状态，合并本对象记录过的条目（同一 Campaign 以抓取时间较新的为准）后写回，
+        并发的任务不会互相覆盖对方的指纹。
+        """
+        with _save_lock:
+            merged = self._read()
+            for store_id, campaign_id in self._dirty:
+                ours = self._state[store_id][campaign_id]
+                theirs = merged.get(store_id, {}).get(campaign_id)
+                if theirs is None or theirs["scraped_at"] <= ours["scraped_at"]:
+                    merged.setdefault(store_id, {})[campaign_id] = ours
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(merged, f)
+            os.replace(tmp, self.path)
+            self._state = merged
+            self._dirty.clear()
+
+
+def select_campaigns(
+    campaign: pd.DataFrame,
+    state: ScrapeState,
+    store_id,
+    max_age: float,
+    known_ids: set | None = None,
+    date_col: str = "Interval",
+    spend_col: str = "Spend (sum)"
+) -> dict[str, str]:
+    """
+    增量模式下挑选需要重新抓取的 Campaign，返回 {campaign_id: 原因}。
+    只考虑 running 的 Campaign，满足以下任一条件即重新抓取：
+    - 最新 Interval 有花费；
+    - 从未抓取过，或上次抓取早于 max_age 秒；
+    - 结果表中还没有它（known_ids，按字符串比较）。
+    """
+    running = campaign
+    if "Status" in campaign.columns:
+        running = campaign[campaign["Status"] == "running"]
+
+    latest = running[date_col].max()
+    spending = set(running.loc[(running[date_col] == latest) & (running[spend_col] > 0), "Campaign ID"])
+
+    now = time.time()
+    selected = {}
+    for cid in running["Campaign ID"].unique():
+        prev = state.get(store_id, cid)
+        if prev is None:
+            selected[cid] = "从未抓取"
+        elif now - prev["scraped_at"] > max_age:
+            selected[cid] = "结果已过期"
+        elif cid in spending:
+            selected[cid] = f"{latest} 有花费"
+        elif known_ids is not None and str(cid) not in known_ids:
+            selected[cid] = "结果表中无该 Campaign"
+    return selected
+
+
+def patch_results(existing: pd.DataFrame | None, updates: pd.DataFrame, campaign_ids: list) -> pd.DataFrame:
+    """用 updates 替换 existing 中 campaign_ids 对应的行，其余 Campaign 的行保持不变。"""
+    if existing is None or existing.empty:
+        return updates.reset_index(drop=True)
+    kept = existing[~existing["campaign_id"].isin(campaign_ids)]
+    return pd.concat([kept, updates], ignore_index=True)
@@ -0,0 +1,121 @@
+import threading
+import time
+import uuid
+
+from crawler.adaptive import ScrapeMetrics
+
+
+class ScrapeJob:
+    """
+    一次后台爬取任务的状态。工作线程写入进度与结果，页面轮询读取。
+    - changed_ids: 结果有变化（由工作线程分批写入结果表）的 (store_id, campaign_id)
+    - metrics: 请求级的吞吐、延迟与错误统计，由爬虫引擎写入
+    """
+
+    def __init__(self, job_id: str, total: int):
+        self.id = job_id
+        self.status = "running"
+        self.total = total
+        self.done = 0
+        self.cached = 0
+        self.skipped = 0
+        self.products = 0
+        self.errors = []
+        self.changed_ids = []
+        self.metrics = ScrapeMetrics()
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status != "running"
+
+    def add_result(self, campaign_id, results: list, changed: bool, from_cache: bool, store_id=None):
+        """记录一个 Campaign 的进度；结果本身由工作线程写入结果表。"""
+        with self.lock:
+            self.done += 1
+            self.cached += int(from_cache)
+            self.products += len(results)
+            if changed:
+                self.changed_ids.append((store_id, campaign_id))
+
+    def add_skip(self):
+        """Campaign 不属于该店铺（接口 404），计入完成数但不算错误。"""
+        with self.lock:
+            self.done += 1
+            self.skipped += 1
+
+    def add_error(self, campaign_id, message):
+        with self.lock:
+            self.done += 1
+            self.errors.append(f"{campaign_id}: {message}")
+
+    def add_warning(self, message: str):
+        with self.lock:
+            self.errors.append(message)
+
+    def snapshot(self) -> dict:
+        """线程安全地读取当前进度，供页面展示。"""
+        with self.lock:
+            end = self.finished_at or time.time()
+            return {
+                "id": self.id,
+                "status": self.status,
+                "total": self.total,
+                "done": self.done,
+                "cached": self.cached,
+                "skipped": self.skipped,
+                "products": self.products,
+                "errors": list(self.errors),
+                "elapsed": end - self.started_at,
+                "error": self.error,
+                "metrics": self.metrics.summary()
+            }
+
+
+class JobRunner:
+    """在工作线程中运行爬取任务；任务以 job ID 索引，不随页面切换或重跑而中断。"""
+
+    def __init__(self, keep_seconds: float = 24 * 3600):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.keep_seconds = keep_seconds
+
+    def submit(self, target, total: int, *args, **kwargs) -> str:
+        """启动任务，target(job, *args, **kwargs) 在工作线程中执行，返回 job ID。"""
+        job = ScrapeJob(uuid.uuid4().hex[:12], total)
+
+        def work():
+            try:
+                target(job, *args, **kwargs)
+                status = "cancelled" if job.cancel_event.is_set() else "done"
+            except Exception as e:
+                job.error = str(e)
+                status = "failed"
+            with job.lock:
+                job.status = status
+                job.finished_at = time.time()
+
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        threading.Thread(target=work, name=f"scrape-{job.id}", daemon=True).start()
+        return job.id
+
+    def get(self, job_id: str) -> ScrapeJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel_event.set()
+
+    def _prune(self):
+        """清理结束已久的任务，避免注册表无限增长。"""
+        now = time.time()
+        for job_id in [j.id for j in self._jobs.values() if j.finished and now - j.finished_at > self.keep_seconds]:
+            del self._jobs[job_id]
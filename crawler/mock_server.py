@@ -0,0 +1,249 @@
+"""
+本地 targeting 接口替身，用于在不访问真实平台的情况下测试和压测爬虫：
+    python -m crawler.mock_server --port 8765 --rate 20 --latency lognormal:0.08,0.6 --error-rate 0.02 --products 50-400
+然后把 config.scraper_configs["base_url"] 改为 http://127.0.0.1:8765 即可。
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+TARGETING_RE = re.compile(r"/api/v2/store/(?P<store_id>\w+)/campaigns/(?P<campaign_id>\w+)/targeting/?$")
+
+
+def parse_latency(spec) -> Callable[[random.Random], float]:
+    """
+    解析延迟分布，返回 sample(rng) -> 秒：
+    - 数字或 const:0.05          固定延迟
+    - uniform:0.02,0.2           均匀分布
+    - exp:0.05                   指数分布（均值）
+    - lognormal:0.08,0.6         对数正态（中位数, sigma），长尾
+    """
+    if callable(spec):
+        return spec
+    kind, _, args = str(spec).partition(":")
+    if not args:
+        kind, args = "const", kind
+    params = [float(x) for x in args.split(",")]
+    if kind == "const":
+        return lambda rng: params[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1 / params[0])
+    if kind == "lognormal":
+        median, sigma = params
+        return lambda rng: rng.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"未知的延迟分布：{spec}")
+
+
+def parse_products(spec) -> Callable[[str], int]:
+    """
+    解析每个 Campaign 的产品数，返回 count(campaign_id) -> int，同一 Campaign 结果固定：
+    - None        按 Campaign ID 取模 37
+    - 120         固定数量
+    - 50-400      在区间内按 Campaign ID 哈希取值
+    """
+    if callable(spec):
+        return spec
+    if spec is None:
+        return lambda cid: int(cid) % 37 if str(cid).isdigit() else 10
+    low, _, high = str(spec).partition("-")
+    low, high = int(low), int(high or low)
+
+    def count(cid):
+        digest = int(hashlib.md5(str(cid).encode()).hexdigest()[:8], 16)
+        return low + digest % (high - low + 1)
+
+    return count
+
+
+def synthetic_results(campaign_id, start: int, stop: int) -> list[dict]:
+    """生成与真实接口结构一致的 targeting results，同一 Campaign 每次返回相同内容。"""
+    results = []
+    for i in range(start, stop):
+        results.append({
+            "adId": f"{campaign_id}-{i}",
+            "sku": str(300000000 + i),
+            "active": i % 3 != 0,
+            "bid": round(0.3 + (i % 7) * 0.1, 2),
+            "metrics": {
+                "adSpend": round((i % 11) * 1.7, 2),
+                "ctr": round((i % 5) * 0.013, 4),
+                "impressions": (i % 13) * 120,
+                "roas": round((i % 9) * 0.8, 2),
+                "brandHaloRoas": round((i % 4) * 0.5, 2)
+            },
+            "creative": {
+                "name": f"Product {i}",
+                "price": f"{9.99 + i % 50:.2f}",
+                "images": {"standard": f"https://example.invalid/{campaign_id}/{i}.jpg"}
+            }
+        })
+    return results
+
+
+class MockTargetingServer:
+    """
+    模拟 targeting 接口及其限流行为：
+    - products_per_campaign: 每个 Campaign 的产品数（见 parse_products），决定分页数
+    - latency: 基础响应延迟分布（见 parse_latency）
+    - capacity: 同时处理的请求数超过 capacity 后，延迟随在途请求数线性上升
+    - rate_limit: 每秒允许的请求数，超出时返回 429 并附带 Retry-After
+    - error_rate: 按该比例随机返回 error_status（默认 503），模拟服务端故障
+    - seed: 随机数种子，便于复现压测结果
+    - 支持 ETag / If-None-Match 条件请求
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, products_per_campaign=None,
+                 latency=0.05, capacity: int = 16, rate_limit: float | None = None,
+                 retry_after: float = 1.0, error_rate: float = 0.0, error_status: int = 503,
+                 seed: int | None = None):
+        self.products_per_campaign = parse_products(products_per_campaign)
+        self.latency = parse_latency(latency)
+        self.capacity = capacity
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.status_counts = Counter()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._rng = random.Random(seed)
+        self._window = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-targeting", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _admit(self) -> bool:
+        """滑动 1 秒窗口计数，超过 rate_limit 则拒绝。"""
+        if self.rate_limit is None:
+            return True
+        now = time.monotonic()
+        self._window = [t for t in self._window if now - t < 1.0]
+        if len(self._window) >= self.rate_limit:
+            return False
+        self._window.append(now)
+        return True
+
+    def respond(self, path: str, query: dict, request_headers) -> tuple[int, dict, bytes]:
+        """处理一次请求，返回 (状态码, 响应头, 响应体)。"""
+        match = TARGETING_RE.match(path)
+        if match is None:
+            return 404, {}, b""
+
+        with self._lock:
+            if not self._admit():
+                return 429, {"Retry-After": str(self.retry_after)}, b""
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            load = self.in_flight
+            delay = self.latency(self._rng)
+            failed = self._rng.random() < self.error_rate
+        try:
+            # 过载时延迟随在途请求数上升，模拟后端排队
+            time.sleep(delay * max(1.0, load / self.capacity))
+            if failed:
+                return self.error_status, {}, b""
+
+            campaign_id = match["campaign_id"]
+            page = int(query.get("page", ["1"])[0])
+            page_size = int(query.get("page_size", ["10"])[0])
+            count = self.products_per_campaign(campaign_id)
+            start = (page - 1) * page_size
+            body = json.dumps({
+                "count": count,
+                "next": page + 1 if start + page_size < count else None,
+                "results": synthetic_results(campaign_id, start, min(count, start + page_size))
+            }).encode("utf-8")
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            if request_headers.get("If-None-Match") == etag:
+                return 304, {"ETag": etag}, b""
+            return 200, {"ETag": etag, "Content-Type": "application/json"}, body
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                status, headers, body = server.respond(url.path, parse_qs(url.query), self.headers)
+                with server._lock:
+                    server.status_counts[status] += 1
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 targeting 接口替身")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 表示随机端口")
+    parser.add_argument("--latency", default="0.05", help="延迟分布，如 0.05、uniform:0.02,0.2、lognormal:0.08,0.6")
+    parser.add_argument("--capacity", type=int, default=16, help="超过该在途请求数后延迟上升")
+    parser.add_argument("--rate", type=float, default=None, help="每秒请求上限，超出返回 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 5xx 的比例")
+    parser.add_argument("--products", default=None, help="每个 Campaign 的产品数，如 120 或 50-400")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = MockTargetingServer(
+        args.host, args.port, products_per_campaign=args.products, latency=args.latency,
+        capacity=args.capacity, rate_limit=args.rate, error_rate=args.error_rate, seed=args.seed
+    )
+    # 第一行输出地址，供压测脚本以子进程方式启动时读取
+    print(f"mock targeting server on {server.base_url}", flush=True)
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+        print(dict(server.status_counts), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
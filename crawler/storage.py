@@ -0,0 +1,217 @@
+import itertools
+import json
+import os
+import shutil
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from crawler.extract import PRODUCT_COLUMNS, ProductColumns
+from crawler.incremental import ScrapeState, patch_results
+
+# 产品结果的列式 schema；store_id 来自分区目录，不写入文件
+PRODUCT_SCHEMA = pa.schema([
+    ("ad_id", pa.string()),
+    ("spend", pa.float64()),
+    ("ctr", pa.float64()),
+    ("impressions", pa.float64()),
+    ("roas", pa.float64()),
+    ("brandHaloRoas", pa.float64()),
+    ("sku", pa.string()),
+    ("status", pa.bool_()),
+    ("bid(CPC)", pa.float64()),
+    ("product_name", pa.string()),
+    ("price", pa.string()),
+    ("image", pa.string()),
+    ("campaign_id", pa.string()),
+])
+PARTITIONING = ds.partitioning(pa.schema([("store_id", pa.string())]), flavor="hive")
+
+# schema 中为字符串、但接口可能返回数字的 ID 列
+ID_COLUMNS = ["ad_id", "sku", "campaign_id"]
+
+# 爬取过程中分批写入的增量文件（part-<序号>.parquet），按序号顺序合并进 data.parquet；
+# 文件的 schema 元数据记录这批覆盖的 campaign_id（包括没有产品的 Campaign）
+PART_PREFIX = "part-"
+PART_IDS_KEY = b"campaign_ids"
+
+# 同一进程内的多个会话可能同时写同一店铺分区，读-改-写需串行
+_write_lock = threading.Lock()
+_part_seq = itertools.count()
+
+
+def _as_string_ids(df: pd.DataFrame) -> pd.DataFrame:
+    """ID 列统一转为字符串（保留空值），接口返回数字 adId / sku 时写入 string 列不会报错。"""
+    return df.assign(**{col: df[col].astype("string") for col in ID_COLUMNS if col in df.columns})
+
+
+def _to_table(df: pd.DataFrame) -> pa.Table:
+    return pa.Table.from_pandas(_as_string_ids(df)[PRODUCT_SCHEMA.names], schema=PRODUCT_SCHEMA, preserve_index=False)
+
+
+class PartitionedResults:
+    """
+    按店铺分区的产品结果表（Parquet，hive 分区 root/store_id=<id>/data.parquet），跨会话共享。
+    读取时按店铺做分区裁剪，只加载所选店铺的数据。
+    爬取过程中的结果用 write_part 写成独立的增量文件（只写这一批，不读改写整个分区），
+    compact 时一次性合并进 data.parquet；读取只看 data.parquet，不会读到合并到一半的结果。
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _dir(self, store_id) -> str:
+        return os.path.join(self.root, f"store_id={store_id}")
+
+    def stores(self) -> list[str]:
+        """已有结果的店铺 ID。"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name.split("=", 1)[1] for name in os.listdir(self.root)
+            if name.startswith("store_id=") and os.path.exists(os.path.join(self.root, name, "data.parquet"))
+        )
+
+    def read(self, store_ids=None, columns: list | None = None) -> pd.DataFrame:
+        """读取指定店铺（默认全部）的结果，返回带 store_id 列的 DataFrame。"""
+        existing = self.stores()
+        wanted = existing if store_ids is None else [str(s) for s in store_ids if str(s) in existing]
+        if not wanted:
+            return pd.DataFrame(columns=PRODUCT_COLUMNS)
+        dataset = ds.dataset([os.path.join(self._dir(s), "data.parquet") for s in wanted], format="parquet",
+                             partitioning=PARTITIONING, partition_base_dir=self.root,
+                             schema=PRODUCT_SCHEMA.append(pa.field("store_id", pa.string())))
+        table = dataset.to_table(columns=columns)
+        return table.to_pandas()
+
+    def write(self, store_id, df: pd.DataFrame):
+        """整体替换一个店铺分区。"""
+        self._write_file(store_id, "data.parquet", _to_table(df))
+
+    def _write_file(self, store_id, file: str, table: pa.Table):
+        directory = self._dir(store_id)
+        os.makedirs(directory, exist_ok=True)
+        # 先写临时文件再替换，读者不会读到半个文件
+        tmp = os.path.join(directory, f".{file}.{os.getpid()}.{threading.get_ident()}.tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, os.path.join(directory, file))
+
+    def _parts(self, store_id) -> list[str]:
+        """该店铺尚未合并的增量文件，按写入顺序排列。"""
+        directory = self._dir(store_id)
+        if not os.path.isdir(directory):
+            return []
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.startswith(PART_PREFIX)]
+
+    def write_part(self, store_id, updates: pd.DataFrame, campaign_ids: list):
+        """把一批 Campaign 的结果写成增量文件，耗时只与这批结果的大小有关；compact 后才对读取可见。"""
+        table = _to_table(updates).replace_schema_metadata(
+            {PART_IDS_KEY: json.dumps([str(c) for c in campaign_ids])}
+        )
+        # 文件名按 (时间, 进程内序号) 排序，即写入顺序
+        self._write_file(store_id, f"{PART_PREFIX}{time.time_ns():020d}-{next(_part_seq):08d}.parquet", table)
+
+    def compact(self, store_id) -> int:
+        """按写入顺序把增量文件合并进 data.parquet（后写入的 Campaign 替换先前的行），返回合并的文件数。"""
+        with _write_lock:
+            parts = self._parts(store_id)
+            if not parts:
+                return 0
+            merged = self.read([store_id], columns=PRODUCT_SCHEMA.names)
+            for path in parts:
+                table = pq.read_table(path)
+                campaign_ids = json.loads(table.schema.metadata[PART_IDS_KEY])
+                merged = patch_results(merged, table.to_pandas(), campaign_ids)
+            self.write(store_id, merged)
+            for path in parts:
+                os.remove(path)
+            return len(parts)
+
+    def patch(self, store_id, updates: pd.DataFrame, campaign_ids: list):
+        """用 updates 替换该店铺分区中 campaign_ids 对应的行，其余行保持不变。"""
+        with _write_lock:
+            existing = self.read([store_id], columns=PRODUCT_SCHEMA.names)
+            updates = _as_string_ids(updates)
+            self.write(store_id, patch_results(existing, updates, [str(c) for c in campaign_ids]))
+
+    def replace(self, store_id, df: pd.DataFrame):
+        with _write_lock:
+            self.write(store_id, df)
+
+    def retain(self, store_id, campaign_ids: list):
+        """只保留该店铺分区中 campaign_ids 对应的行（全量爬取结束后删除本次没有结果的 Campaign）。"""
+        with _write_lock:
+            existing = self.read([store_id], columns=PRODUCT_SCHEMA.names)
+            if existing.empty:
+                return
+            self.write(store_id, existing[existing["campaign_id"].isin([str(c) for c in campaign_ids])])
+
+    def drop(self, store_id):
+        with _write_lock:
+            shutil.rmtree(self._dir(store_id), ignore_errors=True)
+
+
+class ResultsWriter:
+    """
+    爬取过程中把各 Campaign 的结果分批写入 PartitionedResults，而不是等整个任务结束后由页面写回。
+    - 每个店铺攒够 flush_every 个 Campaign 写一个增量文件（只写这一批，在事件循环线程中也只短暂阻塞），
+      任务结束时 compact 一次性合并进店铺分区
+    - 只有写入成功后才把这批 Campaign 的指纹记入 ScrapeState 并保存，状态文件与结果表始终一致；
+      写入失败时这批 Campaign 保留上次的指纹，下次增量爬取仍会按结果表重新判断
+    """
+
+    def __init__(self, store: PartitionedResults, state: ScrapeState, flush_every: int = 20):
+        self.store = store
+        self.state = state
+        self.flush_every = max(1, flush_every)
+        # {store_id: (列缓冲区, [(campaign_id, 指纹或 None)])}
+        self._pending = {}
+        # {store_id: 已写入结果表的 campaign_id 集合}
+        self.written = {}
+        self.failed = False
+
+    def add(self, store_id, campaign_id, results: list, fingerprint: str | None, write: bool = True):
+        """
+        登记一个 Campaign 的结果：write 为 False（结果未变且结果表中已有）时只更新指纹；
+        fingerprint 为 None（部分分页失败）时写入结果但不记录指纹。该店铺攒够一批时立即写入。
+        """
+        if not write:
+            if fingerprint is not None:
+                self.state.record(store_id, campaign_id, fingerprint)
+            return
+        buffer, campaigns = self._pending.setdefault(store_id, (ProductColumns(), []))
+        buffer.extend(campaign_id, results, store_id)
+        campaigns.append((campaign_id, fingerprint))
+        if len(campaigns) >= self.flush_every:
+            self.flush(store_id)
+
+    def flush(self, store_id=None):
+        """写入待写的结果（默认全部店铺），成功后记录指纹并保存状态；写入失败时抛出最后一个异常。"""
+        error = None
+        for sid in [store_id] if store_id is not None else list(self._pending):
+            if sid not in self._pending:
+                continue
+            buffer, campaigns = self._pending.pop(sid)
+            ids = [cid for cid, _ in campaigns]
+            try:
+                self.store.write_part(sid, buffer.to_frame().drop(columns="store_id"), ids)
+            except Exception as e:
+                self.failed = True
+                error = e
+                continue
+            self.written.setdefault(sid, set()).update(str(cid) for cid in ids)
+            for cid, fingerprint in campaigns:
+                if fingerprint is not None:
+                    self.state.record(sid, cid, fingerprint)
+        self.state.save()
+        if error is not None:
+            raise error
+
+    def compact(self, store_ids):
+        """把各店铺的增量文件合并进结果表；增量文件已落盘，合并失败时下次任务开始前会再次合并。"""
+        for store_id in store_ids:
+            self.store.compact(store_id)
@@ -1,9 +1,10 @@
-import requests
-import pandas as pd
-import json
-import time
 import streamlit as st
-# 提取单个产品的函数
+from config import scraper_configs
+from crawler.cache import ResponseCache
+from crawler.incremental import ScrapeState, results_fingerprint, select_campaigns
+from crawler.jobs import JobRunner
+from crawler.storage import PartitionedResults, ResultsWriter
+from utils.table_view import paged_dataframe
 
 headers = {
     "accept": "application/json",
@@ -29,42 +30,198 @@ headers = {
 }
 
 
-def extract_product(product_dict: dict):
-    """提取产品的相关信息"""
-    if product_dict:
-        ad_id = product_dict.get('adId')
-        metrics = product_dict.get('metrics')
-
-        if metrics:
-            spend = metrics.get('adSpend')
-            ctr = metrics.get('ctr')
-            impressions = metrics.get('impressions')
-            roas = metrics.get('roas')
-            brandHaloRoas = metrics.get('brandHaloRoas')
-
-        sku = product_dict.get('sku')
-        status = product_dict.get('active')
-        bid = product_dict.get('bid')
-        product_name = product_dict.get('creative').get('name')
-        price = product_dict.get('creative').get('price')
-        images = product_dict.get('creative').get('images')
-        image_url = images.get('standard') if images else None
-    data_dict = {
-        'ad_id': ad_id if ad_id else None,
-        'spend': spend if spend else None,
-        'ctr': ctr if ctr else None,
-        'impressions': impressions if impressions else None,
-        'roas': roas if roas else None,
-        'brandHaloRoas': brandHaloRoas if brandHaloRoas else None,
-        'sku': sku if sku else None,
-        'status': status if status else None,
-        'bid(CPC)': bid if bid else None,
-        'product_name': product_name if product_name else None,
-        'price': f"{float(price):.2f}" if price else None,
-        'image': image_url
-    }
-
-    return data_dict
+@st.cache_resource
+def get_job_runner() -> JobRunner:
+    """全局唯一的后台任务注册表，跨 rerun 和页面切换保留。"""
+    return JobRunner()
+
+
+@st.cache_resource
+def get_results_store() -> PartitionedResults:
+    """按店铺分区的产品结果表，所有会话共用。"""
+    return PartitionedResults(scraper_configs["results_dir"])
+
+
+def run_scrape(job, plan: dict, known_ids: set, incremental: bool, offline: bool, results_store: PartitionedResults):
+    """
+    后台线程中执行的爬取流程：plan 为 {store_id: [campaign_id, ...]}，各店铺并行抓取，
+    每个 Campaign 完成即解析，由 ResultsWriter 分批写成增量文件、结束时合并进 results_store，写入成功后才记录指纹；
+    不依赖发起任务的会话在任务结束后重新打开页面。known_ids 为结果表中已有的 (store_id, campaign_id)。
+    """
+    # 抓取引擎（连带 requests）只在真正开始爬取时才导入，打开页面不需要
+    from crawler.engine import scrape_stores
+
+    writer = ResultsWriter(results_store, ScrapeState(scraper_configs["state_file"]), scraper_configs["flush_campaigns"])
+    # 上次任务中断时留下的增量文件先合并，本次的结果才能按顺序覆盖它们
+    writer.compact(plan)
+
+    def on_result(outcome):
+        store_id, campaign_id = outcome['store_id'], outcome['campaign_id']
+        if outcome['payload'] is None and job.cancel_event.is_set():
+            # 取消后放弃的请求不计入错误
+            return
+        if outcome['status'] == 404:
+            # 该 Campaign 不属于这个店铺
+            job.add_skip()
+            return
+        if outcome['payload'] is None:
+            job.add_error(f"{store_id}/{campaign_id}", outcome['status'] or outcome['error'])
+            return
+
+        results = outcome['payload'].get('results') or []
+        if outcome.get('incomplete'):
+            # 部分分页失败：保留已拿到的结果，但不更新指纹
+            job.add_warning(f"{store_id}/{campaign_id}: 部分分页抓取失败（{outcome['status'] or outcome['error']}），结果不完整")
+            fingerprint, changed = None, True
+        else:
+            fingerprint = results_fingerprint(results)
+            changed = writer.state.changed(store_id, campaign_id, fingerprint)
+            # 指纹未变且结果表已有该 Campaign（或本就没有产品），则无需改动
+            changed = changed or not incremental or ((store_id, str(campaign_id)) not in known_ids and bool(results))
+
+        job.add_result(campaign_id, results, changed, outcome.get('from_cache', False), store_id)
+        try:
+            writer.add(store_id, campaign_id, results, fingerprint, write=changed)
+        except Exception as e:
+            job.add_warning(f"{store_id}: 写入结果表失败（{e}），这批 Campaign 的指纹未更新，下次爬取会重新写入")
+
+    try:
+        # 各店铺并发抓取：令牌桶限速 + 自适应并发 + 重试与熔断，店铺之间预算独立
+        scrape_stores(
+            plan,
+            headers,
+            on_result=on_result,
+            store_options=scraper_configs["store_budgets"],
+            base_url=scraper_configs["base_url"],
+            concurrency=scraper_configs["concurrency"],
+            min_concurrency=scraper_configs["min_concurrency"],
+            max_concurrency=scraper_configs["max_concurrency"],
+            latency_factor=scraper_configs["latency_factor"],
+            max_retries=scraper_configs["max_retries"],
+            retry_backoff=scraper_configs["retry_backoff"],
+            breaker_threshold=scraper_configs["breaker_threshold"],
+            breaker_cooldown=scraper_configs["breaker_cooldown"],
+            rate=scraper_configs["rate_per_sec"],
+            burst=scraper_configs["burst"],
+            page_size=scraper_configs["page_size"],
+            timeout=scraper_configs["timeout"],
+            cache=ResponseCache(scraper_configs["cache_dir"], scraper_configs["cache_ttl"]),
+            offline=offline,
+            cancel_event=job.cancel_event,
+            metrics=job.metrics
+        )
+    finally:
+        try:
+            writer.flush()
+        except Exception as e:
+            job.add_warning(f"写入结果表失败（{e}），这批 Campaign 的指纹未更新，下次爬取会重新写入")
+        writer.compact(plan)
+    if not incremental and not job.cancel_event.is_set() and not writer.failed:
+        # 全量爬取完整结束：删除各店铺中本次没有结果的 Campaign（与整体替换店铺分区的效果一致）
+        for store_id in plan:
+            results_store.retain(store_id, writer.written.get(store_id, set()))
+
+
+def load_product_results(store_ids: list):
+    """从分区结果表中只读取所选店铺的结果，放入会话。"""
+    df = get_results_store().read(store_ids)
+    st.session_state['product_results'] = df if not df.empty else None
+    st.session_state['product_results_stores'] = list(store_ids)
+
+
+def show_run_metrics(metrics: dict):
+    """展示本次爬取的吞吐、延迟与错误统计。"""
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("请求 / 秒", f"{metrics['requests_per_sec']:.1f}")
+    col2.metric("Campaign / 秒", f"{metrics['campaigns_per_sec']:.2f}")
+    col3.metric("错误率", f"{metrics['error_rate']:.1%}")
+    col4.metric("当前并发上限", "-" if metrics['concurrency_limit'] is None else f"{metrics['concurrency_limit']:.1f}")
+    st.caption(
+        f"请求 {metrics['requests']} 次，重试 {metrics['retries']} 次；"
+        f"延迟 p50 {metrics['latency_p50']:.2f}s / p95 {metrics['latency_p95']:.2f}s / p99 {metrics['latency_p99']:.2f}s；"
+        f"状态码分布 {metrics['status_counts']}"
+    )
+
+
+def apply_results(job, incremental: bool, stores: list):
+    """任务结束后在页面线程中汇报结果（结果已由工作线程写入各店铺分区），重新加载 product_results 并映射 Status 到 Promoted Sales。"""
+    snapshot = job.snapshot()
+    if snapshot['status'] == 'failed':
+        st.error(f"爬取任务失败：{snapshot['error']}")
+        return
+    if snapshot['status'] == 'cancelled':
+        st.warning(f"爬取任务已取消，已保留完成的 {snapshot['done']} / {snapshot['total']} 个 Campaign 的结果")
+    if snapshot['metrics']['requests']:
+        show_run_metrics(snapshot['metrics'])
+    for message in snapshot['errors']:
+        st.write(message)
+
+    try:
+        with job.lock:
+            changed_ids = list(job.changed_ids)
+        if incremental or snapshot['status'] == 'cancelled':
+            st.caption(f"结果有变化的 Campaign：{len(changed_ids)} 个")
+        if snapshot['skipped']:
+            st.caption(f"不属于所选店铺而跳过的 Campaign：{snapshot['skipped']} 个")
+
+        # 只重新加载当前查看的店铺
+        load_product_results(st.session_state.get('product_results_stores', stores))
+        df = st.session_state['product_results']
+        if df is None:
+            return
+        paged_dataframe(df, key="scraped_results")
+    
+        # 将爬取结果合并到Promoted Sales
+        if 'Promoted Sales' in st.session_state.uploaded_data:
+            product_df = st.session_state['product_results']
+            prom_df = st.session_state.uploaded_data['Promoted Sales']
+
+            # 建立映射：(campaign_id, sku) → status；结果表中 campaign_id 为字符串
+            keys = list(zip(product_df['campaign_id'], product_df['sku']))
+            values = product_df['status'] 
+            sku_campaign_to_status = dict(zip(keys, values))
+        
+            # 然后在 prom_df 中映射：assign 生成新表后写回会话，不改写会话中（可能共享的）原表
+            prom_df = prom_df.assign(**{'Promoted OMSID Number': prom_df['Promoted OMSID Number'].astype(str)})
+            prom_df = prom_df.assign(Status=[
+                sku_campaign_to_status.get((str(campaign_id), sku), "Not Found")
+                for campaign_id, sku in zip(prom_df['Campaign ID'], prom_df['Promoted OMSID Number'])
+            ])
+            paged_dataframe(prom_df, key="scraper_promoted")
+            st.session_state.uploaded_data['Promoted Sales'] = prom_df
+            st.success("已自动将 active状态 应用到 Promoted Sales")
+            
+    except Exception as e:
+        st.error(f"加载爬取结果或映射 Status 失败：{e}")
+
+
+@st.fragment(run_every=1)
+def show_job_progress(job_id: str):
+    """每秒轮询一次后台任务进度；任务结束后触发整页 rerun 以写回结果。"""
+    job = get_job_runner().get(job_id)
+    if job is None:
+        return
+    snapshot = job.snapshot()
+    if job.finished:
+        st.rerun()
+
+    total = max(1, snapshot['total'])
+    st.progress(snapshot['done'] / total, text=f"正在爬取数据... {snapshot['done']} / {snapshot['total']} 个 Campaign")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("已完成 Campaign", f"{snapshot['done']} / {snapshot['total']}")
+    col2.metric("已解析产品", snapshot['products'])
+    col3.metric("使用缓存 / 跳过", f"{snapshot['cached']} / {snapshot['skipped']}")
+    col4.metric("错误", len(snapshot['errors']))
+    if snapshot['metrics']['requests']:
+        show_run_metrics(snapshot['metrics'])
+    st.caption(f"任务 {job_id}，已运行 {snapshot['elapsed']:.0f} 秒。可以切换到其他页面，任务会在后台继续。")
+    if snapshot['errors']:
+        with st.expander("错误明细"):
+            for message in snapshot['errors']:
+                st.write(message)
+    if st.button("取消爬取", key=f"cancel_{job_id}"):
+        get_job_runner().cancel(job_id)
+
 
 def scraper():
     if "uploaded_data" not in st.session_state or not st.session_state.uploaded_data:
@@ -75,73 +232,63 @@ def scraper():
     if campaign is None:
         st.warning("请确认上传Campaign Summary数据")
 
-    # 初始化 product_results
-    if 'product_results' not in st.session_state:
-        st.session_state['product_results'] = None  # 初始为空
+    results_store = get_results_store()
+    default_stores = [str(s) for s in scraper_configs["store_ids"]]
+    store_options = sorted(set(default_stores) | set(results_store.stores()))
+    stores = st.multiselect("店铺", store_options, default=default_stores, key="scrape_stores")
+
+    # 本会话的后台任务：结束后先把结果写回，再展示
+    runner = get_job_runner()
+    job_info = st.session_state.get('scrape_job')
+    job = runner.get(job_info['id']) if job_info else None
+    if job_info and job is None:
+        st.session_state.pop('scrape_job')
+    if job is not None and job.finished:
+        st.session_state.pop('scrape_job')
+        st.session_state['product_results_stores'] = stores
+        apply_results(job, job_info['incremental'], job_info['stores'])
+        job = None
+
+    # 只加载所选店铺的结果；切换店铺时从分区表重新读取
+    if st.session_state.get('product_results_stores') != stores or 'product_results' not in st.session_state:
+        load_product_results(stores)
+    if st.session_state['product_results'] is not None:
+        paged_dataframe(st.session_state['product_results'], key="product_results")
     else:
-        if st.session_state['product_results'] is not None:
-            # 如果存在有效数据，则显示数据
-            st.dataframe(st.session_state['product_results'])
-        else:
-            st.info("本页面尚未存储任何爬取数据")
+        st.info("所选店铺尚未存储任何爬取数据")
+
+    if job is not None:
+        st.caption(job_info['message'])
+        show_job_progress(job.id)
+        return
 
+    offline = st.checkbox("离线模式（只使用缓存，不请求接口）", value=scraper_configs["offline"])
+    incremental = st.checkbox("增量模式（只爬取活跃、过期或结果缺失的 Campaign）", value=scraper_configs["incremental"])
     start_button = st.button('开始爬取')
-    if start_button:
-        with st.spinner("正在爬取数据..."):
-            try:
-                campaign_ids = campaign['Campaign ID'].unique().tolist()
-                responses = {}
-                product_results = []
-                base_url = "https://us.orangeapronmedia.com/api/v2/store/33602/campaigns/{}/targeting/?page=1&page_size=10"
-                base_referer = "https://us.orangeapronmedia.com/r/33602/campaign/details/{}"
-                for index, campaign_id in enumerate(campaign_ids):
-                    url = base_url.format(campaign_id)
-                    headers["referer"] = base_referer.format(campaign_id)
-
-                    response = requests.get(url, headers=headers)
-
-                    if response.status_code != 200:
-                        st.write(response.status_code)
-                        continue
-                    
-                    responses[campaign_id] = response.json().get('results')
-                    for i in range(len(response.json().get('results'))):
-
-                        product_dict = extract_product(response.json().get('results')[i])
-
-                        product_dict['campaign_id'] = campaign_id
-
-                        product_results.append(product_dict)   
-
-                    time.sleep(2)
-                # 清洗 Campaign ID 和 sku
-                df = pd.DataFrame(product_results)
-                
-                st.session_state['product_results'] = df
-                st.write(pd.DataFrame(product_results))
-            
-                # 将爬取结果合并到Promoted Sales
-                if "product_results" in st.session_state and 'Promoted Sales' in st.session_state.uploaded_data:
-                    product_df = st.session_state['product_results']
-                    prom_df = st.session_state.uploaded_data['Promoted Sales']
-
-                    # 建立映射：sku → status
-                    keys = list(zip(product_df['campaign_id'], product_df['sku']))
-                    values = product_df['status'] 
-                    sku_campaign_to_status = dict(zip(keys, values))
-                
-                    # 然后在 prom_df 中映射
-                    prom_df['Promoted OMSID Number'] = prom_df['Promoted OMSID Number'].astype(str)
-                    prom_df['Status'] = prom_df.apply(
-                        lambda row: sku_campaign_to_status.get((row['Campaign ID'], row['Promoted OMSID Number']), "Not Found"),
-                        axis=1
-                    )        
-                    st.dataframe(prom_df)
-                    st.session_state.uploaded_data['Promoted Sales'] = prom_df
-                    st.success("已自动将 active状态 应用到 Promoted Sales")
-                    
-            except Exception as e:
-                st.write(e)
-                st.write(response.json().get('results'))
+    if start_button and campaign is not None and stores:
+        existing = st.session_state['product_results']
+        known_ids = set(zip(existing['store_id'], existing['campaign_id'])) if existing is not None else set()
+        store_col = scraper_configs["store_col"]
+        state = ScrapeState(scraper_configs["state_file"])
+        plan, counts = {}, []
+        for store_id in stores:
+            # 有店铺列时只抓取属于该店铺的 Campaign
+            subset = campaign[campaign[store_col].astype(str) == store_id] if store_col in campaign.columns else campaign
+            if incremental:
+                store_known = {cid for sid, cid in known_ids if sid == store_id}
+                campaign_ids = list(select_campaigns(subset, state, store_id, scraper_configs["state_max_age"], store_known))
+            else:
+                campaign_ids = subset['Campaign ID'].unique().tolist()
+            plan[store_id] = campaign_ids
+            counts.append(f"{store_id}: {len(campaign_ids)}")
+        total = sum(len(ids) for ids in plan.values())
+        if incremental:
+            message = f"增量模式：{len(stores)} 个店铺共需重新爬取 {total} 个 Campaign（{'，'.join(counts)}）"
+        else:
+            message = f"全量模式：{len(stores)} 个店铺共爬取 {total} 个 Campaign（{'，'.join(counts)}）"
+
+        job_id = runner.submit(run_scrape, total, plan, known_ids, incremental, offline, results_store)
+        st.session_state['scrape_job'] = {'id': job_id, 'incremental': incremental, 'stores': stores, 'message': message}
+        st.rerun()
 
 scraper()
\ No newline at end of file
@@ -1,17 +1,17 @@
 import streamlit as st
-from time_filter import time_filters
-from config import file_configs
-from visuals.campaign_ranking import get_ranked_campaigns, plot_campaign_totals, plot_campaign_trends, plot_metric_pie_charts
-from visuals.campaign_fields import plot_dual_metric_trends, plot_campaign_radar_ranks
-from visuals.promoted_groupby import plot_promoted_sku_rank, plot_sku_trends
-from visuals.promoted_sku_ranking import plot_total_promoted_bars, plot_promoted_daily_lines
-from visuals.promoted_distributions import plot_promoted_sunburst
+from time_filter import date_window, time_filters, time_window
+from config import file_configs, query_configs
 def trend():
-    if "uploaded_data" not in st.session_state or not st.session_state.uploaded_data:
+    # out_of_core 模式下 Promoted / Purchased Sales 按分区存放在会话的数据包中，不在 uploaded_data 里
+    stored = []
+    if query_configs['out_of_core']:
+        from query.session import stored_datasets
+        stored = stored_datasets()
+    if not st.session_state.get("uploaded_data") and not stored:
         st.warning("尚未上传任何数据，请先在“文件上传页”中完成文件上传。")
         st.stop()
     
-    data = st.session_state['uploaded_data']
+    data = st.session_state.get('uploaded_data') or {}
     campaign = data.get('Campaign Summary')
     if campaign is not None and not campaign.empty:
         campaign_date = file_configs['Campaign Summary']['date_col']
@@ -23,6 +23,12 @@ def trend():
     purchased = data.get('Purchased Sales')
     if purchased is not None and not purchased.empty:
         purchased_date = file_configs['Purchased Sales']['date_col']
+
+    # 查询后端为 arrow（或 out_of_core）时，汇总、连接与分组聚合改由会话 Parquet 数据包上的 Arrow 查询完成（见 query/）
+    engine = None
+    if query_configs['backend'] == 'arrow' or query_configs['out_of_core']:
+        from query.session import session_engine
+        engine = session_engine(data)
     # with tabs[0]:
     #     campaign_tab_selection = st.pills("选择要广告分析的功能", ['整体趋势折线图', '单支广告参数对比图'])
     #     df_campaign = time_filters(campaign, campaign_date, key_prefix="campaign")
@@ -37,6 +43,10 @@ def trend():
             st.warning("请检查是否已上传 Campaign Summary 文件")
             st.stop()
 
+        # visuals 模块（连带 plotly.express 等重量级依赖）只在打开对应视图时才导入
+        from visuals.campaign_ranking import get_ranked_campaigns, plot_campaign_totals, plot_campaign_trends, plot_metric_pie_charts
+        from visuals.campaign_fields import build_campaign_rank_table, plot_dual_metric_trends, plot_campaign_radar_ranks
+
         df_campaign = time_filters(campaign, campaign_date, key_prefix="campaign")
         name_map = dict(zip(df_campaign['Campaign ID'], df_campaign['Campaign Name']))
 
@@ -57,10 +67,17 @@ def trend():
             with col1:
                 aggregation_field = st.selectbox("指标", campaign_metrics)
             with col2:
-                # 获取完整排名
-                ranked_ids, total = get_ranked_campaigns(df_campaign, aggregation_field, 'Campaign ID', mean_metrics)
+                n_campaigns = df_campaign['Campaign ID'].nunique()
                 # 双头滑块，用户选 m:n
-                m, n = st.slider(f"{aggregation_field}的排名范围", 1, len(ranked_ids), (1, min(5, len(ranked_ids))))
+                m, n = st.slider(f"{aggregation_field}的排名范围", 1, n_campaigns, (1, min(5, n_campaigns)))
+            # 只需前 n 名的排名
+            if engine is not None:
+                start, end = st.session_state['campaign_start'], st.session_state['campaign_end']
+                window = (start, end) if start <= end else (None, None)
+                ranked_ids, total = engine.ranked_campaigns(aggregation_field, 'Campaign ID', mean_metrics, top_n=n,
+                                                            date_col=campaign_date, start=window[0], end=window[1])
+            else:
+                ranked_ids, total = get_ranked_campaigns(df_campaign, aggregation_field, 'Campaign ID', mean_metrics, top_n=n)
             selected_ids = ranked_ids[m-1:n]  # 注意索引偏移
             plot_campaign_totals(total, 'Campaign ID', selected_ids, name_map=name_map)
             st.write("---")
@@ -88,28 +105,36 @@ def trend():
                 options=df_campaign['Campaign ID'].unique(),
                 format_func=lambda x: f"{x} - {df_campaign.loc[df_campaign['Campaign ID'] == x, 'Campaign Name'].iloc[0]}"
             )
+            # 所有 Campaign × 指标的排名表，每个数据集/时间窗口只计算一次
+            rank_table = build_campaign_rank_table(
+                df_campaign,
+                campaign_metrics,
+                'Campaign ID',
+                mean_metrics,
+                group_col='Ad Type'
+            )
+
             # 功能1
             plot_dual_metric_trends(
                 df=df_campaign,
+                rank_table=rank_table,
                 metrics=campaign_metrics,
                 date_col='Interval',
                 campaign_col='Campaign ID',
-                ad_type_col='Ad Type',
-                mean_metrics=mean_metrics
+                ad_type_col='Ad Type'
             )
 
             # 功能3
             plot_campaign_radar_ranks(
-                df=df_campaign,
-                metrics=campaign_metrics,
-                campaign_col='Campaign ID',
-                mean_metrics=mean_metrics
+                rank_table=rank_table,
+                metrics=campaign_metrics
             )
         
         with campaign_tabs[3]:
-            if promoted is None:
+            if promoted is None and 'Promoted Sales' not in stored:
                 st.warning("若要使用本功能，请检查是否已上传 Promoted Sales 文件")
                 st.stop()
+            from visuals.promoted_groupby import plot_promoted_sku_rank, plot_sku_trends
 
             ids = df_campaign['Campaign ID'].unique().tolist()
             # 默认选项：如果之前在 tab3 里选过，就用它；否则用第一个
@@ -128,7 +153,12 @@ def trend():
             )
 
             start, end = st.session_state['campaign_start'], st.session_state['campaign_end']
-            df_promoted = promoted.loc[(promoted['Day'] >= start) & (promoted['Day'] <= end) & (promoted['Campaign ID'] == selected_campaign)].copy()
+            if promoted is None:
+                # 只读取该 Campaign 在时间窗口内的分区
+                df_promoted = engine.window_frame('Promoted Sales', file_configs['Promoted Sales']['date_col'],
+                                                  start, end, [selected_campaign])
+            else:
+                df_promoted = promoted.loc[(promoted['Day'] >= start) & (promoted['Day'] <= end) & (promoted['Campaign ID'] == selected_campaign)]
             if df_promoted.empty:
                 st.warning("Auction Banner 广告未包含 promoted SKU")
                 st.stop()
@@ -141,49 +171,71 @@ def trend():
             ])
 
             with sku_tabs[0]:
+                # 查询后端可用时，各 SKU 的指标汇总由 Arrow 在数据包上聚合（只扫描该 Campaign 与窗口），pandas 只取映射信息
+                sku_agg = None
+                if engine is not None:
+                    sku_agg = engine.sku_metrics(promoted_metrics, start, end, [selected_campaign])
                 plot_promoted_sku_rank(
                     df_promoted,
                     selected_campaign,
-                    promoted_metrics
+                    promoted_metrics,
+                    sku_agg=sku_agg
                 )
             
             with sku_tabs[1]:
                 plot_sku_trends(df_promoted)
 
     elif tab_selection == "SKU具体表现":
-        if promoted is None:
+        if promoted is None and 'Promoted Sales' not in stored:
             st.warning("请检查是否已上传 Promoted Sales 文件")
             st.stop()
-        if purchased is None:
+        if purchased is None and 'Purchased Sales' not in stored:
             st.warning("请检查是否已上传 Purchased Sales 文件")
             st.stop()
+        from visuals.promoted_sku_ranking import build_sku_daily_matrix, plot_total_promoted_bars, plot_promoted_daily_lines
+        from visuals.promoted_distributions import build_halo_table, plot_promoted_sunburst, plot_halo_leaderboard
+
         promoted_sku_tabs = st.tabs([
             "📈 SKU销售额分析",
             "💸 Promoted SKU 对比 Non-Promoted SKU" 
         ])
-        df_promoted = time_filters(promoted, promoted_date, key_prefix="promoted")
-        df_purchased = purchased.copy()
-        df_merged = df_promoted.merge(
-            df_purchased,
-            on = ['Day', 'Campaign ID', 'Promoted OMSID'],
-            how = 'left'
-        )
-        df_bars = df_merged[['Day', 'Promoted OMSID',
-                               'Purchased OMSID', 'SPA Sales_y']]
-        if 'HD SKU Map' in st.session_state.get('uploaded_data', {}):
-            df_sunburst = df_merged[['Day', 'Promoted OMSID', 
-                                 'Purchased OMSID', 'SPA Sales_y',
-                                 'MFG Model #', 'Weekly Sales QTY', 'Promoted Retail',
-                                 'Inventory', 'Product Name (120)']]
+        if engine is not None:
+            # 连接与聚合在 Arrow 中完成，只取回按 (日期, SKU) / (Promoted, Purchased) 聚合后的小表
+            if promoted is None:
+                start, end = date_window(*engine.date_range('Promoted Sales', file_configs['Promoted Sales']['date_col']),
+                                         key_prefix="promoted")
+            else:
+                start, end = time_window(promoted, promoted_date, key_prefix="promoted")
+            df_bars = engine.sku_daily_sales(start, end)
+            df_halo = engine.halo_sales(start, end)
         else:
-            df_sunburst = df_merged[['Day', 'Promoted OMSID', 
-                                 'Purchased OMSID', 'SPA Sales_y']]
-            
+            df_promoted = time_filters(promoted, promoted_date, key_prefix="promoted")
+            df_merged = df_promoted.merge(
+                purchased,
+                on = ['Day', 'Campaign ID', 'Promoted OMSID'],
+                how = 'left'
+            )
+            df_bars = df_merged[['Day', 'Promoted OMSID',
+                                   'Purchased OMSID', 'SPA Sales_y']]
+            halo_cols = [c for c in ['Promoted OMSID', 'Purchased OMSID', 'SPA Sales_y',
+                                     'Promoted OMSID Description_x', 'Promoted OMSID Description']
+                         if c in df_merged.columns]
+            df_halo = df_merged[halo_cols]
+
         with promoted_sku_tabs[0]:
-            top_promoted, color_map = plot_total_promoted_bars(df_bars) 
-            plot_promoted_daily_lines(df_bars, top_promoted, color_map) 
+            # 日期 × SKU 矩阵每个数据集/时间窗口只计算一次，柱状图与折线图共用
+            sku_daily, sku_totals = build_sku_daily_matrix(df_bars)
+            top_promoted, color_map = plot_total_promoted_bars(sku_totals)
+            plot_promoted_daily_lines(sku_daily, top_promoted, color_map)
 
         with promoted_sku_tabs[1]:
-            plot_promoted_sunburst(df_merged)
+            # 所有 Promoted SKU 的 halo 归因只计算一次，sunburst 与排行榜都从中查表
+            halo_detail, halo_summary = build_halo_table(
+                df_halo,
+                data.get('HD SKU Map')
+            )
+            plot_promoted_sunburst(halo_detail, halo_summary)
+            st.write("---")
+            plot_halo_leaderboard(halo_summary)
 
 trend()
\ No newline at end of file
@@ -1,16 +1,18 @@
 import os
 import streamlit as st
-import pandas as pd
-from config import file_configs
+from utils.pandas_setup import pd
+from config import file_configs, memory_configs, query_configs
 from utils.validate import validate_dataframe
-from preprocess import campaign, promoted, purchased, hd_sku_map, rank
-
-PREPROCESS_MAP = {
-    "campaign": campaign,
-    "promoted": promoted,
-    "purchased": purchased,
-    "map": hd_sku_map,
-    "rank": rank
+from utils.table_view import paged_dataframe
+from utils.profiler import span
+from utils.session_memory import SessionDatasets, frame_nbytes, global_memory_bytes
+from utils.shared_store import content_key, get_shared_store, session_lease
+from preprocess import PREPROCESS_MAP, UNCACHED_PREPROCESS_MAP, promoted
+
+# 预处理结果还依赖哪些数据集：这些数据集变化时需要重新处理
+PREPROCESS_DEPENDENCIES = {
+    "promoted": ["Campaign Summary", "HD SKU Map"],
+    "purchased": ["Campaign Summary"]
 }
 
 PERSIST_DIR = "persist_data"
@@ -25,12 +27,100 @@ def clear_persisted_data():
         st.error(f"清空持久化数据失败：{e}")
 
 
+def show_memory_usage():
+    """当前会话与全进程的数据集内存占用。"""
+    datasets = st.session_state.uploaded_data
+    product_df = st.session_state.get("product_results")
+    product_bytes = frame_nbytes(product_df) if product_df is not None else 0
+    session_mb = (datasets.memory_bytes() + product_bytes) / 2 ** 20
+    usage = datasets.usage()
+
+    st.markdown("---")
+    st.subheader("🧠 内存占用")
+    shared = get_shared_store().stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("本会话", f"{session_mb:.1f} MB", help=f"预算 {memory_configs['session_budget_mb']} MB（含爬取结果 {product_bytes / 2 ** 20:.1f} MB）")
+    col2.metric("已转存到磁盘", f"{int((usage['位置'] == '磁盘').sum()) if not usage.empty else 0} 个数据集")
+    col3.metric("全部会话", f"{global_memory_bytes() / 2 ** 20:.1f} MB", help=f"预算 {memory_configs['global_budget_mb']} MB")
+    col4.metric("共享只读数据", f"{shared['bytes'] / 2 ** 20:.1f} MB", help=f"{shared['datasets']} 个数据集，{shared['sessions']} 个会话在用")
+    if not usage.empty:
+        st.dataframe(usage, hide_index=True, use_container_width=True)
+
+
+def campaign_ids_of(datasets) -> list | None:
+    campaign_df = datasets.get("Campaign Summary")
+    return campaign_df["Campaign ID"].tolist() if campaign_df is not None else None
+
+
+def upload_partitioned(name: str, cfg: dict, dataset_keys: dict):
+    """
+    out_of_core 模式下的 Promoted / Purchased Sales：可一次选择多个文件（如逐月导出），
+    每个文件读取、预处理后按 (时间段, Campaign) 分区追加到会话的 Parquet 数据包，不放入会话内存。
+    已写入的文件可以从上传框中移除（释放上传缓存），数据包中的分区保留，直到清空会话数据。
+    """
+    from query.session import append_partitions, has_source
+
+    uploaded_files = st.file_uploader(
+        label=f"上传 {name}（可多选，按时间段追加；同一 Campaign 同一天的数据以最后上传的为准）",
+        type=["xlsx", "xls"],
+        accept_multiple_files=True,
+        key=f"uploader_{name}_{st.session_state.upload_reset_token}"
+    )
+    fn_key = cfg.get("preprocess_fn")
+    dependencies = [dataset_keys.get(dep, (None,))[0] for dep in PREPROCESS_DEPENDENCIES.get(fn_key, [])]
+    for uploaded_file in uploaded_files or []:
+        key = content_key(name, uploaded_file.getvalue(), str(cfg.get("skiprows", 0)), *dependencies)
+        if has_source(name, key):
+            continue
+        try:
+            with span(f"upload.read_excel[{name}]") as record:
+                df = pd.read_excel(uploaded_file, skiprows=cfg.get("skiprows", 0))
+                record.rows_out = len(df)
+
+            missing = validate_dataframe(df, cfg.get("required_cols", []))
+            if missing:
+                st.error(f"{uploaded_file.name} 缺少列：{missing}")
+                continue
+
+            datasets = st.session_state.uploaded_data
+            if fn_key == "promoted":
+                df = UNCACHED_PREPROCESS_MAP[fn_key](df, campaign_ids_of(datasets), datasets.get("HD SKU Map"))
+            else:
+                df = UNCACHED_PREPROCESS_MAP[fn_key](df, campaign_ids_of(datasets))
+            rows = append_partitions(name, df, key)
+            if rows:
+                st.success(f"{uploaded_file.name}：{rows} 行已按分区写入 {name}")
+            else:
+                st.warning(f"{uploaded_file.name} 中没有日期有效的行，未写入 {name}")
+        except Exception as e:
+            st.error(f"读取“{uploaded_file.name}”时出错，请检查格式：{e}")
+
+
+def show_partitioned_datasets() -> bool:
+    """out_of_core 模式下已写入数据包的分区数据集概况；返回是否有这样的数据集。"""
+    from query.session import stored_datasets
+
+    names = stored_datasets()
+    if not names:
+        return False
+    described = st.session_state.query_engine.bundle.describe()
+    for name in names:
+        info = described[name]
+        st.write(f"**{name}**：{info['rows']} 行，{info['start']} ~ {info['end']}，"
+                 f"{info['partitions']} 个分区（按{'月' if info['period'] == 'month' else '天'}与 Campaign），存放在磁盘")
+    st.write("-----")
+    return True
+
+
 def upload():
     st.header("📥 上传广告数据文件")
 
     # 仅使用当前 Streamlit session，避免上一个使用者的数据被下一个使用者看到。
-    if "uploaded_data" not in st.session_state:
-        st.session_state.uploaded_data = {}
+    # 数据集按内存预算管理，冷数据集会转存到磁盘、访问时再读回
+    if not isinstance(st.session_state.get("uploaded_data"), SessionDatasets):
+        datasets = SessionDatasets()
+        datasets.update(st.session_state.get("uploaded_data") or {})
+        st.session_state.uploaded_data = datasets
 
     if "upload_reset_token" not in st.session_state:
         st.session_state.upload_reset_token = 0
@@ -38,16 +128,40 @@ def upload():
     col1, col2 = st.columns([1, 1])
     with col1:
         if st.button("🗑️ 清空当前会话数据"):
-            st.session_state.uploaded_data = {}
+            st.session_state.uploaded_data = SessionDatasets()
             st.session_state.pop("product_results", None)
+            st.session_state.pop("dataset_keys", None)
+            # 换一个租约，旧租约引用的共享数据集随之释放
+            st.session_state.pop("shared_lease", None)
+            if "query_engine" in st.session_state:
+                from query.session import drop_session_bundle
+                drop_session_bundle()
             st.session_state.upload_reset_token += 1
             clear_persisted_data()
             st.success("已清空当前会话数据")
             st.rerun()
     with col2:
         st.caption("上传数据只保存在当前会话；不会自动读取或写入本地持久化文件。")
+    if query_configs["out_of_core"]:
+        st.info("已开启超出内存的历史数据模式：Promoted / Purchased Sales 按时间段与 Campaign 分区写入磁盘，"
+                "请先上传 Campaign Summary 与 HD SKU Map。")
+
+    share = st.checkbox(
+        "与上传了相同文件的其他会话共享只读数据（节省内存）",
+        value=memory_configs["share_identical_uploads"],
+        help="只有上传过字节完全相同文件的会话才能取到共享数据；本会话的后续修改不会影响其他会话。"
+    )
+    dataset_keys = st.session_state.setdefault("dataset_keys", {})
+
+    partitioned = []
+    if query_configs["out_of_core"]:
+        from query.engine import PARTITIONED_DATASETS as partitioned
 
     for name, cfg in file_configs.items():
+        if name in partitioned:
+            upload_partitioned(name, cfg, dataset_keys)
+            continue
+
         uploaded_file = st.file_uploader(
             label=f"上传 {name}",
             type=["xlsx", "xls"],
@@ -56,34 +170,46 @@ def upload():
 
         if uploaded_file is not None:
             try:
-                df = pd.read_excel(uploaded_file, skiprows=cfg.get("skiprows", 0))
+                fn_key = cfg.get("preprocess_fn")
+                dependencies = [dataset_keys.get(dep, (None,))[0] for dep in PREPROCESS_DEPENDENCIES.get(fn_key, [])]
+                key = content_key(name, uploaded_file.getvalue(), str(cfg.get("skiprows", 0)), *dependencies)
+                if dataset_keys.get(name) == (key, share) and name in st.session_state.uploaded_data:
+                    # 同一文件、同样的依赖与共享方式已经处理过，不再重复解析
+                    continue
 
-                required_cols = cfg.get("required_cols", [])
-                missing = validate_dataframe(df, required_cols) if required_cols else []
+                df = get_shared_store().get(key, session_lease()) if share else None
+                if df is None:
+                    with span(f"upload.read_excel[{name}]") as record:
+                        df = pd.read_excel(uploaded_file, skiprows=cfg.get("skiprows", 0))
+                        record.rows_out = len(df)
 
-                if missing:
-                    st.error(f"{name} 缺少列：{missing}")
-                    continue
+                    required_cols = cfg.get("required_cols", [])
+                    missing = validate_dataframe(df, required_cols) if required_cols else []
 
-                fn_key = cfg.get("preprocess_fn")
+                    if missing:
+                        st.error(f"{name} 缺少列：{missing}")
+                        continue
+
+                    if fn_key == "promoted":
+                        sku_map_df = st.session_state.uploaded_data.get("HD SKU Map")
+                        df = PREPROCESS_MAP[fn_key](df, campaign_ids_of(st.session_state.uploaded_data), sku_map_df)
 
-                if fn_key == "promoted":
-                    campaign_df = st.session_state.uploaded_data.get("Campaign Summary")
-                    campaign_ids = campaign_df["Campaign ID"].tolist() if campaign_df is not None else None
-                    sku_map_df = st.session_state.uploaded_data.get("HD SKU Map")
-                    df = PREPROCESS_MAP[fn_key](df, campaign_ids, sku_map_df)
+                    elif fn_key == "purchased":
+                        df = PREPROCESS_MAP[fn_key](df, campaign_ids_of(st.session_state.uploaded_data))
 
-                elif fn_key == "purchased":
-                    campaign_df = st.session_state.uploaded_data.get("Campaign Summary")
-                    campaign_ids = campaign_df["Campaign ID"].tolist() if campaign_df is not None else None
-                    df = PREPROCESS_MAP[fn_key](df, campaign_ids)
+                    elif fn_key in PREPROCESS_MAP:
+                        df = PREPROCESS_MAP[fn_key](df)
 
-                elif fn_key in PREPROCESS_MAP:
-                    df = PREPROCESS_MAP[fn_key](df)
+                    if share:
+                        df = get_shared_store().put(key, df, session_lease())
 
                 st.success(f"{name} 上传并预处理完成，共 {len(df)} 行")
 
-                st.session_state.uploaded_data[name] = df
+                if share:
+                    st.session_state.uploaded_data.set_shared(name, df)
+                else:
+                    st.session_state.uploaded_data[name] = df
+                dataset_keys[name] = (key, share)
 
             except Exception as e:
                 st.error(f"读取“{name}”时出错，请检查格式：{e}")
@@ -91,12 +217,13 @@ def upload():
     st.markdown("---")
     st.subheader("🗄️ 已上传的数据（当前会话）")
 
+    shown = show_partitioned_datasets() if query_configs["out_of_core"] else False
     if st.session_state.uploaded_data:
         for name, df in st.session_state.uploaded_data.items():
             st.write(f"**{name}**：{len(df)} 行")
-            st.dataframe(df)
+            paged_dataframe(df, key=f"uploaded_{name}")
             st.write("-----")
-    else:
+    elif not shown:
         st.info("尚未上传任何通过校验的文件。")
 
     # 1) 自动将 HD SKU Map 应用到 Promoted Sales
@@ -107,13 +234,17 @@ def upload():
         and "Promoted Sales" in st.session_state.uploaded_data
     ):
         prom_df = st.session_state.uploaded_data["Promoted Sales"]
-        camp_df = st.session_state.uploaded_data.get("Campaign Summary")
-        camp_ids = camp_df["Campaign ID"].tolist() if camp_df is not None else None
-        sku_map_df = st.session_state.uploaded_data["HD SKU Map"]
+        # 已映射过（含 OMSID 列）时跳过，避免每次运行都重新生成一份副本
+        if "OMSID" not in prom_df.columns:
+            with span("upload.apply_sku_map", len(prom_df)) as record:
+                camp_df = st.session_state.uploaded_data.get("Campaign Summary")
+                camp_ids = camp_df["Campaign ID"].tolist() if camp_df is not None else None
+                sku_map_df = st.session_state.uploaded_data["HD SKU Map"]
 
-        merged = promoted(prom_df, camp_ids, sku_map_df)
+                merged = promoted(prom_df, camp_ids, sku_map_df)
 
-        st.session_state.uploaded_data["Promoted Sales"] = merged
+                st.session_state.uploaded_data["Promoted Sales"] = merged
+                record.rows_out = len(merged)
 
         st.success("已自动将 SKU Map 应用到 Promoted Sales")
 
@@ -123,33 +254,32 @@ def upload():
         and st.session_state.uploaded_data is not None
         and "Promoted Sales" in st.session_state.uploaded_data
     ):
-        product_df = st.session_state.get("product_results")
-
-        if isinstance(product_df, pd.DataFrame) and not product_df.empty:
-            prom_df = st.session_state.uploaded_data["Promoted Sales"].copy()
+        with span("upload.apply_product_status") as record:
+            product_df = st.session_state.get("product_results")
 
-            # 建立映射：(campaign_id, sku) -> status
-            product_df["campaign_id"] = product_df["campaign_id"].astype(str)
-            product_df["sku"] = product_df["sku"].astype(str)
+            if isinstance(product_df, pd.DataFrame) and not product_df.empty:
+                # 会话中的表（及爬取结果）可能与预处理缓存、其他会话共享底层数据，
+                # 这里只用 assign 生成新表再写回，不在原表上改列
+                prom_df = st.session_state.uploaded_data["Promoted Sales"]
 
-            keys = list(zip(product_df["campaign_id"], product_df["sku"]))
-            values = product_df["status"]
-            sku_campaign_to_status = dict(zip(keys, values))
+                # 建立映射：(campaign_id, sku) -> status
+                keys = list(zip(product_df["campaign_id"].astype(str), product_df["sku"].astype(str)))
+                values = product_df["status"]
+                sku_campaign_to_status = dict(zip(keys, values))
 
-            prom_df["Campaign ID"] = prom_df["Campaign ID"].astype(str)
-            prom_df["Promoted OMSID Number"] = prom_df["Promoted OMSID Number"].astype(str)
+                prom_df = prom_df.assign(**{
+                    "Campaign ID": prom_df["Campaign ID"].astype(str),
+                    "Promoted OMSID Number": prom_df["Promoted OMSID Number"].astype(str),
+                })
+                prom_df = prom_df.assign(Status=[
+                    sku_campaign_to_status.get(key, "Not Found")
+                    for key in zip(prom_df["Campaign ID"], prom_df["Promoted OMSID Number"])
+                ])
 
-            prom_df["Status"] = prom_df.apply(
-                lambda row: sku_campaign_to_status.get(
-                    (row["Campaign ID"], row["Promoted OMSID Number"]),
-                    "Not Found"
-                ),
-                axis=1
-            )
+                st.session_state.uploaded_data["Promoted Sales"] = prom_df
+                record.rows_in, record.rows_out = len(product_df), len(prom_df)
 
-            st.session_state.uploaded_data["Promoted Sales"] = prom_df
-
-            st.success("已自动将 active状态 应用到 Promoted Sales")
+                st.success("已自动将 active状态 应用到 Promoted Sales")
 
     # 3) 如果存在扁平化后的 Daily Rank，则将 page_no_sponsored / page_no_organic 合并到 Promoted Sales
     if (
@@ -158,42 +288,42 @@ def upload():
         and "Promoted Sales" in st.session_state.uploaded_data
         and "Daily Rank" in st.session_state.uploaded_data
     ):
-        prom_df = st.session_state.uploaded_data["Promoted Sales"].copy()
-        rank_df = st.session_state.uploaded_data["Daily Rank"].copy()
-
-        if not prom_df.empty and not rank_df.empty:
-            # 统一键类型
-            if "Promoted OMSID" in prom_df.columns:
-                prom_df["Promoted OMSID"] = prom_df["Promoted OMSID"].astype(str)
-                left_key = "Promoted OMSID"
-            else:
-                prom_df["Promoted OMSID Number"] = prom_df["Promoted OMSID Number"].astype(str)
-                left_key = "Promoted OMSID Number"
+        with span("upload.merge_daily_rank") as record:
+            prom_df = st.session_state.uploaded_data["Promoted Sales"]
+            rank_df = st.session_state.uploaded_data["Daily Rank"]
+
+            if not prom_df.empty and not rank_df.empty:
+                # 统一键类型
+                left_key = "Promoted OMSID" if "Promoted OMSID" in prom_df.columns else "Promoted OMSID Number"
+                prom_df = prom_df.assign(**{left_key: prom_df[left_key].astype(str)})
 
-            rank_df["item_id"] = rank_df["item_id"].astype(str)
+                # 只取需要带入的列，Daily Rank 本身不做修改
+                rank_merge_cols = ["item_id", "page_no_sponsored", "page_no_organic"]
+                rank_merge_df = (
+                    rank_df[rank_merge_cols]
+                    .assign(item_id=rank_df["item_id"].astype(str))
+                    .drop_duplicates(subset=["item_id"])
+                )
 
-            # 只取需要带入的列
-            rank_merge_cols = ["item_id", "page_no_sponsored", "page_no_organic"]
-            rank_merge_df = rank_df[rank_merge_cols].drop_duplicates(subset=["item_id"]).copy()
+                # 先删旧列，避免重复 merge 产生 _x / _y
+                prom_df = prom_df.drop(columns=["page_no_sponsored", "page_no_organic"], errors="ignore")
 
-            # 先删旧列，避免重复 merge 产生 _x / _y
-            for col in ["page_no_sponsored", "page_no_organic"]:
-                if col in prom_df.columns:
-                    prom_df = prom_df.drop(columns=[col])
+                prom_df = prom_df.merge(
+                    rank_merge_df,
+                    how="left",
+                    left_on=left_key,
+                    right_on="item_id"
+                )
 
-            prom_df = prom_df.merge(
-                rank_merge_df,
-                how="left",
-                left_on=left_key,
-                right_on="item_id"
-            )
+                # item_id 只是辅助 merge 用，Promoted Sales 里不一定需要保留
+                prom_df = prom_df.drop(columns=["item_id"], errors="ignore")
 
-            # item_id 只是辅助 merge 用，Promoted Sales 里不一定需要保留
-            prom_df = prom_df.drop(columns=["item_id"], errors="ignore")
+                st.session_state.uploaded_data["Promoted Sales"] = prom_df
+                record.rows_in, record.rows_out = len(rank_df), len(prom_df)
 
-            st.session_state.uploaded_data["Promoted Sales"] = prom_df
+                st.success("已自动将 Daily Rank 的 page_no_sponsored / page_no_organic 合并到 Promoted Sales")
 
-            st.success("已自动将 Daily Rank 的 page_no_sponsored / page_no_organic 合并到 Promoted Sales")
+    show_memory_usage()
 
     # 最后展示更新后的 Promoted Sales
     if (
@@ -203,7 +333,7 @@ def upload():
     ):
         st.markdown("---")
         st.subheader("📌 当前 Promoted Sales（更新后）")
-        st.dataframe(st.session_state.uploaded_data["Promoted Sales"])
+        paged_dataframe(st.session_state.uploaded_data["Promoted Sales"], key="promoted_enriched")
 
 
 upload()
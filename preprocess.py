@@ -1,24 +1,28 @@
 # preprocess.py
-import pandas as pd
+from utils.pandas_setup import pd
 import streamlit as st
 import numpy as np
+from utils.profiler import profiled
 
+@profiled()
 @st.cache_data
 def campaign(df: pd.DataFrame) -> pd.DataFrame:
     mask = df['Interval'].str.contains(r'\d{4}-\d{2}-\d{2} to \d{4}-\d{2}-\d{2}', na=False, regex=True)
-    df['Interval'] = np.where(
-        mask, 
-        pd.to_datetime(df['Interval'].str.split(' to ').str[1], errors = 'coerce').dt.date,
-        pd.to_datetime(df['Interval'], format='%Y-%m-%d', errors='coerce').dt.date
-    )
-    df["Campaign ID"] = df['Campaign ID'].astype(str)
+    # 用 assign 生成新表，不改写调用方传入的 df
+    df = df.assign(**{
+        'Interval': np.where(
+            mask,
+            pd.to_datetime(df['Interval'].str.split(' to ').str[1], errors = 'coerce').dt.date,
+            pd.to_datetime(df['Interval'], format='%Y-%m-%d', errors='coerce').dt.date
+        ),
+        'Campaign ID': df['Campaign ID'].astype(str),
+    })
     df = df[df["Status"] == "running"]
     return df
 
-@st.cache_data
-def promoted(df: pd.DataFrame,
-             campaign_ids: list[str] | None = None,
-             sku_map: pd.DataFrame | None = None) -> pd.DataFrame:
+def prepare_promoted(df: pd.DataFrame,
+                     campaign_ids: list[str] | None = None,
+                     sku_map: pd.DataFrame | None = None) -> pd.DataFrame:
     """
     对 Promoted Sales 表进行预处理并映射 HD SKU Map。
     如果已经存在映射列，则直接返回原 df，避免重复合并。
@@ -28,9 +32,11 @@ def promoted(df: pd.DataFrame,
     if mapped_col in df.columns:
         return df  # 已经做过映射，直接跳过
     
-    df["Day"] = pd.to_datetime(df["Day"]).dt.date
-    df["Promoted OMSID"] = df["Promoted OMSID Number"].astype(str)
-    df["Campaign ID"] = df["Campaign ID"].astype(str)
+    df = df.assign(**{
+        "Day": pd.to_datetime(df["Day"]).dt.date,
+        "Promoted OMSID": df["Promoted OMSID Number"].astype(str),
+        "Campaign ID": df["Campaign ID"].astype(str),
+    })
     if campaign_ids:
         df = df[df['Campaign ID'].isin(campaign_ids)]
     # 合并 SKU 桥表
@@ -41,35 +47,46 @@ def promoted(df: pd.DataFrame,
             how='left',
             left_on='Promoted OMSID',
             right_on='OMSID'
-        ).copy()
+        )
 
     return df
 
+@profiled()
 @st.cache_data
-def purchased(df: pd.DataFrame, 
-              campaign_ids: list[str] | None = None,):
-    df["Day"] = pd.to_datetime(df["Day"]).dt.date
-    df["Promoted OMSID"] = df["Promoted OMSID Number"].astype(str)
-    df["Campaign ID"] = df["Campaign ID"].astype(str)
-    df['Purchased OMSID'] = df['Purchased OMSID Number'].astype(str)
+def promoted(df: pd.DataFrame,
+             campaign_ids: list[str] | None = None,
+             sku_map: pd.DataFrame | None = None) -> pd.DataFrame:
+    return prepare_promoted(df, campaign_ids, sku_map)
+
+def prepare_purchased(df: pd.DataFrame,
+                      campaign_ids: list[str] | None = None) -> pd.DataFrame:
+    df = df.assign(**{
+        "Day": pd.to_datetime(df["Day"]).dt.date,
+        "Promoted OMSID": df["Promoted OMSID Number"].astype(str),
+        "Campaign ID": df["Campaign ID"].astype(str),
+        "Purchased OMSID": df["Purchased OMSID Number"].astype(str),
+    })
     if campaign_ids:
         df = df[df['Campaign ID'].isin(campaign_ids)]
 
     return df
 
+@profiled()
 @st.cache_data
-def hd_sku_map(df: pd.DataFrame) -> pd.DataFrame:
-    df['OMSID'] = df['OMSID'].astype(str)
-    df['OMS THD SKU'] = df['OMS THD SKU'].astype(str)
+def purchased(df: pd.DataFrame, 
+              campaign_ids: list[str] | None = None,):
+    return prepare_purchased(df, campaign_ids)
 
-    return df
+@profiled()
+@st.cache_data
+def hd_sku_map(df: pd.DataFrame) -> pd.DataFrame:
+    return df.astype({'OMSID': str, 'OMS THD SKU': str})
 
+@profiled()
 @st.cache_data
 def rank(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-
-    # 1) 清理列名
-    df.columns = df.columns.str.strip()
+    # 1) 清理列名（rename 返回新表；copy-on-write 下之后的列赋值都不会写回调用方的 df）
+    df = df.rename(columns=str.strip)
 
     # 2) 删除全空行
     df = df.dropna(how="all")
@@ -121,7 +138,7 @@ def rank(df: pd.DataFrame) -> pd.DataFrame:
         df["is_sponsored"] = pd.to_numeric(df["is_sponsored"], errors="coerce").fillna(0).astype(int)
 
     # 7) 只保留 CARRO
-    df = df[df["brand_name"].astype(str).str.upper() == "CARRO"].copy()
+    df = df[df["brand_name"].astype(str).str.upper() == "CARRO"]
 
     if df.empty:
         return df
@@ -214,6 +231,23 @@ def rank(df: pd.DataFrame) -> pd.DataFrame:
         c for c in df_flat.columns if c not in preferred_cols
     ]
 
-    df_flat = df_flat[final_cols].copy()
+    df_flat = df_flat[final_cols]
+
+    return df_flat
+
+
+# file_configs 中 preprocess_fn 的取值 -> 预处理函数
+PREPROCESS_MAP = {
+    "campaign": campaign,
+    "promoted": promoted,
+    "purchased": purchased,
+    "map": hd_sku_map,
+    "rank": rank
+}
 
-    return df_flat
\ No newline at end of file
+# 逐个文件按分区写入数据包（query_configs["out_of_core"]）时使用的不缓存版本：
+# 结果写盘后即释放，不在 st.cache_data 中为每个文件保留一份
+UNCACHED_PREPROCESS_MAP = {
+    "promoted": profiled("preprocess.promoted")(prepare_promoted),
+    "purchased": profiled("preprocess.purchased")(prepare_purchased)
+}
@@ -0,0 +1,238 @@
+"""
+只读 JSON 接口：把趋势页上的 Campaign 汇总排名、SKU 排名表、每日序列与 halo 归因开放给其他内部工具，
+数据来自 python -m query.build 预先构建的 Parquet 数据包。
+
+    python -m query.api --bundle persist_data/bundle --port 8600
+
+接口均为 GET；日期参数为 YYYY-MM-DD，可重复的参数写多次（如 campaign_id=1&campaign_id=2）：
+    /api/datasets                                                   数据包中的数据集、行数与版本
+    /api/campaigns/ranking?metric=&top_n=&start=&end=               Campaign 汇总排名
+    /api/skus/ranking?sort=&top_n=&start=&end=&campaign_id=         各 Promoted SKU 的指标汇总
+    /api/skus/daily?sku=&top_n=&start=&end=&campaign_id=            Promoted SKU 的每日 SPA Sales
+    /api/halo?sku=&top_n=&start=&end=&campaign_id=                  Halo Ratio 排行；指定 sku 时返回该 SKU 的购买明细
+
+响应带 ETag（数据包版本 + 请求路径与参数），带 If-None-Match 的重复请求返回 304；
+数据包重建后 ETag 自动变化。服务多线程处理请求，相同请求的 JSON 在进程内缓存。
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from flask import Flask, Response, request
+
+from config import api_configs, query_configs
+from query.bundle import ParquetBundle
+from query.engine import ArrowQueryEngine
+from compute.halo import halo_leaderboard, halo_tables
+from compute.sku import sku_daily_matrix, with_sku_map
+from utils.ranking import rank_top_n, top_n_positions
+
+# 与趋势页一致的指标
+CAMPAIGN_METRICS = ["Click Through Rate (CTR) (sum)", "Clicks (sum)",
+                    "Cost Per Click (CPC) (sum)", "Cost Per Thousand Views (CPM) (sum)", "Impressions (sum)",
+                    "Return on Ad Spend (ROAS) SPA (sum)", "SPA In-Store Sales (sum)", "SPA Online Sales (sum)",
+                    "SPA Sales (sum)", "Spend (sum)"]
+CAMPAIGN_MEAN_METRICS = ["Return on Ad Spend (ROAS) SPA (sum)", "Click Through Rate (CTR) (sum)",
+                         "Cost Per Click (CPC) (sum)", "Cost Per Thousand Views (CPM) (sum)"]
+PROMOTED_METRICS = ["Clicks", "Impressions", "SPA ROAS", "SPA Sales", "Spend"]
+
+
+class BadRequest(ValueError):
+    """请求参数无效，返回 400。"""
+
+
+def _date(name: str):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise BadRequest(f"{name} 需为 YYYY-MM-DD 格式：{value}")
+
+
+def _int(name: str, default: int) -> int:
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        parsed = int(value)
+    except ValueError:
+        raise BadRequest(f"{name} 需为整数：{value}")
+    if parsed < 1:
+        raise BadRequest(f"{name} 需大于 0：{value}")
+    return parsed
+
+
+def _choice(name: str, options: list[str], default: str) -> str:
+    value = request.args.get(name, default)
+    if value not in options:
+        raise BadRequest(f"{name} 可选值：{options}")
+    return value
+
+
+def _filters() -> dict:
+    """日期窗口与 Campaign 过滤，对应查询引擎的 start / end / campaign_ids。"""
+    start, end = _date("start"), _date("end")
+    if start and end and start > end:
+        raise BadRequest("end 不能早于 start")
+    return {"start": start, "end": end, "campaign_ids": request.args.getlist("campaign_id") or None}
+
+
+def _json_value(value):
+    """NaN -> null，numpy 标量 -> Python 标量，日期 -> ISO 字符串。"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (datetime.date, pd.Timestamp)):
+        return value.isoformat()
+    return value
+
+
+def _records(df: pd.DataFrame) -> list[dict]:
+    return [{str(k): _json_value(v) for k, v in row.items()} for row in df.to_dict("records")]
+
+
+def create_app(bundle_root: str, max_age: int | None = None, cache_size: int | None = None) -> Flask:
+    app = Flask(__name__)
+    bundle = ParquetBundle(bundle_root)
+    engine = ArrowQueryEngine(bundle, use_threads=query_configs["use_threads"], chunk_rows=query_configs["chunk_rows"])
+    max_age = api_configs["max_age"] if max_age is None else max_age
+    cache_size = api_configs["cache_size"] if cache_size is None else cache_size
+    responses = OrderedDict()
+    lock = threading.Lock()
+
+    def error(status: int, message: str) -> Response:
+        return Response(json.dumps({"error": message}, ensure_ascii=False), status=status, mimetype="application/json")
+
+    def cached_json(compute):
+        """按 (路径, 参数, 数据包版本) 生成 ETag 并缓存序列化后的 JSON。"""
+        bundle.refresh()
+        if not bundle.names():
+            return error(503, f"数据包为空或不存在：{bundle_root}")
+        key = (request.path, tuple(sorted(request.args.items(multi=True))), bundle.generation)
+        etag = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            with lock:
+                body = responses.get(key)
+                if body is not None:
+                    responses.move_to_end(key)
+            if body is None:
+                try:
+                    body = json.dumps(compute(), ensure_ascii=False)
+                except BadRequest as e:
+                    return error(400, str(e))
+                except KeyError as e:
+                    return error(404, f"数据包中缺少数据或列：{e}")
+                with lock:
+                    responses[key] = body
+                    while len(responses) > cache_size:
+                        responses.popitem(last=False)
+            response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        return response
+
+    @app.get("/api/datasets")
+    def datasets():
+        return cached_json(bundle.describe)
+
+    @app.get("/api/campaigns/ranking")
+    def campaign_ranking():
+        def compute():
+            metric = _choice("metric", CAMPAIGN_METRICS, "SPA Sales (sum)")
+            filters = _filters()
+            if filters["campaign_ids"]:
+                raise BadRequest("Campaign 排名不支持 campaign_id 过滤")
+            ranked_ids, total = engine.ranked_campaigns(
+                metric, "Campaign ID", CAMPAIGN_MEAN_METRICS, top_n=_int("top_n", 10),
+                date_col="Interval", start=filters["start"], end=filters["end"]
+            )
+            names = engine.campaign_names()
+            return {
+                "metric": metric,
+                "aggregation": "mean" if metric in CAMPAIGN_MEAN_METRICS else "sum",
+                "campaigns": [
+                    {"rank": i + 1, "campaign_id": cid, "campaign_name": names.get(cid), "value": _json_value(value)}
+                    for i, (cid, value) in enumerate(zip(ranked_ids, total.to_numpy()))
+                ]
+            }
+        return cached_json(compute)
+
+    @app.get("/api/skus/ranking")
+    def sku_ranking():
+        def compute():
+            sort = _choice("sort", PROMOTED_METRICS, "SPA Sales")
+            table = engine.sku_metrics(PROMOTED_METRICS, **_filters())
+            table = table.iloc[top_n_positions(table[sort].to_numpy(), _int("top_n", 20))]
+            table = table.rename_axis("sku").reset_index()
+            if "HD SKU Map" in bundle:
+                sku_map = engine.frame("HD SKU Map").drop_duplicates(subset="OMSID")
+                table = with_sku_map(table, sku_map, sku_col="sku").drop(columns="OMSID")
+            return {"sort": sort, "skus": _records(table)}
+        return cached_json(compute)
+
+    @app.get("/api/skus/daily")
+    def sku_daily():
+        def compute():
+            daily, totals = sku_daily_matrix(engine.sku_daily_sales(**_filters()))
+            skus = request.args.getlist("sku")
+            if skus:
+                unknown = [s for s in skus if s not in daily.columns]
+                if unknown:
+                    raise BadRequest(f"窗口内没有这些 SKU：{unknown}")
+            else:
+                skus = rank_top_n(totals, _int("top_n", 10))[0].tolist()
+            return {
+                "days": [d.date().isoformat() for d in daily.index],
+                "series": [
+                    {"sku": sku, "total": _json_value(totals[sku]), "values": daily[sku].round(6).tolist()}
+                    for sku in skus
+                ]
+            }
+        return cached_json(compute)
+
+    @app.get("/api/halo")
+    def halo():
+        def compute():
+            sku_map = engine.frame("HD SKU Map") if "HD SKU Map" in bundle else None
+            detail, summary = halo_tables(engine.halo_sales(**_filters()), sku_map)
+            sku = request.args.get("sku")
+            if sku:
+                if sku not in summary.index:
+                    raise BadRequest(f"窗口内没有该 Promoted SKU：{sku}")
+                rows = detail.loc[[sku]] if sku in detail.index else detail.iloc[0:0]
+                return {
+                    "sku": sku,
+                    "summary": _records(summary.loc[[sku]].reset_index())[0],
+                    "purchases": _records(rows.reset_index(drop=True))
+                }
+            board = halo_leaderboard(summary, _int("top_n", 10))
+            return {"skus": _records(board.reset_index())}
+        return cached_json(compute)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="广告聚合数据的只读 JSON 接口")
+    parser.add_argument("--bundle", default=api_configs["bundle_dir"], help="python -m query.build 生成的数据包目录")
+    parser.add_argument("--host", default=api_configs["host"])
+    parser.add_argument("--port", type=int, default=api_configs["port"])
+    options = parser.parse_args()
+    # threaded：每个请求一个线程，查询引擎与响应缓存都是线程安全的
+    create_app(options.bundle).run(host=options.host, port=options.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
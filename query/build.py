@@ -0,0 +1,123 @@
+"""
+从平台导出的 Excel 文件构建 Parquet 数据包，供 query.api 等不经过页面的工具使用：
+
+    python -m query.build --out persist_data/bundle \\
+        --file "Campaign Summary=exports/campaign.xlsx" \\
+        --file "Promoted Sales=exports/promoted.xlsx" \\
+        --file "Purchased Sales=exports/purchased.xlsx" \\
+        --file "HD SKU Map=exports/sku_map.xlsx"
+
+读取与预处理方式与文件上传页一致（同一份 file_configs 与 preprocess 函数）。
+每个数据集的版本为文件内容键，重复构建时内容未变化的数据集不会重写；
+数据包只保留本次指定的数据集。
+
+多年的历史可以加 --partition month（或 day）逐个文件追加：Promoted / Purchased Sales 按时间段与 Campaign 分区写入，
+可重复指定多个文件，已追加过的文件跳过；分区数据集在多次构建之间累积，同一时间段与 Campaign 以最后写入的为准：
+
+    python -m query.build --out persist_data/bundle --partition month \
+        --file "Campaign Summary=exports/campaign.xlsx" \
+        --file "Promoted Sales=exports/promoted_2024.xlsx" \
+        --file "Promoted Sales=exports/promoted_2025.xlsx"
+"""
+import argparse
+import sys
+
+import pandas as pd
+
+from config import file_configs
+from preprocess import PREPROCESS_MAP, UNCACHED_PREPROCESS_MAP
+from query.bundle import ParquetBundle
+from query.engine import PARTITIONED_DATASETS
+from utils.shared_store import content_key
+from utils.validate import validate_dataframe
+
+# 预处理结果还依赖哪些数据集（与上传页一致），被依赖的数据集先处理
+DEPENDENCIES = {
+    "promoted": ["Campaign Summary", "HD SKU Map"],
+    "purchased": ["Campaign Summary"]
+}
+
+
+def _order(files: dict) -> list[str]:
+    """按依赖排序：Campaign Summary、HD SKU Map 先于 Promoted / Purchased Sales。"""
+    depended = {dep for deps in DEPENDENCIES.values() for dep in deps}
+    return sorted(files, key=lambda name: (name not in depended, list(file_configs).index(name)))
+
+
+def _read(name: str, path: str, datasets: dict, keys: dict, preprocess_map: dict) -> tuple[str, pd.DataFrame]:
+    """读取、校验并预处理一个文件，返回 (内容键, DataFrame)。"""
+    cfg = file_configs[name]
+    with open(path, "rb") as f:
+        raw = f.read()
+    fn_key = cfg.get("preprocess_fn")
+    dependencies = [keys.get(dep) for dep in DEPENDENCIES.get(fn_key, [])]
+    key = content_key(name, raw, str(cfg.get("skiprows", 0)), *dependencies)
+
+    df = pd.read_excel(path, skiprows=cfg.get("skiprows", 0))
+    missing = validate_dataframe(df, cfg.get("required_cols", []))
+    if missing:
+        raise ValueError(f"{name} 缺少列：{missing}")
+
+    campaign_df = datasets.get("Campaign Summary")
+    campaign_ids = campaign_df["Campaign ID"].tolist() if campaign_df is not None else None
+    if fn_key == "promoted":
+        df = preprocess_map[fn_key](df, campaign_ids, datasets.get("HD SKU Map"))
+    elif fn_key == "purchased":
+        df = preprocess_map[fn_key](df, campaign_ids)
+    elif fn_key in preprocess_map:
+        df = preprocess_map[fn_key](df)
+    return key, df
+
+
+def build_bundle(files: dict, out: str, partition: str | None = None) -> dict:
+    """
+    files 为 {数据集名: [Excel 路径, ...]}，返回 {数据集名: 行数}。
+    partition 为 None 时每个数据集只能有一个文件；为 "month" / "day" 时 Promoted / Purchased Sales 逐个文件按分区追加。
+    """
+    bundle = ParquetBundle(out)
+    datasets, keys, versions = {}, {}, {}
+    for name in _order(files):
+        if partition and name in PARTITIONED_DATASETS:
+            for path in files[name]:
+                key, df = _read(name, path, datasets, keys, UNCACHED_PREPROCESS_MAP)
+                if bundle.has_source(name, key):
+                    print(f"{name} ← {path}：已追加过，跳过")
+                    continue
+                rows = bundle.append(name, df, key, date_col=file_configs[name]["date_col"], period=partition)
+                print(f"{name} ← {path}：{rows} 行已按分区写入")
+            continue
+        if len(files[name]) > 1:
+            raise ValueError(f"{name} 只能指定一个文件（只有 --partition 时 Promoted / Purchased Sales 可以指定多个）")
+        keys[name], datasets[name] = _read(name, files[name][0], datasets, keys, PREPROCESS_MAP)
+        versions[name] = keys[name]
+
+    written = bundle.sync(datasets, versions)
+    for name in datasets:
+        print(f"{name}: {len(datasets[name])} 行{'（已更新）' if name in written else '（未变化）'}")
+    return {name: entry["rows"] for name, entry in bundle.describe().items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从 Excel 导出文件构建 Parquet 数据包")
+    parser.add_argument("--out", required=True, help="数据包目录")
+    parser.add_argument("--file", action="append", required=True, metavar="数据集名=路径",
+                        help=f"可重复指定；数据集名取自 {', '.join(file_configs)}")
+    parser.add_argument("--partition", choices=["month", "day"], default=None,
+                        help="Promoted / Purchased Sales 按时间段与 Campaign 分区追加写入（见 query_configs['out_of_core']）")
+    options = parser.parse_args()
+
+    files = {}
+    for item in options.file:
+        name, sep, path = item.partition("=")
+        if not sep or name not in file_configs:
+            parser.error(f"无法识别的 --file：{item}")
+        files.setdefault(name, []).append(path)
+    try:
+        build_bundle(files, options.out, options.partition)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
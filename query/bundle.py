@@ -0,0 +1,322 @@
+import datetime
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from utils.pandas_setup import pd
+
+MANIFEST = "manifest.json"
+# 分区数据集目录中记录合并后 schema 的文件（"_" 开头，扫描时被忽略）
+COMMON_METADATA = "_common_metadata"
+# 分区列：时间段与 Campaign，由 append 从日期列与 Campaign ID 派生，按 hive 目录结构（period=2025-01/campaign=123/）写入
+PERIOD_COL = "period"
+CAMPAIGN_COL = "campaign"
+PERIOD_FORMATS = {"month": "%Y-%m", "day": "%Y-%m-%d"}
+PARTITIONING = ds.partitioning(pa.schema([(PERIOD_COL, pa.string()), (CAMPAIGN_COL, pa.string())]), flavor="hive")
+
+
+def dataset_slug(name: str) -> str:
+    """数据集名 -> 文件名，如 "Promoted Sales" -> "promoted_sales"。"""
+    return re.sub(r"\W+", "_", name).strip("_").lower()
+
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    """
+    DataFrame -> Arrow 表（不保留索引）。
+    Arrow 无法表示的 object 列（如 bool 与字符串混合的 Status）逐列退回为字符串，其余列保持原类型。
+    """
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    arrays = []
+    for _, col in df.items():
+        try:
+            arrays.append(pa.array(col, from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array(col.map(str, na_action="ignore"), type=pa.string(), from_pandas=True))
+    return pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+
+
+def _period_bounds(period: str, fmt: str) -> tuple[datetime.date, datetime.date]:
+    """时间段（如 "2025-01" 或 "2025-01-31"）的首尾日期。"""
+    first = datetime.datetime.strptime(period, fmt).date()
+    if fmt == PERIOD_FORMATS["day"]:
+        return first, first
+    following = (first.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return first, following - datetime.timedelta(days=1)
+
+
+class ParquetBundle:
+    """
+    查询后端读取的 Parquet 数据包：root 下每个数据集一个 Parquet 文件，manifest.json 记录各数据集的版本与行数。
+    - sync 只重写版本变化的数据集
+    - append 把数据集按 (时间段, Campaign) 分区写入一个目录，可分多次追加，整个历史不需要同时放在内存中
+    - dataset 返回 pyarrow.dataset，查询时再做列裁剪、分区裁剪与过滤下推
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._manifest = self._read_manifest()
+        # {数据集名: (版本, pyarrow.dataset)}：分区数据集的目录发现要列出全部分区文件，按版本缓存
+        self._datasets = {}
+
+    def _read_manifest(self) -> dict:
+        path = os.path.join(self.root, MANIFEST)
+        try:
+            self._mtime = os.stat(path).st_mtime_ns
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def refresh(self) -> bool:
+        """数据包被其他进程重建（manifest.json 变化）时重新读取，返回是否有变化。"""
+        try:
+            mtime = os.stat(os.path.join(self.root, MANIFEST)).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+        with self._lock:
+            self._manifest = self._read_manifest()
+        return True
+
+    def _write_manifest(self):
+        tmp = os.path.join(self.root, f".{MANIFEST}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, os.path.join(self.root, MANIFEST))
+        self._mtime = os.stat(os.path.join(self.root, MANIFEST)).st_mtime_ns
+
+    @property
+    def generation(self) -> tuple:
+        """数据包内容的标识：任一数据集重写后变化，用作查询结果的缓存键。"""
+        return tuple(sorted((name, entry["version"]) for name, entry in self._manifest.items()))
+
+    def describe(self) -> dict:
+        """{数据集名: {"version": ..., "rows": ...}}；分区数据集另有时间段粒度、分区数与日期范围。"""
+        described = {}
+        for name, e in self._manifest.items():
+            described[name] = {"version": e["version"], "rows": e["rows"]}
+            if "period" in e:
+                start, end = self.date_range(name)
+                described[name].update(period=e["period"], partitions=len(e["partitions"]),
+                                       start=str(start) if start else None, end=str(end) if end else None)
+        return described
+
+    def names(self) -> list[str]:
+        return list(self._manifest)
+
+    def __contains__(self, name) -> bool:
+        return name in self._manifest
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, self._manifest[name]["file"])
+
+    def partitioned(self, name: str) -> bool:
+        """name 是否为 append 写入的分区数据集。"""
+        return "period" in self._manifest.get(name, {})
+
+    def write(self, name: str, df: pd.DataFrame, version=None):
+        """写入（或替换）一个数据集；先写临时文件再替换，并发的读者不会读到半个文件。"""
+        table = to_arrow(df)
+        with self._lock:
+            if "period" in self._manifest.get(name, {}):
+                shutil.rmtree(os.path.join(self.root, self._manifest[name]["file"]), ignore_errors=True)
+            os.makedirs(self.root, exist_ok=True)
+            file = f"{dataset_slug(name)}.parquet"
+            tmp = os.path.join(self.root, f".{file}.{os.getpid()}.{threading.get_ident()}.tmp")
+            pq.write_table(table, tmp)
+            os.replace(tmp, os.path.join(self.root, file))
+            self._manifest[name] = {"file": file, "version": version, "rows": table.num_rows}
+            self._write_manifest()
+
+    def append(self, name: str, df: pd.DataFrame, source: str, date_col: str = "Day",
+               campaign_col: str = "Campaign ID", period: str = "month") -> int:
+        """
+        把 df 按 (时间段, Campaign) 分区追加到数据集 name，返回写入的行数。
+        - 以 (Campaign, 日期) 为替换单位：df 中出现的每个 Campaign 的每一天，替换已存储的同一天数据，
+          同一分区中其他日期的行保留（半个月的导出或时间段重叠的导出不会丢数据，重复上传也不会重复计数）
+        - source 标识这份数据（如文件内容键），已追加过的 source 可用 has_source 跳过
+        - 日期为空的行无法归入时间段，不写入；没有可写入的行时不创建数据集
+        """
+        table = to_arrow(df)
+        table = table.filter(pc.is_valid(table[date_col]))
+        if table.num_rows == 0:
+            return 0
+        if pa.types.is_timestamp(table.schema.field(date_col).type):
+            table = table.set_column(table.schema.get_field_index(date_col), date_col,
+                                     pc.cast(table[date_col], pa.date32()))
+        table = (
+            table.append_column(PERIOD_COL, pc.strftime(table[date_col], format=PERIOD_FORMATS[period]))
+                 .append_column(CAMPAIGN_COL, pc.cast(table[campaign_col], pa.string()))
+        )
+        with self._lock:
+            entry = self._manifest.get(name)
+            if entry is not None and entry.get("period") != period:
+                raise ValueError(f"{name} 已按 {entry.get('period') or '单个文件'} 写入，不能再按 {period} 分区追加")
+            directory = os.path.join(self.root, dataset_slug(name))
+            os.makedirs(directory, exist_ok=True)
+            # 各次追加的列可能不完全相同（如部分文件缺少映射列），合并后的 schema 供读取时统一各分区文件
+            schema = table.schema
+            if entry is not None:
+                schema = pa.unify_schemas([pq.read_schema(os.path.join(directory, COMMON_METADATA)), schema],
+                                          promote_options="permissive")
+
+            # 写入会整体替换涉及的分区：先读回这些分区中已存储的行，去掉新数据覆盖的 (Campaign, 日期)，与新数据合并后再写
+            merged = table
+            touched = pc.binary_join_element_wise(table[PERIOD_COL], table[CAMPAIGN_COL], "/").unique()
+            stored_keys = [key for key in touched.to_pylist() if entry is not None and key in entry["partitions"]]
+            if stored_keys:
+                periods = sorted({key.split("/", 1)[0] for key in stored_keys})
+                campaigns = sorted({key.split("/", 1)[1] for key in stored_keys})
+                stored = self.dataset(name).to_table(
+                    filter=ds.field(PERIOD_COL).isin(periods) & ds.field(CAMPAIGN_COL).isin(campaigns)
+                )
+                stored = stored.filter(pc.is_in(
+                    pc.binary_join_element_wise(stored[PERIOD_COL], stored[CAMPAIGN_COL], "/"), pa.array(stored_keys)
+                ))
+                replaced = table.select([CAMPAIGN_COL, date_col]).group_by([CAMPAIGN_COL, date_col], use_threads=False).aggregate([])
+                kept = stored.join(replaced, keys=[CAMPAIGN_COL, date_col], join_type="left anti")
+                merged = pa.concat_tables([kept, table], promote_options="permissive")
+
+            ds.write_dataset(
+                merged, directory, format="parquet", partitioning=PARTITIONING,
+                existing_data_behavior="delete_matching",
+                basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet"
+            )
+            pq.write_metadata(schema, os.path.join(directory, COMMON_METADATA))
+
+            # 每个分区的行数与日期范围，用于统计行数、日期控件范围与分块
+            stats = merged.group_by([PERIOD_COL, CAMPAIGN_COL], use_threads=False).aggregate(
+                [([], "count_all"), (date_col, "min"), (date_col, "max")]
+            )
+            partitions = dict(entry["partitions"]) if entry else {}
+            for part, campaign, rows, first, last in zip(*(stats[c].to_pylist() for c in stats.column_names)):
+                partitions[f"{part}/{campaign}"] = [rows, str(first), str(last)]
+            sources = (entry["sources"] if entry else []) + [source]
+            self._manifest[name] = {
+                "file": dataset_slug(name),
+                # 版本随每次追加变化，查询结果缓存随之失效
+                "version": hashlib.sha1("/".join(map(str, sources)).encode()).hexdigest()[:16],
+                "rows": sum(part[0] for part in partitions.values()),
+                "period": period,
+                "partitions": partitions,
+                "sources": sources
+            }
+            self._write_manifest()
+        return table.num_rows
+
+    def has_source(self, name: str, source: str) -> bool:
+        return source in self._manifest.get(name, {}).get("sources", [])
+
+    def date_range(self, name: str) -> tuple:
+        """分区数据集的 (最早日期, 最晚日期)；append 不会创建没有数据的分区数据集，只有空的 manifest 条目才为 (None, None)。"""
+        partitions = self._manifest[name]["partitions"].values()
+        if not partitions:
+            return None, None
+        return (datetime.date.fromisoformat(min(p[1] for p in partitions)),
+                datetime.date.fromisoformat(max(p[2] for p in partitions)))
+
+    def periods(self, name: str, start=None, end=None) -> list[tuple]:
+        """
+        分区数据集中与 [start, end] 有交集的时间段，按时间顺序返回 (段首, 段尾, 该段行数)，段首尾已与窗口取交集；
+        未分区的数据集返回空列表。
+        """
+        entry = self._manifest.get(name, {})
+        if "period" not in entry:
+            return []
+        fmt = PERIOD_FORMATS[entry["period"]]
+        rows = {}
+        for key, stats in entry["partitions"].items():
+            period = key.split("/", 1)[0]
+            rows[period] = rows.get(period, 0) + stats[0]
+        windows = []
+        for period in sorted(rows):
+            first, last = _period_bounds(period, fmt)
+            first, last = max(first, start) if start else first, min(last, end) if end else last
+            if first <= last:
+                windows.append((first, last, rows[period]))
+        return windows
+
+    def partition_filter(self, name: str, start=None, end=None, campaign_ids=None):
+        """分区数据集上与日期窗口、Campaign 对应的分区裁剪条件；未分区或不限时返回 None。"""
+        entry = self._manifest.get(name, {})
+        if "period" not in entry:
+            return None
+        fmt = PERIOD_FORMATS[entry["period"]]
+        expr = None
+        if start is not None:
+            expr = ds.field(PERIOD_COL) >= start.strftime(fmt)
+        if end is not None:
+            cond = ds.field(PERIOD_COL) <= end.strftime(fmt)
+            expr = cond if expr is None else expr & cond
+        if campaign_ids:
+            cond = ds.field(CAMPAIGN_COL).isin([str(c) for c in campaign_ids])
+            expr = cond if expr is None else expr & cond
+        return expr
+
+    def drop(self, name: str):
+        with self._lock:
+            entry = self._manifest.pop(name, None)
+            if entry is None:
+                return
+            path = os.path.join(self.root, entry["file"])
+            if "period" in entry:
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._write_manifest()
+
+    def sync(self, datasets, versions: dict) -> list[str]:
+        """
+        让数据包与 datasets 一致：versions 为 {数据集名: 版本号}，只重写版本变化的数据集，
+        删除 datasets 中已不存在的数据集（append 写入的分区数据集不在 datasets 中，保持不变）。返回重写过的数据集名。
+        """
+        written = []
+        for name, version in versions.items():
+            entry = self._manifest.get(name)
+            if entry is None or entry["version"] != version:
+                self.write(name, datasets[name], version)
+                written.append(name)
+        for name in [n for n in self._manifest if n not in versions and not self.partitioned(n)]:
+            self.drop(name)
+        return written
+
+    def dataset(self, name: str) -> ds.Dataset:
+        version = self._manifest[name]["version"]
+        cached = self._datasets.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        if self.partitioned(name):
+            schema = pq.read_schema(os.path.join(self.path(name), COMMON_METADATA))
+            dataset = ds.dataset(self.path(name), format="parquet", partitioning=PARTITIONING, schema=schema)
+        else:
+            dataset = ds.dataset(self.path(name), format="parquet")
+        self._datasets[name] = (version, dataset)
+        return dataset
+
+    def schema(self, name: str) -> pa.Schema:
+        return self.dataset(name).schema
+
+    def remove(self):
+        """删除整个数据包目录。"""
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self._manifest = {}
+            self._datasets = {}
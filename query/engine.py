@@ -0,0 +1,258 @@
+import threading
+from collections import OrderedDict
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from query.bundle import CAMPAIGN_COL, PERIOD_COL, ParquetBundle
+from utils.pandas_setup import pd
+from utils.ranking import top_n_positions
+
+# out_of_core 模式下按 (时间段, Campaign) 分区写入数据包、不放入会话内存的数据集
+PARTITIONED_DATASETS = ["Promoted Sales", "Purchased Sales"]
+# Promoted Sales 与 Purchased Sales 的连接键（与趋势页 pandas merge 的 on 一致）
+JOIN_KEYS = ["Day", "Campaign ID", "Promoted OMSID"]
+DESC_COL = "Promoted OMSID Description"
+# sum 对全空分组返回 0（与 pandas groupby().sum() 一致）
+SUM_ZERO = pc.ScalarAggregateOptions(skip_nulls=True, min_count=0)
+
+
+def _align(table: pa.Table, reference: pa.Table, keys: list[str]) -> pa.Table:
+    """把 table 的连接键转换为 reference 中的类型（Arrow 连接要求两边键类型一致）。"""
+    for key in keys:
+        want = reference.schema.field(key).type
+        have = table.schema.field(key).type
+        if have != want:
+            table = table.set_column(table.schema.get_field_index(key), key, pc.cast(table[key], want))
+    return table
+
+
+class ArrowQueryEngine:
+    """
+    基于 Parquet 数据包的聚合查询（Arrow compute）：
+    - 只读取查询用到的列，日期窗口作为过滤条件下推到扫描
+    - 连接与分组聚合在 Arrow 中多线程执行，只有聚合后的小表才转为 pandas
+    - 返回值与 compute 中对应的 pandas 实现形状一致，可直接交给现有的绘图函数
+    - 分区数据集（见 ParquetBundle.append）按日期窗口与 Campaign 裁剪分区，并按时间段分块扫描、连接与聚合，
+      内存占用取决于一块明细（不超过 chunk_rows 行）与聚合结果，与整个历史的长度无关
+    结果按 (查询, 参数, 数据包版本) 缓存，数据集重写后自动失效。
+    """
+
+    def __init__(self, bundle: ParquetBundle, use_threads: bool = True, cache_size: int = 32,
+                 chunk_rows: int | None = None):
+        self.bundle = bundle
+        self.use_threads = use_threads
+        self.cache_size = cache_size
+        # 分区数据集分块时每块最多的行数：相邻时间段合并到一块，直到超过该行数；None 表示每个时间段一块
+        self.chunk_rows = chunk_rows
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key: tuple, compute):
+        key = (key, self.bundle.generation)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        result = compute()
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    # ---- 扫描 ----
+    def _window(self, name: str, date_col: str | None, start=None, end=None):
+        """日期窗口 [start, end] 的过滤表达式（两端都包含）；不限时返回 None。"""
+        if date_col is None or (start is None and end is None):
+            return None
+        field_type = self.bundle.schema(name).field(date_col).type
+        expr = None
+        for bound, op in ((start, "ge"), (end, "le")):
+            if bound is None:
+                continue
+            value = pa.scalar(bound).cast(field_type)
+            cond = ds.field(date_col) >= value if op == "ge" else ds.field(date_col) <= value
+            expr = cond if expr is None else expr & cond
+        return expr
+
+    def _filter(self, name: str, date_col: str | None, start=None, end=None, campaign_ids=None):
+        """日期窗口加上可选的 Campaign ID 过滤；分区数据集另加分区裁剪条件，窗口外的分区文件不会被打开。"""
+        expr = self._window(name, date_col, start, end)
+        if campaign_ids:
+            field_type = self.bundle.schema(name).field("Campaign ID").type
+            cond = ds.field("Campaign ID").isin(pa.array([str(c) for c in campaign_ids]).cast(field_type))
+            expr = cond if expr is None else expr & cond
+        pruning = self.bundle.partition_filter(name, start, end, campaign_ids)
+        if pruning is not None:
+            expr = pruning if expr is None else expr & pruning
+        return expr
+
+    def _chunks(self, name: str, start=None, end=None) -> list[tuple]:
+        """
+        分块查询的窗口 [(段首, 段尾)]：分区数据集按时间顺序把相邻时间段合并为不超过 chunk_rows 行的块
+        （与 [start, end] 取交集），未分区的数据集整个窗口一块。
+        """
+        chunks = []
+        for first, last, rows in self.bundle.periods(name, start, end):
+            if chunks and self.chunk_rows and chunks[-1][2] + rows <= self.chunk_rows:
+                chunks[-1] = (chunks[-1][0], last, chunks[-1][2] + rows)
+            else:
+                chunks.append((first, last, rows))
+        return [(first, last) for first, last, _ in chunks] or [(start, end)]
+
+    def _scan(self, name: str, columns: list[str], filter=None) -> pa.Table:
+        dataset = self.bundle.dataset(name)
+        columns = [c for c in dict.fromkeys(columns) if c in dataset.schema.names]
+        return dataset.to_table(columns=columns, filter=filter, use_threads=self.use_threads)
+
+    def _sum(self, table: pa.Table, keys: list[str], values) -> pa.Table:
+        """按 keys 分组对 values（列名或列名列表）求和，输出列名保持不变。"""
+        values = [values] if isinstance(values, str) else list(values)
+        agg = table.group_by(keys, use_threads=self.use_threads).aggregate([(v, "sum", SUM_ZERO) for v in values])
+        renamed = {f"{v}_sum": v for v in values}
+        return agg.rename_columns([renamed.get(c, c) for c in agg.column_names])
+
+    def _sum_chunks(self, tables, keys: list[str], values) -> pa.Table:
+        """
+        逐块分组求和，并与之前各块的部分和合并：同一时刻内存中只有一块明细与累计的聚合结果。
+        tables 为可迭代的块（通常是生成器，读取下一块前上一块已释放）。
+        """
+        total = None
+        for table in tables:
+            part = self._sum(table, keys, values)
+            total = part if total is None else self._sum(pa.concat_tables([total, part]), keys, values)
+        return total
+
+    def _promoted_purchases(self, start=None, end=None, campaign_ids=None) -> pa.Table:
+        """
+        日期窗口内的 Promoted Sales 左连接 Purchased Sales（等价于趋势页的 df_promoted.merge(purchased, how='left')），
+        只保留连接键、Purchased OMSID 与 SPA Sales_y。
+        """
+        left = self._scan("Promoted Sales", JOIN_KEYS, self._filter("Promoted Sales", "Day", start, end, campaign_ids))
+        right = self._scan("Purchased Sales", JOIN_KEYS + ["Purchased OMSID", "SPA Sales"],
+                           self._filter("Purchased Sales", "Day", start, end, campaign_ids))
+        right = _align(right, left, JOIN_KEYS).rename_columns(
+            ["SPA Sales_y" if c == "SPA Sales" else c for c in right.column_names]
+        )
+        return left.join(right, JOIN_KEYS, join_type="left outer", use_threads=self.use_threads)
+
+    # ---- 查询 ----
+    def ranked_campaigns(
+        self,
+        metric: str,
+        campaign_col: str,
+        mean_metrics: list[str],
+        top_n: int | None = None,
+        date_col: str | None = None,
+        start=None,
+        end=None
+    ) -> tuple[list, pd.Series]:
+        """同 compute.campaign.rank_campaign_totals，在 Campaign Summary 上按日期窗口汇总并排名。"""
+        def compute():
+            table = self._scan("Campaign Summary", [campaign_col, metric],
+                               self._window("Campaign Summary", date_col, start, end))
+            how = "mean" if metric in mean_metrics else "sum"
+            agg = table.group_by(campaign_col, use_threads=self.use_threads).aggregate([(metric, how, SUM_ZERO)])
+            # 与 pandas groupby 一致：丢弃空键，按键排序
+            agg = agg.filter(pc.is_valid(agg[campaign_col])).sort_by(campaign_col)
+            return pd.Series(
+                agg[f"{metric}_{how}"].to_numpy(zero_copy_only=False),
+                index=pd.Index(agg[campaign_col].to_pylist(), name=campaign_col),
+                name=metric
+            )
+
+        total = self._cached(("campaign_totals", metric, campaign_col, tuple(mean_metrics), date_col, start, end), compute)
+        pos = top_n_positions(total.to_numpy(), len(total) if top_n is None else top_n)
+        total = total.iloc[pos]
+        return total.index.tolist(), total
+
+    def frame(self, name: str) -> pd.DataFrame:
+        """整张读取一个（小）数据集，如 HD SKU Map。"""
+        return self._cached(("frame", name), lambda: self.bundle.dataset(name).to_table(use_threads=self.use_threads).to_pandas())
+
+    def date_range(self, name: str, date_col: str) -> tuple:
+        """数据集日期列的 (最早, 最晚)；分区数据集直接取自 manifest，不扫描数据。"""
+        if self.bundle.partitioned(name):
+            return self.bundle.date_range(name)
+
+        def compute():
+            bounds = pc.min_max(self._scan(name, [date_col])[date_col]).as_py()
+            return bounds["min"], bounds["max"]
+
+        return self._cached(("date_range", name, date_col), compute)
+
+    def window_frame(self, name: str, date_col: str, start=None, end=None, campaign_ids=None) -> pd.DataFrame:
+        """
+        窗口内（可再按 Campaign 筛选）的明细行，列与上传时的 DataFrame 一致（不含分区列），
+        如趋势页单个 Campaign 的 Promoted SKU 明细。不缓存，内存占用只与窗口大小有关。
+        """
+        columns = [c for c in self.bundle.schema(name).names if c not in (PERIOD_COL, CAMPAIGN_COL)]
+        return self._scan(name, columns, self._filter(name, date_col, start, end, campaign_ids)).to_pandas()
+
+    def campaign_names(self, campaign_col: str = "Campaign ID", name_col: str = "Campaign Name") -> dict:
+        """Campaign ID -> Campaign Name。"""
+        def compute():
+            table = self._scan("Campaign Summary", [campaign_col, name_col])
+            if name_col not in table.column_names:
+                return {}
+            return dict(zip(table[campaign_col].to_pylist(), table[name_col].to_pylist()))
+
+        return self._cached(("campaign_names", campaign_col, name_col), compute)
+
+    def sku_metrics(self, metrics: list[str], start=None, end=None, campaign_ids=None,
+                    sku_col: str = "Promoted OMSID") -> pd.DataFrame:
+        """
+        同 compute.sku.sku_metric_table 的聚合表：窗口内各 SKU 的指标之和，
+        SPA ROAS 按 SPA Sales / Spend 重新计算。index=SKU，按 SKU 排序。
+        """
+        def compute():
+            names = self.bundle.schema("Promoted Sales").names
+            summed = [m for m in metrics if m in names]
+            chunks = (
+                self._scan("Promoted Sales", [sku_col, *summed], self._filter("Promoted Sales", "Day", lo, hi, campaign_ids))
+                for lo, hi in self._chunks("Promoted Sales", start, end)
+            )
+            df = self._sum_chunks(chunks, [sku_col], summed).sort_by(sku_col).to_pandas().set_index(sku_col)[summed]
+            if "SPA Sales" in df.columns and "Spend" in df.columns:
+                df["SPA ROAS"] = df["SPA Sales"] / df["Spend"]
+            return df
+
+        return self._cached(("sku_metrics", tuple(metrics), start, end, tuple(campaign_ids or ()), sku_col), compute)
+
+    def sku_daily_sales(self, start=None, end=None, campaign_ids=None) -> pd.DataFrame:
+        """
+        窗口内每个 (Day, Promoted OMSID) 的 SPA Sales_y 之和（没有购买记录的 Promoted SKU 记为 0），
+        可直接交给 compute.sku.sku_daily_matrix。
+        """
+        def compute():
+            chunks = (self._promoted_purchases(lo, hi, campaign_ids) for lo, hi in self._chunks("Promoted Sales", start, end))
+            agg = self._sum_chunks(chunks, ["Day", "Promoted OMSID"], "SPA Sales_y")
+            return agg.sort_by([("Promoted OMSID", "ascending"), ("Day", "ascending")]).to_pandas()
+
+        return self._cached(("sku_daily_sales", start, end, tuple(campaign_ids or ())), compute)
+
+    def halo_sales(self, start=None, end=None, campaign_ids=None) -> pd.DataFrame:
+        """
+        窗口内每个 (Promoted OMSID, Purchased OMSID) 的 SPA Sales_y 之和，附带 Promoted SKU 描述，
+        可直接交给 compute.halo.halo_tables。
+        """
+        def compute():
+            windows = self._chunks("Promoted Sales", start, end)
+            chunks = (self._promoted_purchases(lo, hi, campaign_ids) for lo, hi in windows)
+            agg = self._sum_chunks(chunks, ["Promoted OMSID", "Purchased OMSID"], "SPA Sales_y")
+            if DESC_COL in self.bundle.schema("Promoted Sales").names:
+                # 每个 Promoted SKU 的第一个非空描述（按块的时间顺序）；first 依赖行序，只能单线程，输入只有两列
+                desc = None
+                for lo, hi in windows:
+                    part = self._scan("Promoted Sales", ["Promoted OMSID", DESC_COL],
+                                      self._filter("Promoted Sales", "Day", lo, hi, campaign_ids))
+                    if desc is not None:
+                        part = pa.concat_tables([desc, part])
+                    desc = part.group_by("Promoted OMSID", use_threads=False).aggregate([(DESC_COL, "first")])
+                    desc = desc.rename_columns([DESC_COL if c == f"{DESC_COL}_first" else c for c in desc.column_names])
+                agg = agg.join(desc, "Promoted OMSID", use_threads=self.use_threads)
+            return agg.sort_by([("Promoted OMSID", "ascending"), ("SPA Sales_y", "descending")]).to_pandas()
+
+        return self._cached(("halo_sales", start, end, tuple(campaign_ids or ())), compute)
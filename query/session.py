@@ -0,0 +1,78 @@
+import os
+import shutil
+import uuid
+import weakref
+
+import streamlit as st
+
+from config import file_configs, query_configs
+from query.bundle import ParquetBundle
+from query.engine import PARTITIONED_DATASETS, ArrowQueryEngine
+from utils.profiler import span
+from utils.session_memory import SessionDatasets
+
+# 查询后端用到的数据集；其余数据集（如 HD SKU Map、Daily Rank）只参与聚合后的小表处理，不写入数据包
+QUERY_DATASETS = ["Campaign Summary", "Promoted Sales", "Purchased Sales"]
+
+
+def _engine() -> ArrowQueryEngine:
+    engine = st.session_state.get("query_engine")
+    if engine is None:
+        bundle = ParquetBundle(os.path.join(query_configs["bundle_dir"], uuid.uuid4().hex))
+        # 会话结束、对象被回收时删除数据包
+        weakref.finalize(bundle, shutil.rmtree, bundle.root, True)
+        engine = st.session_state.query_engine = ArrowQueryEngine(
+            bundle,
+            use_threads=query_configs["use_threads"],
+            chunk_rows=query_configs["chunk_rows"]
+        )
+    return engine
+
+
+def session_engine(datasets) -> ArrowQueryEngine:
+    """
+    当前会话的查询引擎（query_configs["backend"] 为 "arrow" 或开启 out_of_core 时使用）。
+    每次调用先把会话中变化过的数据集同步到该会话的 Parquet 数据包（按数据集版本判断，未变化的不重写）。
+    """
+    engine = _engine()
+    names = [name for name in QUERY_DATASETS if name in datasets]
+    if isinstance(datasets, SessionDatasets):
+        versions = {name: datasets.version(name) for name in names}
+    else:
+        # 普通 dict（如测试中直接放入的数据）按对象身份判断是否变化
+        versions = {name: id(datasets[name]) for name in names}
+    with span("query.sync_bundle") as record:
+        record.rows_out = len(engine.bundle.sync(datasets, versions))
+    return engine
+
+
+def stored_datasets() -> list[str]:
+    """当前会话数据包中已按分区写入（out_of_core 模式上传）的数据集。"""
+    engine = st.session_state.get("query_engine")
+    if engine is None:
+        return []
+    return [name for name in PARTITIONED_DATASETS if engine.bundle.partitioned(name)]
+
+
+def append_partitions(name: str, df, source: str) -> int:
+    """out_of_core 模式：把一个上传文件预处理后的数据按分区追加到会话数据包，返回写入的行数。"""
+    with span(f"query.append[{name}]", len(df)) as record:
+        record.rows_out = _engine().bundle.append(
+            name, df, source,
+            date_col=file_configs[name]["date_col"],
+            period=query_configs["partition"]
+        )
+    return record.rows_out
+
+
+def has_source(name: str, source: str) -> bool:
+    """source（文件内容键）是否已追加到会话数据包中的 name。"""
+    engine = st.session_state.get("query_engine")
+    return engine is not None and engine.bundle.has_source(name, source)
+
+
+def drop_session_bundle():
+    """清空会话数据时删除整个数据包（包括分区数据集）。"""
+    engine = st.session_state.pop("query_engine", None)
+    if engine is not None:
+        engine.bundle.remove()
@@ -1,13 +1,16 @@
-import pandas as pd
 import streamlit as st
 from datetime import date
 
 import streamlit as st
 
-def time_filters(df, date_col, key_prefix=""):
+def time_window(df, date_col, key_prefix=""):
+    """侧边栏的日期范围控件，返回 (start, end)；范围无效时提示并返回 (None, None)，即不筛选。"""
+    return date_window(df[date_col].min(), df[date_col].max(), key_prefix)
+
+
+def date_window(min_date, max_date, key_prefix=""):
+    """同 time_window，日期范围直接给出（如分区数据包记录的最早 / 最晚日期，不需要把数据读入内存）。"""
     st.sidebar.header("🕒 时间范围筛选")
-    min_date = df[date_col].min()
-    max_date = df[date_col].max()
 
     start_key = f"{key_prefix}_start"
     end_key = f"{key_prefix}_end"
@@ -35,9 +38,16 @@ def time_filters(df, date_col, key_prefix=""):
     # 校验顺序
     if start > end:
         st.warning("⚠️ 结束时间不能早于开始时间，请重新选择")
+        return None, None
+    return start, end
+
+
+def time_filters(df, date_col, key_prefix=""):
+    start, end = time_window(df, date_col, key_prefix)
+    if start is None:
         return df
 
-    # 过滤并返回
+    # 过滤并返回：布尔筛选本身就生成新表，copy-on-write 下无需再 .copy() 防止改写原表
     mask = (df[date_col] >= start) & (df[date_col] <= end)
-    return df.loc[mask].copy()
+    return df.loc[mask]
 
@@ -0,0 +1,183 @@
+import datetime
+
+import numpy as np
+import plotly.graph_objects as go
+
+
+def donut_figure(labels: list, values, color_map: dict, title: str) -> go.Figure:
+    """环状图（hole=0.4，显示百分比与标签），颜色按 color_map 与其他图保持一致。"""
+    return go.Figure(
+        go.Pie(
+            labels=list(labels),
+            values=values,
+            marker=dict(colors=[color_map.get(label) for label in labels]),
+            hole=0.4,
+            textinfo='percent+label'
+        ),
+        layout=dict(title=title, legend=dict(tracegroupgap=0))
+    )
+
+
+def category_bar_figure(labels: list, values, color_map: dict, title: str, text_format: str = '.2f') -> go.Figure:
+    """每个类别一根柱（一条 trace，图例即类别），按 labels 顺序排列并在柱外标注数值。"""
+    fig = go.Figure(layout=dict(
+        title=title,
+        barmode='relative',
+        xaxis=dict(title='label', categoryorder='array', categoryarray=list(labels)),
+        yaxis=dict(title='value'),
+        legend=dict(title='label', tracegroupgap=0)
+    ))
+    for label, value in zip(labels, values):
+        fig.add_trace(go.Bar(
+            x=[label],
+            y=[value],
+            name=label,
+            marker=dict(color=color_map.get(label)),
+            text=[value],
+            texttemplate=f'%{{text:{text_format}}}',
+            textposition='outside'
+        ))
+    return fig
+
+
+def build_figures(specs: list[tuple]) -> list[go.Figure]:
+    """
+    按布局顺序批量构建网格中的图：specs 中每项为 (builder, 参数...)，如 (donut_figure, labels, values, color_map, title)。
+    网格中的图直接用 graph_objects 构建（每张约 1 ms），不经过 plotly.express 的数据整理（每张数十 ms）。
+    """
+    return [builder(*args) for builder, *args in specs]
+
+
+def combine_grid(figures: list[go.Figure], n_cols: int = 2, row_height: int = 420) -> go.Figure:
+    """
+    把网格中的图合并为一张 subplot 图，只序列化、发送一次：饼图放在 domain 子图，其余放在 xy 子图，
+    各图标题作为子图标题。饼图的图例按标签合并；柱状图的 trace 不再单独占图例。
+    """
+    from plotly.subplots import make_subplots
+
+    n_rows = -(-len(figures) // n_cols)
+    specs = [[None] * n_cols for _ in range(n_rows)]
+    for idx, fig in enumerate(figures):
+        is_domain = all(trace.type == 'pie' for trace in fig.data)
+        specs[idx // n_cols][idx % n_cols] = {'type': 'domain' if is_domain else 'xy'}
+
+    combined = make_subplots(
+        rows=n_rows,
+        cols=n_cols,
+        specs=specs,
+        subplot_titles=[fig.layout.title.text or '' for fig in figures],
+        vertical_spacing=min(0.3 / n_rows, 0.12)
+    )
+    for idx, fig in enumerate(figures):
+        row, col = idx // n_cols + 1, idx % n_cols + 1
+        for trace in fig.data:
+            combined.add_trace(trace, row=row, col=col)
+    combined.update_traces(showlegend=False, selector=lambda trace: trace.type != 'pie')
+    combined.update_layout(height=row_height * n_rows, barmode='relative', legend=dict(tracegroupgap=0))
+    return combined
+
+
+# 与 Plotly 默认值相同、删掉不影响渲染的 trace 属性（plotly.express 会显式写出）
+_DEFAULT_TRACE_FIELDS = {"showlegend": True, "xaxis": "x", "yaxis": "y"}
+_DAY_MS = 86400000
+
+
+def round_to_display(values: np.ndarray, decimals: int, significant: int) -> np.ndarray:
+    """
+    按显示精度舍入：至少保留 decimals 位小数，且至少保留 significant 位有效数字（小数值不被舍成 0）。
+    如 12345.6789 -> 12345.68，3.14159 -> 3.142，0.0123456 -> 0.01235。
+    """
+    values = np.asarray(values, dtype=float)
+    magnitude = np.floor(np.log10(np.abs(values), out=np.zeros_like(values), where=(values != 0) & np.isfinite(values)))
+    digits = np.maximum(decimals, significant - 1 - magnitude)
+    scale = 10.0 ** digits
+    with np.errstate(invalid='ignore', over='ignore'):
+        rounded = np.round(values * scale) / scale
+    return np.where(np.isfinite(rounded), rounded, values)
+
+
+def _as_days(values) -> np.ndarray | None:
+    """日期时间数组（datetime / date / datetime64）且都在零点时，返回 datetime64[D]；否则返回 None。"""
+    arr = np.asarray(values)
+    if arr.dtype.kind == 'O':
+        if not all(isinstance(v, (datetime.date, np.datetime64)) for v in arr):
+            return None
+        arr = arr.astype('datetime64[ns]')
+    elif arr.dtype.kind != 'M':
+        return None
+    days = arr.astype('datetime64[D]')
+    if np.isnat(days).any() or (days != arr).any():
+        return None
+    return days
+
+
+def _compact_numeric(values, decimals: int, significant: int):
+    """浮点数组按显示精度舍入；字符串等其余数组原样返回（预先格式化好的标签、类别坐标不改写）。"""
+    arr = np.asarray(values)
+    if arr.dtype.kind == 'f':
+        return round_to_display(arr, decimals, significant)
+    return values
+
+
+def _trace_changes(trace, decimals: int, significant: int) -> dict:
+    """计算一条 trace 需要改写的属性（键可为 "marker.symbol" 形式的路径，值为 None 表示删除），由 compact_figure 写回。"""
+    props = trace.to_plotly_json()
+    changes = {}
+
+    # 1. 去掉与默认值相同的属性
+    for name, default in _DEFAULT_TRACE_FIELDS.items():
+        if props.get(name) == default:
+            changes[name] = None
+    if props.get("type") == "scatter" and props.get("orientation") == "v" and not props.get("stackgroup"):
+        changes["orientation"] = None
+    if props.get("marker", {}).get("symbol") == "circle":
+        changes["marker.symbol"] = None
+    if props.get("line", {}).get("dash") == "solid":
+        changes["line.dash"] = None
+
+    # 2. 数值按显示精度舍入；branchvalues="total" 的层级图（sunburst 等）要求父节点不小于子节点之和，不舍入。
+    #    text 是直接显示的标签，不论类型都原样保留
+    if props.get("branchvalues") != "total":
+        for name in ("x", "y", "z", "values", "r", "customdata"):
+            if props.get(name) is not None:
+                compacted = _compact_numeric(props[name], decimals, significant)
+                if compacted is not props[name]:
+                    changes[name] = compacted
+
+    # 3. 全部相同的逐点属性合并为一个值
+    for name in ("text", "hovertext"):
+        values = changes.get(name, props.get(name))
+        if isinstance(values, (list, tuple, np.ndarray)) and len(values) > 1 and len(set(map(str, values))) == 1:
+            changes[name] = values[0]
+
+    # 4. 逐日等间隔的日期坐标改写为起点 + 步长（x0 / dx），不再逐点发送日期
+    for axis in ("x", "y"):
+        values = props.get(axis)
+        if values is None or len(values) < 3 or f"{axis}0" not in trace or f"d{axis}" not in trace:
+            continue
+        days = _as_days(values)
+        if days is None:
+            continue
+        steps = np.diff(days).astype(np.int64)
+        if steps[0] > 0 and (steps == steps[0]).all():
+            changes[axis] = None
+            changes[f"{axis}0"] = str(days[0])
+            changes[f"d{axis}"] = int(steps[0]) * _DAY_MS
+        else:
+            # 不等间隔时至少只发送日期部分（"2025-01-01" 而不是 "2025-01-01T00:00:00"）
+            changes[axis] = days.astype(str)
+    return changes
+
+
+def compact_figure(fig, decimals: int = 2, significant: int = 4):
+    """
+    发送前压缩图的 JSON（原地修改 fig）：
+    - 浮点坐标与数值按显示精度舍入，见 round_to_display；text 标签与字符串数组原样保留；
+    - 全部相同的 text / hovertext 合并为一个值，逐日等间隔的日期坐标改写为 x0 / dx，零点的日期时间只发送日期；
+    - 删掉 plotly.express 写出的、与默认值相同的 trace 属性。
+    """
+    for trace in fig.data:
+        # 逐个属性赋值比 trace.update / batch_update 快（少一轮校验与合并）
+        for name, value in _trace_changes(trace, decimals, significant).items():
+            trace[name] = value
+    return fig
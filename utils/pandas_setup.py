@@ -0,0 +1,11 @@
+"""
+导入 pandas 并设置全局选项。数据路径上的模块（预处理、会话数据集、compute/、query/）用
+`from utils.pandas_setup import pd` 代替 `import pandas as pd`，无论哪个模块先被导入，DataFrame 运算之前选项都已生效；
+app.py 不导入 pandas，打开页面时不会提前加载 pandas / numpy / pyarrow（见 bench.startup --check）。
+"""
+import pandas as pd
+
+# 全局启用 pandas copy-on-write：筛选、取列、assign 得到的新表与原表共享数据，直到其中一方被修改才复制。
+# 约定：预处理、compute/ 与 visuals/ 中的函数一律不改写传入的 DataFrame（用 assign / rename 等生成新表），
+# 会话中的数据集与 st.cache_data 的结果因此可以直接传递，不需要防御性的 .copy()。
+pd.set_option("mode.copy_on_write", True)
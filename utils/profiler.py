@@ -0,0 +1,226 @@
+import functools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from config import profiler_configs
+
+STATE_KEY = "_profiler"
+
+# tracemalloc 作用于整个进程：记录开启了内存剖析的会话，最后一个会话关闭剖析（或会话结束）时停止跟踪
+_tracing_sessions = set()
+_tracing_lock = threading.Lock()
+# 跟踪是否由本模块开启；由别处（如基准脚本）开启的跟踪不由这里停止
+_started_tracing = False
+
+
+class Span:
+    """一次计时区间：名称、嵌套深度、耗时、输入 / 输出行数、净分配内存（全进程），以及发送前后的字节数（图表）。"""
+
+    __slots__ = ("name", "depth", "start", "wall_ms", "rows_in", "rows_out", "alloc_mb", "bytes_in", "bytes_out")
+
+    def __init__(self, name: str, depth: int, start: float, rows_in=None):
+        self.name = name
+        self.depth = depth
+        self.start = start
+        self.wall_ms = None
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.alloc_mb = None
+        self.bytes_in = None
+        self.bytes_out = None
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _state() -> dict | None:
+    """当前会话的剖析状态；未启用或不在脚本线程（如后台爬取线程）中时返回 None。"""
+    if get_script_run_ctx() is None:
+        return None
+    state = st.session_state.get(STATE_KEY)
+    if state is None or not state["enabled"]:
+        return None
+    return state
+
+
+def profiling() -> bool:
+    """当前会话是否正在记录剖析数据；只在剖析时才值得做的额外测量（如序列化后的字节数）先检查它。"""
+    return _state() is not None
+
+
+def count_rows(value) -> int | None:
+    """DataFrame / Series 取行数，元组 / 列表取其中各 DataFrame 行数之和，Plotly 图取各 trace 的点数之和。"""
+    # 不主动导入 pandas：尚未导入时 value 也不可能是 DataFrame
+    pd = sys.modules.get("pandas")
+    frame_types = (pd.DataFrame, pd.Series) if pd is not None else ()
+    if isinstance(value, frame_types):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        counts = [len(v) for v in value if isinstance(v, frame_types)]
+        return sum(counts) if counts else None
+    data = getattr(value, "data", None)
+    if isinstance(data, tuple) and hasattr(value, "layout"):
+        points = 0
+        for trace in data:
+            for attr in ("x", "values", "r", "labels"):
+                series = getattr(trace, attr, None)
+                if series is not None:
+                    points += len(series)
+                    break
+        return points
+    return None
+
+
+@contextmanager
+def span(name: str, rows_in=None):
+    """
+    记录一段代码的耗时与内存，用法：
+        with span("upload.apply_sku_map", rows_in=len(df)) as s:
+            ...
+            s.rows_out = len(merged)
+    未启用剖析时开销只有一次状态查询。
+    """
+    state = _state()
+    if state is None:
+        yield Span(name, 0, 0.0, rows_in)
+        return
+
+    current = state["current"]
+    record = Span(name, len(current["stack"]), time.perf_counter() - current["started"], rows_in)
+    current["stack"].append(record)
+    traced = tracemalloc.is_tracing()
+    mem_before = tracemalloc.get_traced_memory()[0] if traced else None
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.wall_ms = (time.perf_counter() - started) * 1000
+        if traced and tracemalloc.is_tracing():
+            record.alloc_mb = (tracemalloc.get_traced_memory()[0] - mem_before) / 2 ** 20
+        current["stack"].pop()
+        current["spans"].append(record)
+
+
+def profiled(name: str | None = None):
+    """
+    函数级计时装饰器，rows_in 为参数中 DataFrame 的行数之和，rows_out 为返回值的行数。
+    与 st.cache_data 同用时放在其外层，命中缓存的耗时也会被记录。
+    """
+    def decorator(fn):
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _state() is None:
+                return fn(*args, **kwargs)
+            rows_in = count_rows([*args, *kwargs.values()])
+            with span(label, rows_in) as record:
+                result = fn(*args, **kwargs)
+                record.rows_out = count_rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def begin_rerun(page: str | None = None):
+    """在 app.py 顶部调用：开始记录一次新的 rerun。"""
+    if get_script_run_ctx() is None:
+        return
+    state = st.session_state.setdefault(STATE_KEY, {
+        "enabled": profiler_configs["enabled"],
+        "current": None,
+        "history": []
+    })
+    state["current"] = {"page": page, "at": time.time(), "started": time.perf_counter(), "stack": [], "spans": []}
+    _trace_memory(get_script_run_ctx().session_id, state["enabled"] and profiler_configs["trace_memory"])
+
+
+def _trace_memory(session_id: str, on: bool):
+    """登记 / 注销会话的内存剖析，按仍在剖析的会话数开启或停止进程级的 tracemalloc。"""
+    global _tracing_sessions, _started_tracing
+    with _tracing_lock:
+        if on:
+            _tracing_sessions.add(session_id)
+        else:
+            _tracing_sessions.discard(session_id)
+        # 直接关闭页面的会话不会再关掉开关，按运行时中仍存在的会话清理
+        if Runtime.exists():
+            runtime = Runtime.instance()
+            _tracing_sessions = {sid for sid in _tracing_sessions if sid == session_id or runtime.is_active_session(sid)}
+        if _tracing_sessions and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        elif not _tracing_sessions and _started_tracing:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            _started_tracing = False
+
+
+def _finish_rerun(state: dict) -> dict:
+    current = state["current"]
+    run = {
+        "page": current["page"],
+        "at": current["at"],
+        "total_ms": (time.perf_counter() - current["started"]) * 1000,
+        # 按开始时间排序，嵌套关系由 depth 体现
+        "spans": [s.to_dict() for s in sorted(current["spans"], key=lambda s: s.start)]
+    }
+    state["history"] = (state["history"] + [run])[-profiler_configs["history"]:]
+    return run
+
+
+def render_profiler_panel():
+    """在 app.py 末尾调用：侧边栏的剖析开关、本次 rerun 的耗时明细与 JSON 导出。"""
+    state = st.session_state.get(STATE_KEY)
+    if state is None or state["current"] is None:
+        return
+
+    with st.sidebar.expander("⏱️ 性能剖析", expanded=False):
+        enabled = st.toggle("记录每次运行的耗时", value=state["enabled"], key="_profiler_enabled")
+        if enabled != state["enabled"]:
+            state["enabled"] = enabled
+            # 下一次 begin_rerun 按新状态登记 / 注销内存剖析
+            st.rerun()
+        if not enabled:
+            return
+
+        run = _finish_rerun(state)
+        st.caption(f"本次运行（{run['page']}）共 {run['total_ms']:.0f} ms，记录 {len(run['spans'])} 个区间")
+        if run["spans"]:
+            import pandas as pd
+
+            spans = pd.DataFrame(run["spans"])
+            spans["name"] = ["　" * d + n for d, n in zip(spans["depth"], spans["name"])]
+            spans["kb_in"] = pd.to_numeric(spans["bytes_in"]) / 1024
+            spans["kb_out"] = pd.to_numeric(spans["bytes_out"]) / 1024
+            st.dataframe(
+                spans[["name", "wall_ms", "rows_in", "rows_out", "alloc_mb", "kb_in", "kb_out"]]
+                .round({"wall_ms": 1, "alloc_mb": 2, "kb_in": 1, "kb_out": 1})
+                .rename(columns={"alloc_mb": "alloc_mb（全进程）"}),
+                hide_index=True, use_container_width=True
+            )
+            if tracemalloc.is_tracing():
+                st.caption(
+                    f"alloc_mb 为 tracemalloc 统计的全进程净分配，包含同时运行的其他会话与后台线程；"
+                    f"跟踪开启期间所有会话都会变慢（当前 {len(_tracing_sessions)} 个会话开启了内存剖析）"
+                )
+            # 只统计最外层区间，避免嵌套重复计算
+            top = spans[spans["depth"] == 0]
+            st.caption(f"已覆盖 {top['wall_ms'].sum() / max(run['total_ms'], 1e-9):.0%} 的运行时间")
+        st.download_button(
+            "导出 JSON",
+            data=json.dumps(state["history"], ensure_ascii=False, default=str),
+            file_name="profile.json",
+            mime="application/json",
+            key="_profiler_export"
+        )
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+
+def top_n_positions(values, n: int, tiebreak=None) -> np.ndarray:
+    """
+    返回 values 中最大的 n 个元素的位置（按值降序）。
+    使用 argpartition 只对 Top-N 排序，避免全量排序；NaN 视为最小值。
+    tiebreak 为与 values 等长的次要排序键：同值时按 tiebreak 降序，再按原位置。
+    """
+    vals = np.asarray(values, dtype=float)
+    n = max(0, min(int(n), vals.size))
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+
+    keyed = np.where(np.isnan(vals), -np.inf, vals)
+    if tiebreak is None:
+        ties = np.zeros(vals.size)
+    else:
+        ties = np.asarray(tiebreak, dtype=float)
+        ties = np.where(np.isnan(ties), -np.inf, ties)
+    if n < vals.size:
+        part = np.argpartition(-keyed, n - 1)[:n]
+        # argpartition 在与第 n 名同值的元素中任取，取回全部同值元素，由下面的排序决定名次
+        part = np.flatnonzero(keyed >= keyed[part].min())
+        # 只对选出的元素排序：值降序，同值按次要键降序、原位置
+        return part[np.lexsort((part, -ties[part], -keyed[part]))][:n]
+    return np.lexsort((np.arange(vals.size), -ties, -keyed))
+
+
+def take_with_others(values, top_pos: np.ndarray, others: str | None = 'sum') -> np.ndarray:
+    """
+    按 top_pos 取出 Top-N 的值；others 为 'sum' / 'mean' 时，
+    用一次掩码归约把其余元素合并为 "Others" 追加在末尾（忽略 NaN）。
+    """
+    vals = np.asarray(values, dtype=float)
+    top = vals[top_pos]
+    if others is None:
+        return top
+
+    mask = np.ones(vals.size, dtype=bool)
+    mask[top_pos] = False
+    rest = vals[mask]
+    rest = rest[~np.isnan(rest)]
+    if others == 'sum':
+        other = rest.sum()
+    elif others == 'mean':
+        other = rest.mean() if rest.size else np.nan
+    else:
+        raise ValueError(f"不支持的 Others 聚合方式: {others}")
+    return np.append(top, other)
+
+
+def rank_top_n(series: pd.Series, n: int, others: str | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    对 series 取 Top-N，返回可直接绘图的 (labels, values)。
+    others 不为 None 时在末尾追加 "Others" 标签及其合并值。
+    """
+    pos = top_n_positions(series.to_numpy(), n)
+    labels = series.index.to_numpy()[pos]
+    values = take_with_others(series.to_numpy(), pos, others)
+    if others is not None:
+        labels = np.append(labels.astype(object), 'Others')
+    return labels, values
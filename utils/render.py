@@ -0,0 +1,49 @@
+import pandas as pd
+import plotly.io
+import streamlit as st
+
+from config import chart_configs
+from utils.figures import combine_grid, compact_figure
+from utils.profiler import count_rows, profiling, span
+
+
+def show_chart(fig, **kwargs):
+    """
+    st.plotly_chart 的统一入口：发送前按 chart_configs 压缩图的 JSON（见 utils.figures.compact_figure），
+    记录图的点数与压缩、序列化、发送的耗时；剖析时另记录压缩前后的 JSON 字节数。
+    """
+    with span("st.plotly_chart", count_rows(fig)) as record:
+        if chart_configs["compact"]:
+            measure = profiling()
+            if measure:
+                record.bytes_in = len(plotly.io.to_json(fig, validate=False))
+            compact_figure(fig, chart_configs["round_decimals"], chart_configs["round_significant"])
+            if measure:
+                record.bytes_out = len(plotly.io.to_json(fig, validate=False))
+        st.plotly_chart(fig, **kwargs)
+
+
+def show_table(df: pd.DataFrame):
+    """st.table 的统一入口（静态小表）。"""
+    with span("st.table", len(df)):
+        st.table(df)
+
+
+def show_chart_grid(figures: list, n_cols: int = 2, combine: bool | None = None, key: str | None = None):
+    """
+    按布局顺序展示一组图（每行 n_cols 张）。
+    combine 为 True 时（默认取 chart_configs["combine_grid"]）合并为一张 subplot 图，只调用一次 st.plotly_chart。
+    """
+    if combine is None:
+        combine = chart_configs["combine_grid"]
+    if combine and len(figures) > 1:
+        with span("figures.combine_grid", len(figures)):
+            fig = combine_grid(figures, n_cols)
+        show_chart(fig, use_container_width=True, key=key)
+        return
+
+    for idx, fig in enumerate(figures):
+        if idx % n_cols == 0:
+            cols = st.columns(n_cols)
+        with cols[idx % n_cols]:
+            show_chart(fig, use_container_width=True, key=f"{key}_{idx}" if key else None)
@@ -0,0 +1,231 @@
+import itertools
+import os
+import pickle
+import shutil
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections.abc import MutableMapping
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from config import memory_configs
+from utils.pandas_setup import pd
+
+# 进程内所有会话的数据集仓库，用于全局内存统计与跨会话淘汰
+_registry = weakref.WeakSet()
+_registry_lock = threading.RLock()
+# 数据集版本号：每次写入分配一个新值，供下游（如查询后端的数据包）判断数据是否变化
+_versions = itertools.count(1)
+
+
+def frame_nbytes(df, sample: int = 1000) -> int:
+    """
+    估算 DataFrame 占用的内存。数值列取精确值；object 列抽样最多 sample 个值估算平均大小，
+    避免每次写入都对大表做 deep=True 的逐值统计。
+    """
+    if isinstance(df, pd.Series):
+        df = df.to_frame()
+    if not isinstance(df, pd.DataFrame):
+        return 0
+    total = int(df.index.memory_usage(deep=len(df) <= sample))
+    for _, col in df.items():
+        if col.dtype != object or len(col) <= sample:
+            total += int(col.memory_usage(index=False, deep=True))
+        else:
+            picked = col.iloc[np.linspace(0, len(col) - 1, sample).astype(int)]
+            per_value = sum(sys.getsizeof(v) for v in picked) / sample
+            total += int(col.memory_usage(index=False, deep=False) + per_value * len(col))
+    return total
+
+
+class _Entry:
+    __slots__ = ("df", "path", "nbytes", "rows", "last_access", "shared", "version")
+
+    def __init__(self, df: pd.DataFrame, shared: bool = False):
+        self.df = df
+        self.path = None
+        self.shared = shared
+        self.version = next(_versions)
+        self.nbytes = frame_nbytes(df)
+        self.rows = len(df)
+        self.last_access = time.monotonic()
+
+    @property
+    def in_memory(self) -> bool:
+        return self.df is not None
+
+
+class SessionDatasets(MutableMapping):
+    """
+    会话中的上传数据集（替代普通 dict 的 st.session_state.uploaded_data）。
+    - 记录每个数据集的内存占用；会话或全进程超出预算时，把最久未访问的数据集转存为 Feather 文件并释放内存
+    - 转存后的数据集在下次访问时整体读回内存（读回后删除转存文件，重新计入内存占用）
+    - Arrow 无法表示的列（如混合类型）退回 pickle 转存
+    - set_shared 放入的共享数据集由 utils.shared_store 统一计量，不在此计入
+    """
+
+    def __init__(self, spill_dir: str | None = None, budget_mb: float | None = None):
+        self.budget = (budget_mb if budget_mb is not None else memory_configs["session_budget_mb"]) * 2 ** 20
+        self.spill_dir = os.path.join(spill_dir or memory_configs["spill_dir"], uuid.uuid4().hex)
+        self._entries = {}
+        self._lock = threading.RLock()
+        # 会话结束、对象被回收时删除转存文件
+        weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+        with _registry_lock:
+            _registry.add(self)
+
+    # 按对象身份比较和哈希（Mapping 默认按内容比较，会触发读回所有转存的数据集）
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    # ---- dict 接口 ----
+    def __getitem__(self, name):
+        with self._lock:
+            entry = self._entries[name]
+            entry.last_access = time.monotonic()
+            if entry.in_memory:
+                return entry.df
+            df = self._load(entry)
+        # 读回后可能再次超出预算，把其他冷数据集转存
+        enforce_budgets(keep=(self, name))
+        return df
+
+    def __setitem__(self, name, df):
+        with self._lock:
+            old = self._entries.get(name)
+            if old is not None and old.path:
+                _remove(old.path)
+            self._entries[name] = _Entry(df)
+        enforce_budgets(keep=(self, name))
+
+    def set_shared(self, name, df):
+        """放入共享存储中的只读数据集：不计入本会话内存，也不会被转存。"""
+        with self._lock:
+            old = self._entries.get(name)
+            if old is not None and old.path:
+                _remove(old.path)
+            self._entries[name] = _Entry(df, shared=True)
+
+    def __delitem__(self, name):
+        with self._lock:
+            entry = self._entries.pop(name)
+            if entry.path:
+                _remove(entry.path)
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def version(self, name) -> int:
+        """数据集的版本号，重新写入后变化；转存与读回不改变版本。"""
+        return self._entries[name].version
+
+    # ---- 统计 ----
+    def memory_bytes(self) -> int:
+        return sum(e.nbytes for e in self._entries.values() if e.in_memory and not e.shared)
+
+    def usage(self) -> pd.DataFrame:
+        """各数据集的行数、占用与位置，供页面展示。"""
+        now = time.monotonic()
+        rows = [{
+            "数据集": name,
+            "行数": e.rows,
+            "内存占用 (MB)": round(e.nbytes / 2 ** 20, 2),
+            "位置": "共享（只读）" if e.shared else "内存" if e.in_memory else "磁盘",
+            "距上次访问 (秒)": round(now - e.last_access)
+        } for name, e in self._entries.items()]
+        return pd.DataFrame(rows)
+
+    # ---- 转存 ----
+    def spill(self, name) -> int:
+        """把一个数据集转存到磁盘并释放内存，返回释放的字节数。"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or not entry.in_memory:
+                return 0
+            os.makedirs(self.spill_dir, exist_ok=True)
+            base = os.path.join(self.spill_dir, uuid.uuid4().hex)
+            try:
+                table = pa.Table.from_pandas(entry.df, preserve_index=True)
+                entry.path = base + ".feather"
+                # 不压缩：转存与读回都不需要压缩 / 解压，文件只在会话期间短暂存在
+                feather.write_feather(table, entry.path, compression="uncompressed")
+            except (pa.ArrowException, TypeError, ValueError):
+                entry.path = base + ".pkl"
+                with open(entry.path, "wb") as f:
+                    pickle.dump(entry.df, f, protocol=pickle.HIGHEST_PROTOCOL)
+            entry.df = None
+            return entry.nbytes
+
+    def _load(self, entry: _Entry) -> pd.DataFrame:
+        if entry.path.endswith(".feather"):
+            # 读回的 DataFrame 是堆上的完整副本（内存映射省不下这次复制），因此直接普通读取
+            df = feather.read_table(entry.path).to_pandas()
+        else:
+            with open(entry.path, "rb") as f:
+                df = pickle.load(f)
+        _remove(entry.path)
+        entry.path = None
+        entry.df = df
+        entry.nbytes = frame_nbytes(df)
+        return df
+
+    def cold_entries(self) -> list:
+        """内存中的数据集，按最久未访问排序。"""
+        return sorted(
+            ((e.last_access, self, name) for name, e in self._entries.items() if e.in_memory and not e.shared),
+            key=lambda item: item[0]
+        )
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def all_stores() -> list:
+    with _registry_lock:
+        return list(_registry)
+
+
+def global_memory_bytes() -> int:
+    return sum(store.memory_bytes() for store in all_stores())
+
+
+def enforce_budgets(keep: tuple | None = None):
+    """
+    先保证当前会话不超出会话预算，再保证全进程不超出全局预算；
+    都按最久未访问优先转存，keep=(store, name) 指定的数据集（刚写入或刚读回的）不转存。
+    """
+    with _registry_lock:
+        if keep is not None:
+            store = keep[0]
+            for _, owner, name in store.cold_entries():
+                if store.memory_bytes() <= store.budget:
+                    break
+                if (owner, name) != keep:
+                    owner.spill(name)
+
+        global_budget = memory_configs["global_budget_mb"] * 2 ** 20
+        total = global_memory_bytes()
+        if total <= global_budget:
+            return
+        candidates = sorted((item for store in all_stores() for item in store.cold_entries()), key=lambda item: item[0])
+        for _, owner, name in candidates:
+            if total <= global_budget:
+                break
+            if keep is not None and (owner, name) == keep:
+                continue
+            total -= owner.spill(name)
@@ -0,0 +1,92 @@
+import hashlib
+import threading
+import weakref
+
+import streamlit as st
+
+from utils.pandas_setup import pd
+from utils.session_memory import frame_nbytes
+
+
+def content_key(name: str, raw: bytes, *dependencies) -> str:
+    """
+    数据集的内容键：文件字节 + 数据集名 + 预处理所依赖的其他数据集的键。
+    只有真正上传过同样字节的会话才能算出同一个键。
+    """
+    digest = hashlib.sha256()
+    digest.update(name.encode("utf-8"))
+    digest.update(raw)
+    for dep in dependencies:
+        digest.update(b"\0" + (dep or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SessionLease:
+    """会话持有的租约；会话结束（租约被回收）后，只被它引用的共享数据集会被释放。"""
+
+    __slots__ = ("__weakref__",)
+
+
+class _SharedEntry:
+    __slots__ = ("frame", "nbytes", "leases")
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+        self.nbytes = frame_nbytes(frame)
+        self.leases = weakref.WeakSet()
+
+
+class SharedDatasetStore:
+    """
+    进程内共享的只读数据集，按内容键索引。
+    - 会话只能通过自己算出的内容键取到数据集，并在取用时登记租约
+    - 取出的是浅拷贝：会话里增删列不会影响共享副本，底层数组只保留一份
+    - 没有任何存活租约的数据集在下次写入时被清理
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, lease: SessionLease) -> pd.DataFrame | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.leases.add(lease)
+            return entry.frame.copy(deep=False)
+
+    def put(self, key: str, frame: pd.DataFrame, lease: SessionLease) -> pd.DataFrame:
+        """登记一个新数据集；若其他会话已先放入同一内容，则复用已有副本。"""
+        with self._lock:
+            self._prune()
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _SharedEntry(frame)
+            entry.leases.add(lease)
+            return entry.frame.copy(deep=False)
+
+    def _prune(self):
+        for key in [k for k, e in self._entries.items() if not len(e.leases)]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._prune()
+            return {
+                "datasets": len(self._entries),
+                "bytes": sum(e.nbytes for e in self._entries.values()),
+                "sessions": len({id(lease) for e in self._entries.values() for lease in e.leases})
+            }
+
+
+@st.cache_resource
+def get_shared_store() -> SharedDatasetStore:
+    return SharedDatasetStore()
+
+
+def session_lease() -> SessionLease:
+    """当前会话的租约，随会话状态一起释放。"""
+    if "shared_lease" not in st.session_state:
+        st.session_state.shared_lease = SessionLease()
+    return st.session_state.shared_lease
@@ -0,0 +1,64 @@
+import math
+import numpy as np
+import pandas as pd
+import streamlit as st
+from utils.profiler import span
+
+PAGE_SIZES = [20, 50, 100, 500]
+NO_SORT = "（不排序）"
+
+
+def paged_dataframe(df: pd.DataFrame, key: str, page_size: int = 50, **kwargs):
+    """
+    服务端分页展示 DataFrame，替代直接 st.dataframe(整表)。
+    列选择、筛选、排序和分页都在服务端完成，只把当前页序列化发送到浏览器。
+    - key: 控件 key 前缀，同一页面内必须唯一
+    - kwargs: 透传给 st.dataframe（如 use_container_width）
+    """
+    if df is None or df.empty:
+        st.info("没有可显示的数据")
+        return
+
+    columns = df.columns.tolist()
+    col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
+    with col1:
+        shown_cols = st.multiselect("显示列", columns, default=columns, key=f"{key}_cols")
+    with col2:
+        filter_col = st.selectbox("筛选列", columns, key=f"{key}_filter_col")
+        query = st.text_input("筛选关键词", key=f"{key}_query")
+    with col3:
+        sort_col = st.selectbox("排序列", [NO_SORT] + columns, key=f"{key}_sort_col")
+        descending = st.checkbox("降序", key=f"{key}_desc")
+    with col4:
+        size_options = sorted(set(PAGE_SIZES + [page_size]))
+        page_size = st.selectbox("每页行数", size_options, index=size_options.index(page_size), key=f"{key}_size")
+
+    # 行位置：先筛选，再排序，最后只取当前页
+    positions = np.arange(len(df))
+    if query:
+        mask = df[filter_col].astype(str).str.contains(query, case=False, regex=False, na=False).to_numpy()
+        positions = positions[mask]
+    if sort_col != NO_SORT and len(positions):
+        sort_vals = df[sort_col].iloc[positions].reset_index(drop=True)
+        try:
+            order = sort_vals.sort_values(ascending=not descending, kind='stable', na_position='last').index.to_numpy()
+        except TypeError:
+            # 混合类型列按字符串排序
+            order = sort_vals.astype(str).sort_values(ascending=not descending, kind='stable').index.to_numpy()
+        positions = positions[order]
+
+    n_rows = len(positions)
+    n_pages = max(1, math.ceil(n_rows / page_size))
+    page_key = f"{key}_page"
+    # 筛选后页数变少时，先把页码拉回有效范围再创建控件
+    if st.session_state.get(page_key, 1) > n_pages:
+        st.session_state[page_key] = n_pages
+    page = st.number_input("页码", min_value=1, max_value=n_pages, step=1, key=page_key)
+
+    start = (page - 1) * page_size
+    page_df = df.iloc[positions[start:start + page_size]]
+    page_df = page_df[[c for c in shown_cols if c in page_df.columns]]
+
+    st.caption(f"共 {n_rows} 行（原始 {len(df)} 行），第 {page} / {n_pages} 页")
+    with span("st.dataframe", len(page_df)):
+        st.dataframe(page_df, **kwargs)
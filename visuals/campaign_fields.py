@@ -1,23 +1,41 @@
 import streamlit as st
 import plotly.graph_objects as go
 import pandas as pd
+from compute.campaign import campaign_rank_table, campaign_rank_profile, campaign_series
+from utils.profiler import profiled
+from utils.render import show_chart, show_table
 
+
+@profiled()
+@st.cache_data
+def build_campaign_rank_table(
+    df: pd.DataFrame,
+    metrics: list[str],
+    campaign_col: str,
+    mean_metrics: list[str],
+    group_col: str | None = None
+) -> pd.DataFrame:
+    """compute.campaign.campaign_rank_table 的缓存版本，结构见该函数说明。"""
+    return campaign_rank_table(df, metrics, campaign_col, mean_metrics, group_col)
+
+
+@profiled()
 def plot_dual_metric_trends(
     df,
+    rank_table,
     metrics,
     date_col,
     campaign_col,
-    ad_type_col,
-    mean_metrics
+    ad_type_col
 ):
     """
     在 Tab3 中绘制共轴双指标趋势图，复用已选的 selected_campaign。
     - df: 原始 DataFrame
+    - rank_table: build_campaign_rank_table 的结果
     - metrics: 全部指标列表
     - date_col: 时间列
     - campaign_col: Campaign ID 列
     - ad_type_col: 广告类型列
-    - mean_metrics: 以均值计算排名的指标列表
     """
     selected_campaign = st.session_state.get("tab3_campaign")
     if not selected_campaign:
@@ -32,15 +50,12 @@ def plot_dual_metric_trends(
         options2 = [m for m in metrics if m != metric1]
         metric2 = st.selectbox("选择第二个对比指标", options=options2, key="dual_metric2")
 
-    # 计算排名
-    ranks = {}
-    for m in (metric1, metric2):
-        vals = df.groupby(campaign_col)[m].mean() if m in mean_metrics else df.groupby(campaign_col)[m].sum()
-        sorted_ids = vals.sort_values(ascending=False).index.tolist()
-        ranks[m] = sorted_ids.index(selected_campaign) + 1
+    # 查表得到排名
+    profile, _ = campaign_rank_profile(rank_table, selected_campaign, metrics)
+    ranks = profile['rank']
 
     # 准备趋势数据
-    sel_df = df[df[campaign_col] == selected_campaign].sort_values(date_col)
+    sel_df = campaign_series(df, campaign_col, date_col, selected_campaign)
     x = sel_df[date_col]
     y1 = sel_df[metric1]
     y2 = sel_df[metric2]
@@ -59,45 +74,30 @@ def plot_dual_metric_trends(
         template="plotly_white",
         hovermode="x unified"
     )
-    st.plotly_chart(fig, use_container_width=True)
+    show_chart(fig, use_container_width=True)
 
     # 显示选中 Campaign 在所有指标的聚合值（总和或均值）
-    # 计算各指标值
-    agg_vals = {}
-    for m in metrics:
-        sub = df[df[campaign_col] == selected_campaign]
-        val = sub[m].mean() if m in mean_metrics else sub[m].sum()
-        agg_vals[m] = val
-    # 显示表格
     st.write(f"Campaign {selected_campaign} 聚合指标值")
-    df_table = pd.DataFrame.from_dict(agg_vals, orient='index', columns=['值'])
-    df_table.index.name = '指标'
-    st.table(df_table)
+    show_table(profile[['value']].rename(columns={'value': '值'}))
 
+@profiled()
 def plot_campaign_radar_ranks(
-    df,
-    metrics,
-    campaign_col,
-    mean_metrics
+    rank_table,
+    metrics
 ):
     """
-    使用雷达图展示 selected_campaign 在所有指标的排名。
-    - df: 原始 DataFrame
+    使用雷达图展示 selected_campaign 在所有指标的排名（及同 Ad Type 内排名）。
+    - rank_table: build_campaign_rank_table 的结果
     - metrics: 所有指标列表
-    - campaign_col: Campaign ID 列
-    - mean_metrics: 以均值计算排名的指标列表
     """
     selected_campaign = st.session_state.get("tab3_campaign")
     if not selected_campaign:
         st.warning("请先选择 Campaign ID")
         return
 
-    # 计算排名列表
-    ranks = []
-    for m in metrics:
-        vals = df.groupby(campaign_col)[m].mean() if m in mean_metrics else df.groupby(campaign_col)[m].sum()
-        sorted_ids = vals.sort_values(ascending=False).index.tolist()
-        ranks.append(sorted_ids.index(selected_campaign) + 1)
+    # 查表得到排名向量
+    profile, group_name = campaign_rank_profile(rank_table, selected_campaign, metrics)
+    ranks = profile['rank'].tolist()
 
     # 闭合
     categories = metrics + [metrics[0]]
@@ -117,6 +117,21 @@ def plot_campaign_radar_ranks(
         )
     )
 
+    # 同类（Ad Type）内排名
+    has_peer = 'peer_rank' in profile.columns
+    if has_peer:
+        peer_ranks = profile['peer_rank'].tolist()
+        peer_values = peer_ranks + [peer_ranks[0]]
+        fig.add_trace(
+            go.Scatterpolar(
+                r=peer_values,
+                theta=categories,
+                mode='lines+markers',
+                line=dict(dash='dash'),
+                name=f"{selected_campaign} 在 {group_name} 内排名"
+            )
+        )
+
     # 更新布局
     fig.update_layout(
         polar=dict(
@@ -128,4 +143,14 @@ def plot_campaign_radar_ranks(
         showlegend=True,
         title=f"Campaign {selected_campaign} 指标排名雷达图"
     )
-    st.plotly_chart(fig, width=True)
+    show_chart(fig, width=True)
+
+    # 排名、百分位与同类排名明细
+    df_ranks = pd.DataFrame({
+        '排名': profile['rank'],
+        '百分位': profile['pct'].astype(float).round(3),
+    })
+    if has_peer:
+        df_ranks['同类排名'] = profile['peer_rank']
+    df_ranks['参与排名数'] = len(rank_table)
+    show_table(df_ranks)
@@ -1,24 +1,46 @@
 import streamlit as st
 import plotly.express as px
 import pandas as pd
-
+from compute.campaign import (
+    rank_campaign_totals, campaign_totals_frame, campaign_trend_frame,
+    campaign_metric_table, metric_distributions
+)
+from utils.table_view import paged_dataframe
+from utils.profiler import profiled
+from utils.figures import build_figures, category_bar_figure, donut_figure
+from utils.render import show_chart, show_chart_grid
+
+# 绘图函数只负责控件与图形；聚合在 compute.campaign 中完成
+
+@profiled()
 def get_ranked_campaigns(
     df: pd.DataFrame,
     metric: str,
     campaign_col: str,
-    mean_metrics: list[str]
+    mean_metrics: list[str],
+    top_n: int | None = None
 ) -> tuple[list[str], pd.Series]:
     """
-    根据指标对所有 Campaign 进行汇总排名，返回按降序排列的 Campaign ID 列表和对应总量序列。
+    根据指标对所有 Campaign 进行汇总排名，返回按降序排列的前 top_n 个 Campaign ID 列表和对应总量序列。
+    top_n 为 None 时返回完整排名。
     """
-    if metric in mean_metrics:
-        total = df.groupby(campaign_col)[metric].mean().sort_values(ascending=False)
-    else:    
-        total = df.groupby(campaign_col)[metric].sum().sort_values(ascending=False)
-    ranked_ids = total.index.tolist()
-    return ranked_ids, total
+    return rank_campaign_totals(df, metric, campaign_col, mean_metrics, top_n)
+
+
+@profiled()
+@st.cache_data
+def build_campaign_metric_table(
+    df: pd.DataFrame,
+    metrics: list[str],
+    aggregation_field: str,
+    campaign_col: str,
+    mean_metrics: list[str]
+) -> tuple[pd.DataFrame, pd.Series]:
+    """compute.campaign.campaign_metric_table 的缓存版本：Top N 滑块变化时不重新 groupby。"""
+    return campaign_metric_table(df, metrics, aggregation_field, campaign_col, mean_metrics)
 
 
+@profiled()
 def plot_campaign_totals(
     total: pd.Series,
     campaign_col: str,
@@ -33,36 +55,10 @@ def plot_campaign_totals(
     可以通过 name_map 提供 Campaign ID 到 Name 的映射，
     并在标签中展示省略后的 Name。
     """
-    # 判断展示范围
-    if selected_ids:
-        series = total.loc[selected_ids]
-        title = "选定 Campaign 总量排名"
-        order = selected_ids
-    else:
-        series = total
-        title = "所有 Campaign 总量排名"
-        order = total.index.tolist()
-
-    # 构建标签
-    labels = []
-    for cid in order:
-        if name_map and cid in name_map:
-            name = name_map[cid]
-            labels.append((cid, name))
-        else:
-            labels.append((cid, None))
-
-    # 生成最终显示标签
-    display_labels = []
-    for cid, name in labels:
-        if name:
-            label = name if len(name) <= name_max_len else name[:name_max_len] + '...'
-            display_labels.append(f"{cid} - {label}")
-        else:
-            display_labels.append(cid)
-
-    df_totals = pd.DataFrame({"_id": order, "label": display_labels, '总量': series.values})
-    df_totals["text_总量"] = df_totals["总量"].apply(lambda x: f"{x:.2f}")
+    title = "选定 Campaign 总量排名" if selected_ids else "所有 Campaign 总量排名"
+    df_totals = campaign_totals_frame(total, selected_ids, name_map, name_max_len)
+    df_totals = df_totals.assign(text_总量=df_totals["总量"].map(lambda x: f"{x:.2f}"))
+    display_labels = df_totals["label"].tolist()
 
     # 颜色映射
     color_map = px.colors.qualitative.Plotly
@@ -86,8 +82,9 @@ def plot_campaign_totals(
         showlegend=False
     )
     # 正确调用 plotly_chart
-    st.plotly_chart(fig, use_container_width=True)
+    show_chart(fig, use_container_width=True)
 
+@profiled()
 def plot_campaign_trends(
     df: pd.DataFrame,
     metric: str,
@@ -112,19 +109,7 @@ def plot_campaign_trends(
     - name_map: 可选的 Campaign ID -> Name 映射，用于图例标签
     - name_max_len: 图例标签中最大名称长度
     """
-    # 过滤数据
-    filtered = df[df[campaign_col].isin(selected_ids)].copy()
-
-    # 构建图例标签
-    def make_label(cid):
-        if name_map and cid in name_map:
-            nm = name_map[cid]
-            short = nm if len(nm) <= name_max_len else nm[:name_max_len] + '...'
-            return f"{cid} - {short}"
-        return cid
-
-    filtered['label'] = filtered[campaign_col].apply(make_label)
-    legend_order = [make_label(cid) for cid in selected_ids]
+    filtered, legend_order = campaign_trend_frame(df, campaign_col, selected_ids, name_map, name_max_len)
 
     # 颜色映射
     colors = px.colors.qualitative.Plotly
@@ -155,10 +140,11 @@ def plot_campaign_trends(
         template='plotly_white',
         hovermode='x unified'
     )
-    st.plotly_chart(fig, use_container_width=True)
+    show_chart(fig, use_container_width=True)
 
-    st.dataframe(filtered)
+    paged_dataframe(filtered, key="campaign_trends_table")
 
+@profiled()
 def plot_metric_pie_charts(
     df: pd.DataFrame,
     metrics: list[str],
@@ -174,154 +160,38 @@ def plot_metric_pie_charts(
         'Cost Per Thousand Views (CPM) (sum)'
     ]
 
-    total_main = df.groupby(campaign_col)[aggregation_field].sum().sort_values(ascending=False)
-    ranked = total_main.index.tolist()
-    max_n = len(ranked)
+    # 一次 groupby 得到所有指标的 Campaign 聚合值（均值类指标取 mean，其余取 sum）；排名始终按 aggregation_field 的总量
+    agg_table, total_main = build_campaign_metric_table(df, metrics, aggregation_field, campaign_col, mean_metrics)
+    max_n = len(total_main)
 
     top_n = st.slider(f"选择 Top N (按 {aggregation_field} 排序)", 1, max_n, min(5, max_n))
     include_others = st.checkbox("包含 Others", value=True)
-    top_ids = ranked[:top_n]
-    other_ids = ranked[top_n:]
-
-    # label 构建
-    def build_label(cid):
-        if name_map and cid in name_map:
-            nm = name_map[cid]
-            short = nm if len(nm) <= name_max_len else nm[:name_max_len] + '...'
-            return f"{cid} - {short}"
-        return cid
-
-    label_map = {cid: build_label(cid) for cid in top_ids}
-    if include_others:
-        label_map["Others"] = "Others"
-
-    labels_ordered = [label_map[cid] for cid in top_ids]
-    if include_others:
-        labels_ordered.append("Others")
+    labels_ordered, values = metric_distributions(
+        agg_table, total_main, metrics, aggregation_field, mean_metrics,
+        top_n, include_others, name_map, name_max_len
+    )
 
     # 颜色映射
     colors = px.colors.qualitative.Plotly
     color_map = {label: colors[i % len(colors)] for i, label in enumerate(labels_ordered)}
-
-    # 主图
-    if aggregation_field in mean_metrics:
-        main_vals = df.groupby(campaign_col)[aggregation_field].mean()
-        data = [main_vals.loc[cid] for cid in top_ids]
-        if include_others:
-            others_val = main_vals.loc[other_ids].mean()
-            data.append(others_val)
-        df_main = pd.DataFrame({'label': labels_ordered, 'value': data})
-        fig_main = px.bar(
-            df_main,
-            x='label',
-            y='value',
-            text='value',
-            color='label',
-            color_discrete_map=color_map,
-            category_orders={'label': labels_ordered},
-            title=f"{aggregation_field} 平均值 (Top {top_n}{' + Others' if include_others else ''})"
-        )
-        fig_main.update_traces(texttemplate='%{text:.2f}', textposition='outside')
-    else:
-        values_main = [total_main[cid] for cid in top_ids]
-        if include_others:
-            others_total = total_main.loc[other_ids].sum()
-            values_main.append(others_total)
-        fig_main = px.pie(
-            names=labels_ordered,
-            values=values_main,
-            color=labels_ordered,
-            color_discrete_map=color_map,
-            title=f"{aggregation_field} 分布 (Top {top_n}{' + Others' if include_others else ''})",
-            hole=0.4  # 设置为环状图
-
+    suffix = f"(Top {top_n}{' + Others' if include_others else ''})"
+
+    # 均值类指标画柱状图，其余画环状图；所有图先按布局顺序批量构建，再一次性展示
+    main_title = f"{aggregation_field} {'平均值' if aggregation_field in mean_metrics else '分布'} {suffix}"
+    figures = build_figures([
+        (
+            category_bar_figure if m in mean_metrics else donut_figure,
+            labels_ordered,
+            values[m],
+            color_map,
+            main_title if m == aggregation_field else f"{m} 分布 {suffix}"
         )
-        fig_main.update_traces(textinfo='percent+label')
+        for m in values
+    ])
 
+    # 布局：主图与第一个对比指标同一行，其余两两一行
     st.subheader("指标分布对比")
-    other_metrics = [m for m in metrics if m != aggregation_field]
-    cols = st.columns(2)
-    with cols[0]:
-        st.plotly_chart(fig_main, use_container_width=True)
-
-    # 第一个对比指标
-    m0 = other_metrics[0]
-    with cols[1]:
-        title0 = f"{m0} 分布 (Top {top_n}{' + Others' if include_others else ''})"
-        if m0 in mean_metrics:
-            mean_vals = df.groupby(campaign_col)[m0].mean()
-            values = [mean_vals.loc[cid] for cid in top_ids]
-            if include_others:
-                others_val = mean_vals.loc[other_ids].mean()
-                values.append(others_val)
-            df0 = pd.DataFrame({'label': labels_ordered, 'value': values})
-            fig0 = px.bar(
-                df0,
-                x='label',
-                y='value',
-                text='value',
-                color='label',
-                color_discrete_map=color_map,
-                category_orders={'label': labels_ordered},
-                title=title0
-            )
-            fig0.update_traces(texttemplate='%{text:.2f}', textposition='outside')
-        else:
-            sum_vals = df.groupby(campaign_col)[m0].sum()
-            values = [sum_vals.loc[cid] for cid in top_ids]
-            if include_others:
-                values.append(sum_vals.loc[other_ids].sum())
-            fig0 = px.pie(
-                names=labels_ordered,
-                values=values,
-                color=labels_ordered,
-                color_discrete_map=color_map,
-                title=title0,
-                hole=0.4  # 设置为环状图
-
-            )
-            fig0.update_traces(textinfo='percent+label')
-        st.plotly_chart(fig0, use_container_width=True)
-
-    # 其余指标
-    for idx, m in enumerate(other_metrics[1:], start=1):
-        if idx % 2 == 1:
-            cols = st.columns(2)
-        with cols[idx % 2]:
-            titlem = f"{m} 分布 (Top {top_n}{' + Others' if include_others else ''})"
-            if m in mean_metrics:
-                mean_vals = df.groupby(campaign_col)[m].mean()
-                values = [mean_vals.loc[cid] for cid in top_ids]
-                if include_others:
-                    values.append(mean_vals.loc[other_ids].mean())
-                dfm = pd.DataFrame({'label': labels_ordered, 'value': values})
-                figm = px.bar(
-                    dfm,
-                    x='label',
-                    y='value',
-                    text='value',
-                    color='label',
-                    color_discrete_map=color_map,
-                    category_orders={'label': labels_ordered},
-                    title=titlem
-                )
-                figm.update_traces(texttemplate='%{text:.2f}', textposition='outside')
-            else:
-                sum_vals = df.groupby(campaign_col)[m].sum()
-                values = [sum_vals.loc[cid] for cid in top_ids]
-                if include_others:
-                    values.append(sum_vals.loc[other_ids].sum())
-                figm = px.pie(
-                    names=labels_ordered,
-                    values=values,
-                    color=labels_ordered,
-                    color_discrete_map=color_map,
-                    title=titlem,
-                    hole=0.4  # 设置为环状图
-
-                )
-                figm.update_traces(textinfo='percent+label')
-            st.plotly_chart(figm, use_container_width=True)
+    show_chart_grid(figures)
 
 # def plot_metric_pie_charts(
 #     df: pd.DataFrame,
@@ -1,41 +1,33 @@
 import plotly.express as px
 import streamlit as st
 import pandas as pd
-import numpy as np
+from compute.halo import halo_tables, halo_breakdown, halo_candidates, halo_leaderboard
+from utils.table_view import paged_dataframe
+from utils.profiler import profiled
+from utils.render import show_chart
 
-def plot_promoted_sunburst(df_merged: pd.DataFrame):
-    df = df_merged.copy()
-    # 获取唯一 Promoted OMSID 列表
-    unique_promoted = df['Promoted OMSID'].dropna().unique()
 
-    # 创建一个映射字典，方便快速查找 Description
-    promoted_desc_map = df.groupby('Promoted OMSID')['Promoted OMSID Description_x'] \
-                        .first() \
-                        .fillna('No description') \
-                        .to_dict()
-    
+@profiled()
+@st.cache_data
+def build_halo_table(df_merged: pd.DataFrame, sku_map: pd.DataFrame | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """compute.halo.halo_tables 的缓存版本：返回 (detail, summary)，结构见该函数说明。"""
+    return halo_tables(df_merged, sku_map)
+
+
+@profiled()
+def plot_promoted_sunburst(halo_detail: pd.DataFrame, halo_summary: pd.DataFrame):
+    """根据预计算的 halo 表，展示选中 Promoted SKU 的销售额分布（仅做查表）。"""
     # Streamlit selectbox
     selected_promoted_sku = st.selectbox(
         "请选择需要查看的Promoted SKU",
-        options=unique_promoted,
-        format_func=lambda x: f"{x} - {promoted_desc_map.get(x, 'No description')}"
+        options=halo_summary.index,
+        format_func=lambda x: f"{x} - {halo_summary.at[x, 'Description']}"
     )
 
-    df_selected = df[df['Promoted OMSID'] == selected_promoted_sku]
-    df_selected['Category'] = np.where(df_selected['Purchased OMSID'] == df_selected['Promoted OMSID'], 
-                            'Promoted', 'Non-Promoted')
-
-    df_sunburst = df_selected.dropna(subset=['Purchased OMSID'])
-
-    if df_sunburst.empty:
+    df_sunburst_agg = halo_breakdown(halo_detail, selected_promoted_sku)
+    if df_sunburst_agg is None:
         st.info(f"Promoted OMSID {selected_promoted_sku} 没有销售数据可显示。")
         return
-    
-    # 汇总数据
-    df_sunburst_agg = df_sunburst.groupby(['Category','Purchased OMSID'], as_index=False)['SPA Sales_y'].sum()
-
-    # 再计算占比
-    df_sunburst_agg['Sales_pct'] = df_sunburst_agg['SPA Sales_y'] / df_sunburst_agg['SPA Sales_y'].sum() * 100
 
     # 绘制 Sunburst
     fig = px.sunburst(
@@ -48,18 +40,40 @@ def plot_promoted_sunburst(df_merged: pd.DataFrame):
         title=f"Promoted OMSID {selected_promoted_sku} 的广告销售额分布"
     )
 
-    st.plotly_chart(fig, use_container_width=True, key = 'sunburst')
+    show_chart(fig, use_container_width=True, key = 'sunburst')
+
+    paged_dataframe(df_sunburst_agg, key="sunburst_table")
+
+
+@profiled()
+def plot_halo_leaderboard(halo_summary: pd.DataFrame, key: str = "halo_leaderboard"):
+    """所有 Promoted SKU 的 Halo Ratio 排行榜，直接读取预计算的 summary。"""
+    board = halo_candidates(halo_summary)
+    if board.empty:
+        st.info("没有可用于 Halo Ratio 排行的销售数据。")
+        return
+
+    # 只有一个 SKU 时 slider 无法创建（要求 min_value < max_value），直接展示
+    top_n = 1 if len(board) <= 1 else st.slider(
+        "选择 Top N Promoted SKU（按 Halo Ratio）",
+        min_value=1,
+        max_value=len(board),
+        value=min(10, len(board)),
+        key=f"{key}_slider"
+    )
+    board = halo_leaderboard(halo_summary, top_n)
+
+    fig = px.bar(
+        board.reset_index(),
+        x='Promoted OMSID',
+        y='Halo Ratio',
+        text='Halo Ratio',
+        hover_data={'Direct Sales': ':.2f', 'Halo Sales': ':.2f', 'Halo SKU Count': True},
+        title=f"Top {top_n} Promoted SKU 的 Halo Ratio（光环销售额占比）"
+    )
+    fig.update_traces(texttemplate='%{text:.1%}', textposition='outside')
+    fig.update_xaxes(type='category', tickangle=45, automargin=True)
+    fig.update_layout(yaxis_tickformat='.0%', template='plotly_white')
+    show_chart(fig, use_container_width=True, key=f"{key}_fig")
 
-    if 'HD SKU Map' in st.session_state.get('uploaded_data', {}):
-        hd_map = st.session_state['uploaded_data']['HD SKU Map'].copy()
-        # 确保两边都是字符串，避免匹配失败
-        df_display = df_sunburst_agg.merge(
-            hd_map,
-            left_on='Purchased OMSID',
-            right_on='OMSID',
-            how='left',
-            suffixes=('', '_HDMap')
-                )
-    else:
-        df_display = df_sunburst_agg.copy()
-    st.dataframe(df_display)
\ No newline at end of file
+    paged_dataframe(board, key=f"{key}_table")
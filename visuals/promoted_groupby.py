@@ -3,97 +3,35 @@ import plotly.express as px
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from compute.sku import sku_metric_table, sku_rows, sku_trend_detail
+from utils.table_view import paged_dataframe
+from utils.profiler import profiled
+from utils.figures import build_figures, donut_figure
+from utils.render import show_chart, show_chart_grid
 
 
-def move_rank_cols_to_front(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    如果存在 page_no_sponsored / page_no_organic，则把它们移动到最前面。
-    保持其他列顺序不变。
-    """
-    front_cols = [col for col in ["page_no_sponsored", "page_no_organic"] if col in df.columns]
-    other_cols = [col for col in df.columns if col not in front_cols]
-    return df[front_cols + other_cols]
-
-
+@profiled()
 def plot_promoted_sku_rank(
     df_promoted: pd.DataFrame,
     selected_campaign: str,
     metrics: list[str],
     sku_col: str = 'Promoted OMSID',
+    sku_agg: pd.DataFrame | None = None
 ):
     """
     在 Tab3 或 Tab4 中：
     1. 对选定 Campaign 内各 SKU 除 'SPA ROAS' 外的指标做 sum 聚合；
     2. 打印聚合表格，并基于 SPA Sales / Spend 计算 SPA ROAS；
     3. 对每个除 SPA ROAS 外的指标绘制饼图，展示各 SKU 在该指标中的占比。
+    sku_agg 为查询后端已聚合好的各 SKU 指标时，跳过第 1 步。
     """
 
-    df_p = df_promoted.copy()
-
-    # 1. 聚合各 SKU 指标
-    agg_dict = {}
-    for m in metrics:
-        agg_dict[m] = df_p.groupby(sku_col)[m].sum()
-    df_agg = pd.DataFrame(agg_dict)
-
-    # 2. 计算 SPA ROAS
-    df_agg['SPA ROAS'] = df_agg['SPA Sales'] / df_agg['Spend']
-
-    # 3. 如果有映射列，合并映射信息
-    mapping_cols = [
-        "MFG Model #",
-        "Weekly Sales QTY",
-        "Promoted Retail",
-        "Inventory",
-        "OMS THD SKU",
-        "Product Name (120)"
-    ]
-
-    # 如果有 Status 列，也加入
-    if 'Status' in df_p.columns:
-        mapping_cols.append('Status')
-
-    # 如果有 rank 分布列，也加入
-    for col in ['page_no_sponsored', 'page_no_organic']:
-        if col in df_p.columns:
-            mapping_cols.append(col)
-
-    # 检查是否在原始 df 中都有
-    if all(col in df_p.columns for col in mapping_cols):
-        map_info = df_p[[sku_col] + mapping_cols].drop_duplicates(subset=sku_col).set_index(sku_col)
-        df_agg = df_agg.join(map_info)
-        display_df = df_agg.reset_index().rename(columns={sku_col: 'SKU'})
-
-        # Status 放前
-        if 'Status' in display_df.columns:
-            cols = ['Status'] + [col for col in display_df.columns if col != 'Status']
-            display_df = display_df[cols]
-    else:
-        # fallback
-        desc_col = 'Promoted OMSID Description'
-        cols_to_join = [sku_col, desc_col]
-
-        if 'Status' in df_p.columns:
-            cols_to_join.append('Status')
-
-        for col in ['page_no_sponsored', 'page_no_organic']:
-            if col in df_p.columns:
-                cols_to_join.append(col)
-
-        desc_info = df_p[cols_to_join].drop_duplicates(subset=sku_col).set_index(sku_col)
-        df_agg = df_agg.join(desc_info)
-        display_df = df_agg.reset_index().rename(columns={sku_col: 'SKU'})
-
-        if 'Status' in display_df.columns:
-            cols = ['Status'] + [col for col in display_df.columns if col != 'Status']
-            display_df = display_df[cols]
-
-    # 如果存在 rank 列，则移到最前
-    display_df = move_rank_cols_to_front(display_df)
+    # 1-2. 各 SKU 指标汇总、SPA ROAS 与映射信息
+    df_agg, display_df = sku_metric_table(df_promoted, metrics, sku_col, sku_agg)
 
     # 展示聚合表格
     st.subheader(f"{selected_campaign} 的 SKU 聚合指标表")
-    st.dataframe(display_df)
+    paged_dataframe(display_df, key="sku_rank_table")
 
     # 3. 绘制饼图：除 SPA ROAS 外
     st.subheader("SKU 指标占比饼图")
@@ -101,24 +39,12 @@ def plot_promoted_sku_rank(
     base_colors = px.colors.qualitative.Plotly
     color_map = {lbl: base_colors[i % len(base_colors)] for i, lbl in enumerate(labels)}
 
-    # 每行两图布局
-    for idx, m in enumerate(metrics):
-        if idx % 2 == 0:
-            cols = st.columns(2)
-        with cols[idx % 2]:
-            vals = df_agg[m].values.tolist()
-            fig = px.pie(
-                names=labels,
-                values=vals,
-                color=labels,
-                color_discrete_map=color_map,
-                title=f"{m} 分布",
-                hole=0.4
-            )
-            fig.update_traces(textinfo='percent+label')
-            st.plotly_chart(fig, use_container_width=True)
+    # 每行两图布局，按布局顺序批量构建
+    figures = build_figures([(donut_figure, labels, df_agg[m].to_numpy(), color_map, f"{m} 分布") for m in metrics])
+    show_chart_grid(figures)
 
 
+@profiled()
 def plot_sku_trends(
     df_promoted: pd.DataFrame,
     sku_col: str = 'Promoted OMSID',
@@ -137,7 +63,7 @@ def plot_sku_trends(
     if mode == '跨 SKU 对比同指标':
         metric = st.selectbox("选择对比指标", ['Clicks', 'Impressions', 'SPA Sales', 'Spend'], key='mode1_metric')
         skus = st.multiselect("选择多个 SKU", sku_list, default=sku_list[:2], key='mode1_skus')
-        data = df_promoted[df_promoted[sku_col].isin(skus)]
+        data = sku_rows(df_promoted, skus, sku_col)
 
         fig = px.line(
             data,
@@ -147,7 +73,7 @@ def plot_sku_trends(
             markers=True,
             title=f"SKU 对比：{metric} 趋势"
         )
-        st.plotly_chart(fig, use_container_width=True)
+        show_chart(fig, use_container_width=True)
 
     else:
         sku = st.selectbox("选择 SKU", sku_list, key='mode2_sku')
@@ -159,7 +85,7 @@ def plot_sku_trends(
         with col2:
             m2 = st.selectbox("第二个指标", [m for m in metrics if m != m1], key='mode2_m2')
 
-        data = df_promoted[df_promoted[sku_col] == sku]
+        data = sku_rows(df_promoted, [sku], sku_col)
 
         # 使用双 y 轴折线图
         fig = make_subplots(specs=[[{"secondary_y": True}]])
@@ -177,24 +103,8 @@ def plot_sku_trends(
         fig.update_xaxes(title_text=date_col)
         fig.update_yaxes(title_text=m1, secondary_y=False)
         fig.update_yaxes(title_text=m2, secondary_y=True)
-        st.plotly_chart(fig, use_container_width=True)
-
-        detail_cols = [
-            'Promoted OMSID',
-            'Promoted OMSID Description',
-            'Campaign ID',
-            'Campaign Name',
-            'Day',
-            'Clicks',
-            'Impressions',
-            'SPA ROAS',
-            'SPA Sales',
-            'Spend'
-        ]
-
-        # 如果存在这两列，就加入明细表，并放最前面
-        optional_front_cols = [col for col in ['page_no_sponsored', 'page_no_organic'] if col in data.columns]
-        final_cols = optional_front_cols + [col for col in detail_cols if col in data.columns]
-
-        detail_df = data[final_cols].copy()
-        st.dataframe(detail_df)
\ No newline at end of file
+        show_chart(fig, use_container_width=True)
+
+        # 明细表：rank 列（如存在）放最前面
+        detail_df = sku_trend_detail(data)
+        paged_dataframe(detail_df, key="sku_trend_detail")
\ No newline at end of file